@@ -0,0 +1,109 @@
+"""
+Bulk-load benchmark.
+
+Loads the same rows with COPY from CSV and JSONL files, with multi-row
+INSERT statements, and (for a sample) with one INSERT per row, and
+reports rows per second including the time to make the data durable.
+Results are printed as JSON.
+
+    python -m benchmarks.bench_bulk_load --rows 1000000
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+from mydb.executor import Database
+from mydb.parser import parse
+from mydb.wal import WriteAheadLog
+
+SCHEMA = "CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE, age INT)"
+
+
+def make_row(i):
+    return [i, f"user{i}@example.com", 18 + i % 60]
+
+
+def write_files(workdir, rows):
+    csv_path = os.path.join(workdir, "users.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "email", "age"])
+        for i in range(rows):
+            writer.writerow(make_row(i))
+
+    jsonl_path = os.path.join(workdir, "users.jsonl")
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            user_id, email, age = make_row(i)
+            f.write(json.dumps({"id": user_id, "email": email, "age": age}) + "\n")
+
+    return csv_path, jsonl_path
+
+
+def open_database(workdir, name, backend):
+    """A fresh database with its own snapshot and log files."""
+    for suffix in (".snapshot", ".snapshot.idx", ".wal"):
+        path = os.path.join(workdir, name + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+    wal = WriteAheadLog(os.path.join(workdir, name + ".wal"))
+    db = Database(wal=wal, backend=backend, path=os.path.join(workdir, name + ".snapshot"))
+    db.execute(parse(SCHEMA))
+    return db
+
+
+def timed(db, load, rows):
+    start = time.perf_counter()
+    load(db)
+    db.close()
+    elapsed = time.perf_counter() - start
+    return {"rows": rows, "seconds": elapsed, "rows_per_s": rows / elapsed if elapsed else None}
+
+
+def insert_statement(start, stop):
+    values = ", ".join('(%d, "%s", %d)' % tuple(make_row(i)) for i in range(start, stop))
+    return f"INSERT INTO users VALUES {values}"
+
+
+def run(rows=1000000, batch=1000, single_rows=10000, backend="json"):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path, jsonl_path = write_files(workdir, rows)
+
+        db = open_database(workdir, "copy_csv", backend)
+        results["copy_csv"] = timed(db, lambda db: db.execute(parse(f"COPY users FROM '{csv_path}'")), rows)
+
+        db = open_database(workdir, "copy_jsonl", backend)
+        results["copy_jsonl"] = timed(db, lambda db: db.execute(parse(f"COPY users FROM '{jsonl_path}'")), rows)
+
+        def insert_batches(db):
+            for start in range(0, rows, batch):
+                db.execute(parse(insert_statement(start, min(start + batch, rows))))
+
+        db = open_database(workdir, "insert_batches", backend)
+        results[f"insert_batches_of_{batch}"] = timed(db, insert_batches, rows)
+
+        single_rows = min(single_rows, rows)
+
+        def insert_single(db):
+            for i in range(single_rows):
+                db.execute(parse(insert_statement(i, i + 1)))
+
+        db = open_database(workdir, "insert_single", backend)
+        results["insert_single"] = timed(db, insert_single, single_rows)
+
+    return {"benchmark": "bulk_load", "backend": backend, "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=1000000)
+    arg_parser.add_argument("--batch", type=int, default=1000, help="rows per multi-row INSERT")
+    arg_parser.add_argument("--single-rows", type=int, default=10000, help="rows loaded one INSERT at a time")
+    arg_parser.add_argument("--storage", choices=["json", "paged"], default="json")
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows, args.batch, args.single_rows, args.storage), indent=2))
@@ -0,0 +1,83 @@
+"""
+Query result cache benchmark.
+
+Replays the web demo's read pattern (the user count, a page of users and
+a popular lookup by age) against a database opened like the web app's,
+with one INSERT every `--write-every` requests, with the result cache
+enabled and disabled. Reports requests per second and the cache hit
+rate, and checks that both runs return the same results. Results are
+printed as JSON.
+
+    python -m benchmarks.bench_cache --rows 100000 --requests 2000 --write-every 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from mydb.executor import Database
+from mydb.parser import parse
+
+
+def build_database(directory, rows):
+    db = Database.open(path=os.path.join(directory, "db.json"), wal_path=os.path.join(directory, "db.wal"),
+                       lock_path=os.path.join(directory, "db.lock"), fsync=False)
+    db.execute(parse("CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE, age INT)"))
+    batch = 10000
+    for start in range(0, rows, batch):
+        values = ", ".join(f'({i}, "user{i}@example.com", {18 + i % 60})'
+                           for i in range(start, min(start + batch, rows)))
+        db.execute(parse(f"INSERT INTO users VALUES {values}"))
+    return db
+
+
+def replay(db, rows, requests, write_every):
+    count_users = db.prepare("SELECT COUNT(*) FROM users")
+    select_page = db.prepare("SELECT id, email FROM users LIMIT ? OFFSET ?")
+    find_age = db.prepare("SELECT id FROM users WHERE age = ? LIMIT 20")
+    next_id = rows
+    results = []
+
+    start = time.perf_counter()
+    for request in range(requests):
+        if write_every and request % write_every == write_every - 1:
+            db.execute(parse(f'INSERT INTO users VALUES ({next_id}, "new{next_id}@example.com", 30)'))
+            next_id += 1
+            continue
+        # A few popular pages and ages, as on a real site
+        page = request % 5
+        results.append(count_users.query().fetchall())
+        results.append(select_page.query(20, page * 20).fetchall())
+        results.append(find_age.query(18 + request % 3).fetchall())
+    return time.perf_counter() - start, results
+
+
+def run(rows=100000, requests=2000, write_every=50):
+    timings = {}
+    outputs = {}
+    for name, capacity in (("cache", None), ("no cache", 0)):
+        with tempfile.TemporaryDirectory() as directory:
+            db = build_database(directory, rows)
+            if capacity is not None:
+                db.results.capacity = capacity
+            try:
+                seconds, outputs[name] = replay(db, rows, requests, write_every)
+            finally:
+                db.close()
+        lookups = db.results.hits + db.results.misses
+        timings[name] = {"seconds": seconds, "requests_per_s": requests / seconds,
+                         "hit_rate": db.results.hits / lookups if lookups else 0.0}
+    assert outputs["cache"] == outputs["no cache"], "cached results differ"
+
+    return {"benchmark": "result cache", "rows": rows, "requests": requests, "write_every": write_every,
+            "results": timings, "speedup": timings["no cache"]["seconds"] / timings["cache"]["seconds"]}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=100000)
+    arg_parser.add_argument("--requests", type=int, default=2000)
+    arg_parser.add_argument("--write-every", type=int, default=50, help="0 for a read-only run")
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows, args.requests, args.write_every), indent=2))
@@ -0,0 +1,126 @@
+"""
+Concurrency stress benchmark.
+
+Runs a mix of point queries, range queries, inserts and updates against
+one shared Database from a growing number of threads and reports read
+and write throughput per thread count. After each run the indexes are
+checked against the table rows. Results are printed as JSON.
+
+    python -m benchmarks.bench_concurrency --threads 1 2 4 8 --seconds 3
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from mydb.executor import Database
+from mydb.wal import WriteAheadLog
+
+
+def setup(workdir, rows, fsync):
+    db = Database(wal=WriteAheadLog(os.path.join(workdir, "db.wal"), fsync=fsync),
+                  path=os.path.join(workdir, "db.json"))
+    db.prepare("CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE, age INT)").execute()
+    db.prepare("CREATE INDEX idx_age ON users(age)").execute()
+    insert = db.prepare("INSERT INTO users VALUES (?, ?, ?)")
+    with db.transaction():
+        for i in range(rows):
+            insert.execute(i, f"user{i}@example.com", 18 + i % 60)
+    return db
+
+
+def check_indexes(table):
+    """Every live row is reachable through every index, and nothing else is."""
+    live = dict(table.scan())
+    for column, index in table.indexes.items():
+        assert len(index["map"]) == len(live), f"index on {column} has {len(index['map'])} keys"
+        for key, row_index in index["map"].items():
+            assert live[row_index][table.fields[column]] == key, f"index on {column} is out of sync"
+    for column, index in table.ordered_indexes.items():
+        positions = sorted(row_index for key in index.sorted_keys() for row_index in index.map[key])
+        assert positions == sorted(live), f"ordered index on {column} is out of sync"
+
+
+def run_mix(db, threads, seconds, write_ratio, next_id, rows):
+    point = db.prepare("SELECT * FROM users WHERE id = ?")
+    age_range = db.prepare("SELECT * FROM users WHERE age BETWEEN ? AND ? LIMIT 20")
+    insert = db.prepare("INSERT INTO users VALUES (?, ?, ?)")
+    update = db.prepare("UPDATE users SET age = ? WHERE id = ?")
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    counts_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        reads = writes = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < write_ratio:
+                    if rng.random() < 0.5:
+                        user_id = next(next_id)
+                        insert.execute(user_id, f"user{user_id}@example.com", 18 + user_id % 60)
+                    else:
+                        update.execute(rng.randint(18, 77), rng.randrange(rows))
+                    writes += 1
+                else:
+                    if rng.random() < 0.8:
+                        point.query(rng.randrange(rows)).fetchall()
+                    else:
+                        low = rng.randint(18, 70)
+                        age_range.query(low, low + 5).fetchall()
+                    reads += 1
+            except ValueError:
+                errors += 1
+        with counts_lock:
+            counts["reads"] += reads
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    check_indexes(db.tables["users"])
+    return {
+        "threads": threads,
+        "seconds": elapsed,
+        "reads_per_s": counts["reads"] / elapsed,
+        "writes_per_s": counts["writes"] / elapsed,
+        "ops_per_s": (counts["reads"] + counts["writes"]) / elapsed,
+        "errors": counts["errors"],
+        "wal_appends": db.wal.appends,
+        "wal_fsyncs": db.wal.syncs
+    }
+
+
+def run(threads=(1, 2, 4, 8), seconds=3.0, rows=100000, write_ratio=0.1, fsync=False):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        db = setup(workdir, rows, fsync)
+        next_id = itertools.count(rows)
+        for count in threads:
+            results.append(run_mix(db, count, seconds, write_ratio, next_id, rows))
+        db.close()
+
+    return {"benchmark": "concurrency", "rows": rows, "write_ratio": write_ratio,
+            "fsync": fsync, "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    arg_parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    arg_parser.add_argument("--rows", type=int, default=100000)
+    arg_parser.add_argument("--write-ratio", type=float, default=0.1)
+    arg_parser.add_argument("--fsync", action="store_true", help="fsync every commit (group commit applies)")
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.threads, args.seconds, args.rows, args.write_ratio, args.fsync), indent=2))
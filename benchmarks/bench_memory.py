@@ -0,0 +1,77 @@
+"""
+Row memory benchmark.
+
+Reports bytes per row for the same rows held as one dict per row (the
+layout tables used before) and as tuples in schema order (the current
+layout), plus the footprint of a table loaded from a JSON snapshot.
+Memory is measured with tracemalloc and includes the values themselves.
+Results are printed as JSON.
+
+    python -m benchmarks.bench_memory --rows 100000
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+
+from mydb.storage import load_database, save_database
+from mydb.table import Table
+
+COLUMNS = {
+    "id": {"type": "INT", "primary": True, "unique": False},
+    "email": {"type": "TEXT", "primary": False, "unique": True},
+    "age": {"type": "INT", "primary": False, "unique": False}
+}
+
+
+def make_row(i):
+    # Large ids so ints are real objects, not cached small ints
+    return [1000000 + i, f"user{i}@example.com", 18 + i % 60]
+
+
+def measure(build):
+    """Bytes allocated by build() and still held by its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def run(rows=100000):
+    names = list(COLUMNS.keys())
+    layouts = {
+        "dict": lambda: [dict(zip(names, make_row(i))) for i in range(rows)],
+        "tuple": lambda: [tuple(make_row(i)) for i in range(rows)]
+    }
+
+    results = []
+    for layout, build in layouts.items():
+        size = measure(build)
+        results.append({"layout": layout, "bytes": size, "bytes_per_row": size / rows})
+
+    # Rows as the engine holds them after a load (indexes are built lazily)
+    table = Table("users", COLUMNS)
+    table.insert_many(make_row(i) for i in range(rows))
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "db.json")
+        save_database({"users": table}, path)
+        del table
+        wal_path = os.path.join(workdir, "db.wal")
+        size = measure(lambda: load_database(path, wal_path=wal_path))
+    results.append({"layout": "loaded table", "bytes": size, "bytes_per_row": size / rows})
+
+    dict_size, tuple_size = results[0]["bytes"], results[1]["bytes"]
+    return {"benchmark": "memory", "rows": rows, "results": results,
+            "saving": 1 - tuple_size / dict_size}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=100000)
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows), indent=2))
@@ -0,0 +1,72 @@
+"""
+Paginated listing benchmark.
+
+Times fetching one page of two columns, the way the web demo lists users,
+by reading every row and slicing in Python (the old listing) and with
+`SELECT id, email ... LIMIT n OFFSET m`, for the in-memory and the paged
+backend. The paged file is reopened before each query, so pages start
+undecoded. Results are printed as JSON.
+
+    python -m benchmarks.bench_paging --rows 200000 --page-size 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from mydb.executor import Database
+from mydb.parser import parse
+
+
+def build_database(directory, backend, rows):
+    paths = {"path": os.path.join(directory, f"db.{backend}"), "backend": backend,
+             "wal_path": os.path.join(directory, f"{backend}.wal"),
+             "lock_path": os.path.join(directory, f"{backend}.lock")}
+    db = Database.open(fsync=False, **paths)
+    db.execute(parse("CREATE TABLE users (id INT PRIMARY KEY, email TEXT, name TEXT, age INT)"))
+    batch = 10000
+    for start in range(0, rows, batch):
+        values = ", ".join(f'({i}, "user{i}@example.com", "User {i}", {18 + i % 60})'
+                           for i in range(start, min(start + batch, rows)))
+        db.execute(parse(f"INSERT INTO users VALUES {values}"))
+    db.checkpoint()
+    db.close()
+    return paths
+
+
+def timed_page(paths, sql, slice_rows):
+    db = Database.open(fsync=False, **paths)
+    try:
+        start = time.perf_counter()
+        rows = db.query(parse(sql)).fetchall()
+        if slice_rows is not None:
+            rows = [(row[0], row[1]) for row in rows[slice_rows]]
+        return time.perf_counter() - start, rows
+    finally:
+        db.close()
+
+
+def run(rows=200000, page_size=20):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in ("json", "paged"):
+            paths = build_database(directory, backend, rows)
+            for name, offset in (("first page", 0), ("middle page", rows // 2), ("last page", rows - page_size)):
+                full_s, expected = timed_page(paths, "SELECT * FROM users",
+                                              slice(offset, offset + page_size))
+                page_s, page = timed_page(paths, f"SELECT id, email FROM users LIMIT {page_size} OFFSET {offset}",
+                                          None)
+                assert page == expected, f"{name} differs on {backend}"
+                results.append({"backend": backend, "page": name, "offset": offset,
+                                "read_all_s": full_s, "limit_offset_s": page_s, "speedup": full_s / page_s})
+
+    return {"benchmark": "paging", "rows": rows, "page_size": page_size, "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--page-size", type=int, default=20)
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows, args.page_size), indent=2))
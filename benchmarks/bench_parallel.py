@@ -0,0 +1,117 @@
+"""
+Parallel scan benchmark.
+
+Runs an unindexed SELECT and a hash join at increasing degrees of
+parallelism and reports the time of each. The first run at each degree
+("cold") includes copying the scanned columns into shared memory; later
+runs reuse them. Results are checked against the in-process run and
+printed as JSON. At each degree, a scan and a DELETE after a ROLLBACK
+are also checked, since rolled-back rows must not come back from the
+shared memory copies.
+
+    python -m benchmarks.bench_parallel --rows 2000000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from mydb.executor import Database
+from mydb.parallel import MIN_PARALLEL_ROWS
+from mydb.parser import parse
+from mydb.table import Table
+
+QUERIES = {
+    "scan": "SELECT * FROM orders WHERE age = 30 AND user_id > 1000",
+    "hash join": "SELECT * FROM orders JOIN users ON orders.user_id = users.user_id"
+}
+
+
+def build_tables(rows):
+    # No index on the columns used, so the scan and the join cannot avoid them
+    users = Table("users", {
+        "user_id": {"type": "INT", "primary": False, "unique": False},
+        "email": {"type": "TEXT", "primary": False, "unique": False},
+        "age": {"type": "INT", "primary": False, "unique": False}
+    })
+    users.insert_many([i, f"user{i}@example.com", 18 + i % 60] for i in range(rows // 10))
+
+    orders = Table("orders", {
+        "order_id": {"type": "INT", "primary": False, "unique": False},
+        "user_id": {"type": "INT", "primary": False, "unique": False},
+        "age": {"type": "INT", "primary": False, "unique": False}
+    })
+    orders.insert_many([i, (i * 7) % (rows // 5), 18 + i % 60] for i in range(rows))
+    return {"users": users, "orders": orders}
+
+
+def check_rollback(degree):
+    """Scan a table in a transaction, roll it back, and check later scans see the restored rows."""
+    table = Table("t", {
+        "id": {"type": "INT", "primary": False, "unique": False},
+        "v": {"type": "INT", "primary": False, "unique": False}
+    })
+    table.insert_many([i, 0] for i in range(MIN_PARALLEL_ROWS))
+    count = "SELECT COUNT(*) FROM t WHERE v = {}"
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(path=os.path.join(directory, "db.json"), parallelism=degree)
+        db.tables = {"t": table}
+        try:
+            db.execute(parse("BEGIN"))
+            db.execute(parse("UPDATE t SET v = 1 WHERE id < 100"))
+            db.query(parse(count.format(1))).fetchall()
+            db.execute(parse("ROLLBACK"))
+            # Brings the table back to the version the scan above saw
+            db.execute(parse(f"UPDATE t SET v = 2 WHERE id >= {MIN_PARALLEL_ROWS - 10}"))
+            counts = [db.query(parse(count.format(v))).fetchall() for v in (1, 2)]
+            assert counts == [[(0,)], [(10,)]], f"scan after ROLLBACK is stale at {degree} workers"
+            deleted = db.execute(parse("DELETE FROM t WHERE v = 1"))
+            assert table.row_count == MIN_PARALLEL_ROWS, f"DELETE after ROLLBACK removed {deleted} at {degree} workers"
+        finally:
+            db.workers.close()
+
+
+def timed_query(db, sql):
+    start = time.perf_counter()
+    rows = db.query(parse(sql)).fetchall()
+    return time.perf_counter() - start, rows
+
+
+def run(rows=2000000, workers=None, repeat=3):
+    workers = workers or [1, 2, 4, os.cpu_count() or 1]
+    workers = sorted(set(workers))
+    tables = build_tables(rows)
+
+    results = []
+    expected = {}
+    for degree in workers:
+        check_rollback(degree)
+        db = Database(parallelism=degree)
+        db.tables = tables
+        for name, sql in QUERIES.items():
+            cold, result = timed_query(db, sql)
+            warm = min(timed_query(db, sql)[0] for _ in range(repeat))
+            if name in expected:
+                assert result == expected[name], f"{name} differs at {degree} workers"
+            else:
+                expected[name] = result
+            results.append({"query": name, "workers": degree, "rows_out": len(result),
+                            "cold_s": cold, "warm_s": warm})
+        db.workers.close()
+
+    # Speedup of each degree relative to the first (normally 1 = in-process)
+    for result in results:
+        base = next(r for r in results if r["query"] == result["query"])
+        result["speedup"] = base["warm_s"] / result["warm_s"]
+
+    return {"benchmark": "parallel", "rows": rows, "cpus": os.cpu_count(), "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=2000000)
+    arg_parser.add_argument("--workers", type=int, nargs="+")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows, args.workers, args.repeat), indent=2))
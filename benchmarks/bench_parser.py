@@ -0,0 +1,87 @@
+"""
+Parser microbenchmark.
+
+Parses a mix of statements (and a set of invalid ones, which must be
+rejected) repeatedly and reports statements per second. With --baseline,
+another parser module file, such as an earlier mydb/parser.py taken from
+git history, is timed on the same statements. Results are printed as JSON.
+
+    git show <commit>:mydb/parser.py > /tmp/old_parser.py
+    python -m benchmarks.bench_parser --rounds 2000 --baseline /tmp/old_parser.py
+"""
+import argparse
+import importlib.util
+import json
+import time
+
+from mydb import parser
+
+STATEMENTS = [
+    "CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE, age INT);",
+    "CREATE INDEX idx_age ON users(age);",
+    'INSERT INTO users VALUES (1, "stephen@example.com", 30);',
+    'INSERT INTO users VALUES (1, "a@example.com", 30), (2, "b@example.com", 41), (3, "c@example.com", 25);',
+    "SELECT * FROM users;",
+    "SELECT * FROM users WHERE id = 1;",
+    'SELECT * FROM users WHERE age BETWEEN 18 AND 30 AND email = "jane@example.com" ORDER BY age DESC LIMIT 10;',
+    "SELECT id, email FROM users LIMIT 20 OFFSET 40;",
+    "SELECT age, COUNT(*), AVG(id) FROM users WHERE id > 100 GROUP BY age ORDER BY COUNT(*) DESC LIMIT 5;",
+    "SELECT * FROM orders JOIN users ON orders.user_id = users.id;",
+    'UPDATE users SET email = "new@example.com", age = 31 WHERE id = 1;',
+    "DELETE FROM users WHERE age < 18;",
+    "EXPLAIN SELECT * FROM users WHERE id = 1;",
+]
+
+INVALID = [
+    "SELECT * FROM;",
+    "SELECT * FROM users WHERE age = NULL;",
+    "UPDATE users SET age = 1;",
+    "INSERT INTO users VALUES (1.5);",
+    "DROP TABLE users;",
+]
+
+
+def load_parser(path):
+    spec = importlib.util.spec_from_file_location("baseline_parser", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def statements_per_second(parse_statement, statements, rounds, valid):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sql in statements:
+            try:
+                parse_statement(sql)
+            except ValueError:
+                if valid:
+                    raise
+            else:
+                if not valid:
+                    raise AssertionError(f"statement was accepted: {sql}")
+    return rounds * len(statements) / (time.perf_counter() - start)
+
+
+def run(rounds=2000, baseline=None):
+    parsers = {"recursive descent": parser.parse_statement}
+    if baseline is not None:
+        parsers["baseline"] = load_parser(baseline).parse_statement
+
+    results = []
+    for name, parse_statement in parsers.items():
+        results.append({
+            "parser": name,
+            "statements_per_s": statements_per_second(parse_statement, STATEMENTS, rounds, valid=True),
+            "rejected_per_s": statements_per_second(parse_statement, INVALID, rounds, valid=False)
+        })
+
+    return {"benchmark": "parser", "rounds": rounds, "statements": len(STATEMENTS), "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rounds", type=int, default=2000)
+    arg_parser.add_argument("--baseline", help="parser module file to compare against")
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rounds, args.baseline), indent=2))
@@ -0,0 +1,76 @@
+"""
+Unindexed scan benchmark.
+
+Times WHERE evaluation over a full table scan, one row at a time (the
+old evaluation loop) and in column batches, with and without NumPy, and
+checks that all three select the same rows (including an integer
+compared with numeric TEXT, which never matches). Results are printed
+as JSON.
+
+    python -m benchmarks.bench_scan --rows 1000000
+"""
+import argparse
+import json
+import time
+
+from mydb import vector
+from mydb.executor import row_matches
+from mydb.table import Table
+
+PREDICATES = {
+    "age = 30": {"column": "age", "op": "=", "value": 30},
+    "age BETWEEN 20 AND 25": {"column": "age", "op": "BETWEEN", "value": [20, 25]},
+    "age > 20 AND email = ...": {"op": "AND", "conditions": [
+        {"column": "age", "op": ">", "value": 20},
+        {"column": "email", "op": "=", "value": "user5@example.com"}
+    ]},
+    # TEXT such as "007" is not the integer 7, with or without NumPy
+    "code = 7 (TEXT column)": {"column": "code", "op": "=", "value": 7}
+}
+
+
+def build_table(rows):
+    table = Table("users", {
+        "id": {"type": "INT", "primary": True, "unique": False},
+        "email": {"type": "TEXT", "primary": False, "unique": False},
+        "age": {"type": "INT", "primary": False, "unique": False},
+        "code": {"type": "TEXT", "primary": False, "unique": False}
+    })
+    table.insert_many([i, f"user{i}@example.com", 18 + i % 60, f"{i % 1000:03d}"] for i in range(rows))
+    return table
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def run(rows=1000000):
+    table = build_table(rows)
+    results = []
+
+    for name, where in PREDICATES.items():
+        expected, row_s = timed(lambda: [row_index for row_index, row in table.scan()
+                                         if row_matches(row, where, table.fields)])
+        batched, batch_s = timed(lambda: vector.filter_positions(table, where, use_numpy=False))
+        assert batched == expected, f"batched scan differs for {name}"
+        result = {"predicate": name, "matches": len(expected),
+                  "row_at_a_time_s": row_s, "batched_s": batch_s, "speedup": row_s / batch_s}
+
+        if vector.numpy is not None:
+            with_numpy, numpy_s = timed(lambda: vector.filter_positions(table, where, use_numpy=True))
+            assert with_numpy == expected, f"NumPy scan differs for {name}"
+            result["numpy_s"] = numpy_s
+            result["numpy_speedup"] = row_s / numpy_s
+        results.append(result)
+
+    return {"benchmark": "scan", "rows": rows, "batch_size": vector.BATCH_SIZE,
+            "numpy": vector.numpy is not None, "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=1000000)
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows), indent=2))
@@ -0,0 +1,70 @@
+"""
+Cold-start benchmark.
+
+Measures the time from opening a database to answering the first
+indexed query, for each snapshot backend, with and without the persisted
+index file. Results are printed as JSON.
+
+    python -m benchmarks.bench_startup --rows 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from mydb.executor import Database
+from mydb.indexfile import index_path
+from mydb.parser import parse
+from mydb.storage import load_database, save_database
+from mydb.table import Table
+
+
+def build_tables(rows):
+    table = Table("users", {
+        "id": {"type": "INT", "primary": True, "unique": False},
+        "email": {"type": "TEXT", "primary": False, "unique": True},
+        "age": {"type": "INT", "primary": False, "unique": False}
+    })
+    for i in range(rows):
+        table.insert([i, f"user{i}@example.com", 18 + i % 60])
+    return {"users": table}
+
+
+def cold_start(path, wal_path, backend, probe):
+    """Open the database and run one indexed point query."""
+    start = time.perf_counter()
+    db = Database(backend=backend)
+    db.tables = load_database(path, wal_path=wal_path, backend=backend)
+    opened = time.perf_counter()
+    db.execute(parse(f"SELECT * FROM users WHERE id = {probe}"))
+    done = time.perf_counter()
+    return {"open_s": opened - start, "first_query_s": done - opened, "total_s": done - start}
+
+
+def run(rows=100000):
+    results = []
+    tables = build_tables(rows)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        wal_path = os.path.join(workdir, "db.wal")
+
+        for backend, filename in (("json", "db.json"), ("paged", "db.pages")):
+            path = os.path.join(workdir, filename)
+            save_database(tables, path, backend=backend)
+
+            warm = cold_start(path, wal_path, backend, rows // 2)
+            os.remove(index_path(path))
+            rebuilt = cold_start(path, wal_path, backend, rows // 2)
+
+            results.append({"backend": backend, "index_file": True, **warm})
+            results.append({"backend": backend, "index_file": False, **rebuilt})
+
+    return {"benchmark": "startup", "rows": rows, "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=100000)
+    args = arg_parser.parse_args()
+    print(json.dumps(run(args.rows), indent=2))
@@ -0,0 +1,282 @@
+"""
+Engine benchmark suite.
+
+Builds synthetic `users` and `orders` tables of --rows rows each, then
+times the core operations: bulk and single-row INSERT, point and scan
+SELECT, UPDATE and DELETE by key and by a non-indexed column, a JOIN
+through an index and one without (`users.ref` holds the same values as
+`users.id` but has no index), and writing and loading the snapshot.
+
+Every workload runs on a fresh copy of the database, --repeat times, and
+the median is reported. The result cache is disabled so repeated queries
+are really executed, and the data and the keys each workload uses come
+from --seed, so runs are reproducible. Results are printed as JSON with
+the commit and environment they were measured on; --output saves them
+and --compare reports each workload's change against a saved run (the
+exit status is 1 when one is slower by more than --threshold).
+
+    python -m benchmarks.bench_suite --rows 100000 --output before.json
+    python -m benchmarks.bench_suite --rows 100000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mydb.executor import Database
+from mydb.parser import parse
+from mydb.storage import BACKENDS, load_database
+from mydb.vector import numpy
+
+CITIES = ["Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika", "Malindi", "Kitale", "Garissa", "Nyeri"]
+
+# Rows per multi-row INSERT when loading tables
+BATCH_ROWS = 1000
+
+
+def open_database(directory, backend, fsync=False, compression=None):
+    path = os.path.join(directory, os.path.basename(BACKENDS[backend]))
+    db = Database.open(path=path, backend=backend, wal_path=os.path.join(directory, "db.wal"),
+                       lock_path=os.path.join(directory, "db.lock"), fsync=fsync, compression=compression)
+    # Repeated queries must be executed, not answered from the cache
+    db.results.capacity = 0
+    return db
+
+
+def user_values(i, rng):
+    return f'({i}, "user{i}@example.com", {rng.randint(18, 80)}, "{rng.choice(CITIES)}", {i})'
+
+
+def insert_batches(db, table, rows, values):
+    for start in range(0, rows, BATCH_ROWS):
+        batch = ", ".join(values(i) for i in range(start, min(start + BATCH_ROWS, rows)))
+        db.execute(parse(f"INSERT INTO {table} VALUES {batch}"))
+
+
+def build_database(directory, rows, backend, seed, compression=None):
+    """The tables every workload starts from, checkpointed into `directory`."""
+    rng = random.Random(seed)
+    db = open_database(directory, backend, compression=compression)
+    db.execute(parse("CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE, age INT, city TEXT, ref INT)"))
+    db.execute(parse("CREATE TABLE orders (id INT PRIMARY KEY, user_id INT, amount INT)"))
+    insert_batches(db, "users", rows, lambda i: user_values(i, rng))
+    insert_batches(db, "orders", rows, lambda i: f"({i}, {rng.randrange(rows)}, {rng.randint(1, 500)})")
+    db.close()
+
+
+# Workloads: each runs on a freshly opened copy of the built database and
+# returns how many operations it performed (statements, or rows for the
+# bulk ones). `size` holds the suite parameters and a seeded `rng`.
+
+def insert_bulk(db, size):
+    db.execute(parse("CREATE TABLE bulk (id INT PRIMARY KEY, email TEXT UNIQUE, age INT, city TEXT, ref INT)"))
+    insert_batches(db, "bulk", size["rows"], lambda i: user_values(i, size["rng"]))
+    return size["rows"]
+
+
+def insert_single(db, size):
+    insert = db.prepare("INSERT INTO users VALUES (?, ?, ?, ?, ?)")
+    for i in range(size["rows"], size["rows"] + size["ops"]):
+        insert.execute(i, f"user{i}@example.com", size["rng"].randint(18, 80), size["rng"].choice(CITIES), i)
+    return size["ops"]
+
+
+def select_point(db, size):
+    select = db.prepare("SELECT * FROM users WHERE id = ?")
+    for _ in range(size["ops"]):
+        select.query(size["rng"].randrange(size["rows"])).fetchall()
+    return size["ops"]
+
+
+def select_point_nonkey(db, size):
+    select = db.prepare("SELECT * FROM users WHERE ref = ?")
+    for _ in range(size["scans"]):
+        select.query(size["rng"].randrange(size["rows"])).fetchall()
+    return size["scans"]
+
+
+def select_scan(db, size):
+    select = db.prepare("SELECT id, email FROM users WHERE age BETWEEN ? AND ? AND city = ?")
+    for _ in range(size["scans"]):
+        low = size["rng"].randint(18, 70)
+        select.query(low, low + 10, size["rng"].choice(CITIES)).fetchall()
+    return size["scans"]
+
+
+def update_key(db, size):
+    update = db.prepare("UPDATE users SET age = ? WHERE id = ?")
+    for _ in range(size["ops"]):
+        update.execute(size["rng"].randint(18, 80), size["rng"].randrange(size["rows"]))
+    return size["ops"]
+
+
+def update_nonkey(db, size):
+    update = db.prepare("UPDATE users SET city = ? WHERE ref = ?")
+    for _ in range(size["scans"]):
+        update.execute(size["rng"].choice(CITIES), size["rng"].randrange(size["rows"]))
+    return size["scans"]
+
+
+def delete_key(db, size):
+    delete = db.prepare("DELETE FROM users WHERE id = ?")
+    for key in size["rng"].sample(range(size["rows"]), min(size["ops"], size["rows"])):
+        delete.execute(key)
+    return min(size["ops"], size["rows"])
+
+
+def delete_nonkey(db, size):
+    delete = db.prepare("DELETE FROM users WHERE ref = ?")
+    for key in size["rng"].sample(range(size["rows"]), min(size["scans"], size["rows"])):
+        delete.execute(key)
+    return min(size["scans"], size["rows"])
+
+
+def join_index(db, size):
+    join = db.prepare("SELECT orders.id, users.email FROM orders JOIN users ON orders.user_id = users.id")
+    for _ in range(size["scans"]):
+        join.query().fetchall()
+    return size["scans"]
+
+
+def join_no_index(db, size):
+    join = db.prepare("SELECT orders.id, users.email FROM orders JOIN users ON orders.user_id = users.ref")
+    for _ in range(size["scans"]):
+        join.query().fetchall()
+    return size["scans"]
+
+
+def save(db, size):
+    db.checkpoint()
+    size["bytes"] = db.snapshot_bytes
+    return sum(len(table.rows) for table in db.tables.values())
+
+
+def load(db, size):
+    tables = load_database(db.path, wal_path=db.wal.path, backend=db.backend)
+    return sum(len(table.rows) for table in tables.values())
+
+
+WORKLOADS = {
+    "insert_bulk": insert_bulk,
+    "insert_single": insert_single,
+    "select_point": select_point,
+    "select_point_nonkey": select_point_nonkey,
+    "select_scan": select_scan,
+    "update_key": update_key,
+    "update_nonkey": update_nonkey,
+    "delete_key": delete_key,
+    "delete_nonkey": delete_nonkey,
+    "join_index": join_index,
+    "join_no_index": join_no_index,
+    "save": save,
+    "load": load,
+}
+
+
+def run_workload(name, built, size, repeat, backend, fsync, compression=None):
+    """Time one workload `repeat` times, each on a fresh copy of the built database."""
+    runs = []
+    for attempt in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree(built, directory, dirs_exist_ok=True)
+            db = open_database(directory, backend, fsync, compression)
+            try:
+                params = dict(size, rng=random.Random(f"{size['seed']}-{name}-{attempt}"))
+                before = dict(db.metrics.counters)
+                start = time.perf_counter()
+                operations = WORKLOADS[name](db, params)
+                seconds = time.perf_counter() - start
+                counters = {key: db.metrics.counters[key] - before[key]
+                            for key in ("rows_scanned", "index_rows")}
+            finally:
+                db.close()
+        runs.append(seconds)
+
+    seconds = statistics.median(runs)
+    result = {"operations": operations, "seconds": seconds, "ops_per_s": operations / seconds,
+              "runs": runs, **counters}
+    if "bytes" in params:
+        result["bytes"] = params["bytes"]
+    return result
+
+
+def environment():
+    """Where the suite ran: commit, Python, platform and optional accelerators."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "numpy": numpy is not None}
+
+
+def compare(results, baseline, threshold):
+    """Change in ops/s of every workload also in `baseline`; regressions are slower by more than `threshold`."""
+    changes = {}
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        change = result["ops_per_s"] / old["ops_per_s"] - 1
+        changes[name] = {"before_ops_per_s": old["ops_per_s"], "after_ops_per_s": result["ops_per_s"],
+                         "change": change, "regression": change < -threshold}
+    return {"baseline_commit": baseline.get("commit"), "threshold": threshold,
+            "same_parameters": baseline.get("parameters") == results["parameters"],
+            "workloads": changes, "regressions": [name for name, change in changes.items() if change["regression"]]}
+
+
+def run(rows=100000, ops=1000, scans=10, repeat=3, backend="json", seed=42, fsync=False, only=None,
+        compression=None):
+    names = only or list(WORKLOADS)
+    size = {"rows": rows, "ops": ops, "scans": scans, "seed": seed}
+    results = {}
+    with tempfile.TemporaryDirectory() as built:
+        build_database(built, rows, backend, seed, compression)
+        for name in names:
+            results[name] = run_workload(name, built, size, repeat, backend, fsync, compression)
+
+    return {"benchmark": "suite", **environment(),
+            "parameters": {**size, "repeat": repeat, "backend": backend, "compression": compression,
+                           "fsync": fsync},
+            "results": results}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=100000, help="rows in each of users and orders")
+    arg_parser.add_argument("--ops", type=int, default=1000, help="statements per point workload")
+    arg_parser.add_argument("--scans", type=int, default=10,
+                            help="statements per workload that reads a whole table (scans, joins)")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--storage", choices=["json", "paged", "segments"], default="json")
+    arg_parser.add_argument("--compression", choices=["zlib", "lzma"], help="with --storage segments")
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--fsync", action="store_true", help="fsync every commit, as in production")
+    arg_parser.add_argument("--only", nargs="+", choices=list(WORKLOADS), metavar="WORKLOAD",
+                            help=f"workloads to run (default: all of {', '.join(WORKLOADS)})")
+    arg_parser.add_argument("--output", help="also write the results to this file")
+    arg_parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare with")
+    arg_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="slowdown reported as a regression with --compare (default: 0.1)")
+    args = arg_parser.parse_args()
+
+    results = run(args.rows, args.ops, args.scans, args.repeat, args.storage, args.seed, args.fsync, args.only,
+                  args.compression)
+    if args.compare:
+        with open(args.compare) as f:
+            results["comparison"] = compare(results, json.load(f), args.threshold)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if args.compare and results["comparison"]["regressions"]:
+        sys.exit(1)
@@ -0,0 +1,161 @@
+AGGREGATES = ("COUNT", "SUM", "MIN", "MAX", "AVG")
+
+
+def is_aggregate(ast):
+    """True for a SELECT with GROUP BY or an aggregate function in its column list."""
+    if ast.get("group_by") is not None:
+        return True
+    return any("function" in item for item in ast.get("columns") or ())
+
+
+def output_name(item):
+    """Result column name of a select item: `age`, `COUNT(*)`, `SUM(age)`."""
+    if "function" in item:
+        return f"{item['function']}({item['column']})"
+    return item["column"]
+
+
+def output_type(table, item):
+    function = item.get("function")
+    if function == "COUNT":
+        return "INT"
+    if function == "AVG":
+        return "FLOAT"
+    return table.columns[item["column"]]["type"]
+
+
+def validate_aggregate(table, ast):
+    """Check the select items, GROUP BY and ORDER BY of an aggregate query."""
+    group_by = ast.get("group_by")
+    if group_by is not None and group_by not in table.columns:
+        raise ValueError(f"Unknown column '{group_by}'")
+
+    for item in ast["columns"]:
+        column = item["column"]
+        function = item.get("function")
+        if column == "*":
+            if function != "COUNT":
+                raise ValueError(f"{function}(*) is not supported; only COUNT(*)")
+            continue
+        if column not in table.columns:
+            raise ValueError(f"Unknown column '{column}'")
+        if function is None and column != group_by:
+            raise ValueError(f"Column '{column}' must appear in GROUP BY or be used in an aggregate")
+        if function in ("SUM", "AVG") and table.columns[column]["type"] != "INT":
+            raise ValueError(f"{function} requires an INT column, '{column}' is {table.columns[column]['type']}")
+
+    order_by = ast.get("order_by")
+    if order_by and order_by["column"] not in [output_name(item) for item in ast["columns"]]:
+        raise ValueError(f"ORDER BY '{order_by['column']}' must be one of the selected columns")
+
+
+def plan_aggregate(table, ast):
+    """
+    Choose how to compute an aggregate query:
+    - ROW COUNT: only COUNTs, no WHERE or GROUP BY; the table keeps its live row count
+    - INDEX MIN/MAX: COUNTs and MIN/MAX of ordered-index columns, read from the index ends
+    - INDEX GROUP COUNT: GROUP BY an ordered-index column with only COUNTs, one step per key
+    - HASH AGGREGATE: stream the (filtered) rows through a hash table of groups
+    """
+    items = ast["columns"]
+    group_by = ast.get("group_by")
+    if ast.get("where") is not None:
+        return "HASH AGGREGATE"
+
+    functions = {item.get("function") for item in items}
+    if group_by is None:
+        if functions == {"COUNT"}:
+            return "ROW COUNT"
+        if all(item["function"] == "COUNT" or (item["function"] in ("MIN", "MAX")
+                                               and item["column"] in table.ordered_indexes)
+               for item in items):
+            return "INDEX MIN/MAX"
+    elif group_by in table.ordered_indexes and functions <= {"COUNT", None}:
+        return "INDEX GROUP COUNT"
+    return "HASH AGGREGATE"
+
+
+def index_aggregate(table, ast, strategy):
+    """Result rows of an aggregate answered from table metadata and indexes, without reading rows."""
+    items = ast["columns"]
+
+    if strategy == "INDEX GROUP COUNT":
+        index = table.ordered_indexes[ast["group_by"]]
+        for key in index.keys():
+            count = len(index.map[key])
+            yield tuple(count if "function" in item else key for item in items)
+        return
+
+    values = []
+    for item in items:
+        if item["function"] == "COUNT":
+            values.append(table.row_count)
+        elif item["function"] == "MIN":
+            values.append(table.ordered_indexes[item["column"]].min())
+        else:
+            values.append(table.ordered_indexes[item["column"]].max())
+    yield tuple(values)
+
+
+def hash_aggregate(table, ast, rows):
+    """
+    Group `rows` by the GROUP BY column (one group without it) and compute
+    every aggregate in a single pass, keeping one small state list per
+    group rather than the rows. Groups are produced in first-seen order.
+    Without GROUP BY an empty input still yields one row: COUNT is 0 and
+    the other aggregates are None (NULL).
+    """
+    items = ast["columns"]
+    group_by = ast.get("group_by")
+    group_field = table.fields[group_by] if group_by is not None else None
+    # (function, tuple position) per item; plain columns are the group key
+    slots = [(item.get("function"), table.fields.get(item["column"])) for item in items]
+
+    groups = {}
+    for row in rows:
+        key = row[group_field] if group_field is not None else None
+        state = groups.get(key)
+        if state is None:
+            groups[key] = [start_state(function, row, field) for function, field in slots]
+            continue
+        for slot, (function, field) in enumerate(slots):
+            if function == "COUNT":
+                state[slot] += 1
+            elif function == "SUM":
+                state[slot] += row[field]
+            elif function == "MIN":
+                if row[field] < state[slot]:
+                    state[slot] = row[field]
+            elif function == "MAX":
+                if row[field] > state[slot]:
+                    state[slot] = row[field]
+            elif function == "AVG":
+                state[slot][0] += row[field]
+                state[slot][1] += 1
+
+    if not groups and group_by is None:
+        yield tuple(0 if function == "COUNT" else None for function, _ in slots)
+        return
+
+    for key, state in groups.items():
+        values = []
+        for slot, (function, _) in enumerate(slots):
+            if function is None:
+                values.append(key)
+            elif function == "AVG":
+                total, count = state[slot]
+                values.append(total / count)
+            else:
+                values.append(state[slot])
+        yield tuple(values)
+
+
+def start_state(function, row, field):
+    """Aggregate state after the first row of a group."""
+    if function == "COUNT":
+        return 1
+    if function == "AVG":
+        return [row[field], 1]
+    if function is None:
+        return None
+    return row[field]
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+# Query results kept per database
+CACHE_SIZE = 128
+
+# Results with more rows than this are not cached
+MAX_ROWS = 10000
+
+
+def result_key(ast, tables):
+    """
+    Cache key for a query: its bound AST (so whitespace, keyword case and
+    how values were passed do not matter) and the stamp of every table
+    it reads.
+    """
+    return repr(ast), tuple(table.stamp for table in tables)
+
+
+class ResultCache:
+    """
+    LRU cache of query results, keyed by result_key(). A table gets a new
+    stamp whenever its rows change, so results computed from an older
+    state are never hit again and age out of the cache.
+    """
+
+    def __init__(self, capacity=CACHE_SIZE, max_rows=MAX_ROWS):
+        self.capacity = capacity
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """(columns, rows) stored under `key`, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, columns, rows):
+        with self.lock:
+            self.entries[key] = (columns, rows)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def collect(self, key, cursor):
+        """
+        Store a cursor's result under `key` once it has been read to the
+        end, as the rows go by. Results over max_rows, and cursors closed
+        early, are not stored.
+        """
+        def rows(source):
+            kept = []
+            for row in source:
+                if kept is not None:
+                    kept.append(row)
+                    if len(kept) > self.max_rows:
+                        kept = None
+                yield row
+            if kept is not None:
+                self.put(key, cursor.columns, kept)
+
+        cursor.rows = rows(cursor.rows)
+        return cursor
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,252 @@
+import socket
+import threading
+from contextlib import contextmanager
+
+from mydb.cursor import ARRAY_SIZE, Cursor
+from mydb.exceptions import DBError, SchemaError, TableExistsError, TableNotFoundError
+from mydb.protocol import DEFAULT_PORT, ProtocolError, encode, read_message
+
+# Server errors are raised as the same exception types as in-process ones
+ERRORS = {error.__name__: error for error in (DBError, TableExistsError, TableNotFoundError, SchemaError,
+                                              ValueError, ProtocolError)}
+
+# Connections a pool opens at most
+POOL_SIZE = 8
+
+
+class Connection:
+    """
+    One connection to a MyDB server (python -m mydb.server). Requests are
+    answered in order, so a connection serves one thread at a time; share
+    a ConnectionPool between threads instead.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+        self.in_transaction = False
+        # A query's rows are still arriving; nothing else can be sent until they have
+        self.streaming = False
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, message):
+        if self.closed:
+            raise DBError("Connection is closed")
+        if self.streaming:
+            raise DBError("Previous query's rows have not been read; close its cursor first")
+        self.sock.sendall(encode(message))
+
+    def receive(self):
+        """Next reply; a server error is raised as its exception type."""
+        message = read_message(self.stream)
+        if message is None:
+            self.close()
+            raise DBError("Connection closed by the server")
+        if "transaction" in message:
+            self.in_transaction = message["transaction"]
+        if "error" in message:
+            self.streaming = False
+            raise ERRORS.get(message.get("kind"), DBError)(message["error"])
+        return message
+
+    def prepare(self, sql):
+        """Have the server parse `sql` (and report errors) now; returns its number of ? parameters."""
+        self.request({"op": "prepare", "sql": sql})
+        return self.receive()["parameters"]
+
+    def execute(self, sql, *params):
+        """Run a statement with `params` bound to its ? placeholders; returns the result text."""
+        self.request({"op": "execute", "sql": sql, "params": list(params)})
+        return self.receive()["result"]
+
+    def query(self, sql, *params, batch=ARRAY_SIZE):
+        """
+        Run a SELECT or JOIN and return a Cursor over its rows. The server
+        sends them in batches of `batch` rows as the cursor is read. Closing
+        the cursor once the last batch has arrived keeps the connection;
+        closing it before that closes the connection, since the rest is still
+        on its way (inside a transaction the rest is read and dropped instead).
+        """
+        self.request({"op": "query", "sql": sql, "params": list(params), "batch": batch})
+        columns = [tuple(column) for column in self.receive()["columns"]]
+        self.streaming = True
+        return Cursor(columns, self.rows(), on_close=self.end_query)
+
+    def rows(self):
+        while True:
+            message = self.receive()
+            if "end" in message:
+                self.streaming = False
+            for row in message["rows"]:
+                yield tuple(row)
+            if "end" in message:
+                return
+
+    def end_query(self):
+        if not self.streaming:
+            return
+        if self.in_transaction:
+            # Closing would roll the transaction back: read and drop the rest
+            for _ in self.rows():
+                pass
+        else:
+            self.close()
+
+    def prometheus(self):
+        """The server database's metrics in the Prometheus text format."""
+        self.request({"op": "metrics"})
+        return self.receive()["metrics"]
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN ... COMMIT around a block; ROLLBACK if it raises."""
+        self.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            if not self.closed:
+                self.execute("ROLLBACK")
+            raise
+        self.execute("COMMIT")
+
+    def close(self):
+        """Close the connection; the server rolls back a transaction left open."""
+        if self.closed:
+            return
+        self.closed = True
+        self.streaming = False
+        self.stream.close()
+        self.sock.close()
+
+
+class RemoteStatement:
+    """
+    A statement prepared through a ConnectionPool. Like PreparedStatement,
+    values for ? placeholders are passed to execute()/query() and bound by
+    the server, never spliced into SQL text.
+    """
+
+    def __init__(self, pool, sql, parameter_count):
+        self.pool = pool
+        self.sql = sql
+        self.parameter_count = parameter_count
+
+    def execute(self, *params):
+        return self.pool.execute(self.sql, *params)
+
+    def query(self, *params):
+        return self.pool.query(self.sql, *params)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to one server. Connections are opened
+    on demand, up to `size`, and reused; a thread waits while all are in
+    use. Inside transaction() a thread's statements go through the
+    connection that ran BEGIN.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, size=POOL_SIZE, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = []
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def acquire(self):
+        """A connection for the calling thread; give it back with release()."""
+        bound = getattr(self.local, "connection", None)
+        if bound is not None:
+            return bound
+
+        self.slots.acquire()
+        with self.lock:
+            connection = self.idle.pop() if self.idle else None
+        if connection is None:
+            try:
+                connection = Connection(self.host, self.port, self.timeout)
+            except BaseException:
+                self.slots.release()
+                raise
+        return connection
+
+    def release(self, connection):
+        if connection is getattr(self.local, "connection", None):
+            return
+        try:
+            # Never hand an open transaction or a half-read result on to another caller
+            if connection.in_transaction or connection.streaming:
+                connection.close()
+            if not connection.closed:
+                with self.lock:
+                    self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def prepare(self, sql):
+        with self.connection() as connection:
+            return RemoteStatement(self, sql, connection.prepare(sql))
+
+    def execute(self, sql, *params):
+        with self.connection() as connection:
+            return connection.execute(sql, *params)
+
+    def query(self, sql, *params, batch=ARRAY_SIZE):
+        """Like Connection.query(); the connection returns to the pool when the cursor is done."""
+        connection = self.acquire()
+        try:
+            cursor = connection.query(sql, *params, batch=batch)
+        except BaseException:
+            self.release(connection)
+            raise
+
+        def end_query():
+            connection.end_query()
+            self.release(connection)
+
+        cursor.on_close = end_query
+        return cursor
+
+    def prometheus(self):
+        with self.connection() as connection:
+            return connection.prometheus()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block as one transaction on one connection:
+            with pool.transaction():
+                ...
+        Statements the thread runs through the pool inside the block use it.
+        """
+        with self.connection() as connection:
+            self.local.connection = connection
+            try:
+                with connection.transaction():
+                    yield self
+            finally:
+                self.local.connection = None
+
+    def close(self):
+        """Close the idle connections."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
@@ -0,0 +1,103 @@
+from itertools import islice
+
+# Rows returned by fetchmany() when no size is given
+ARRAY_SIZE = 100
+
+
+class Cursor:
+    """
+    Lazily evaluated query result.
+
+    Rows are produced one at a time as tuples, in the order of `columns`,
+    so reading a large result does not hold all of it in memory. Rows are
+    read from the live tables, so a cursor from Database.query() holds the
+    database's read lock until it is exhausted or closed: writers wait
+    for open cursors.
+    """
+
+    def __init__(self, columns, rows, on_close=None):
+        """
+        columns: list of (name, type) pairs describing each tuple field.
+        rows: iterable of row tuples.
+        on_close: called once when the cursor is exhausted or closed.
+        """
+        self.columns = columns
+        self.rows = iter(rows)
+        self.rowcount = 0
+        self.arraysize = ARRAY_SIZE
+        self.on_close = on_close
+
+    @property
+    def column_names(self):
+        return [name for name, _ in self.columns]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            row = next(self.rows)
+        except StopIteration:
+            self.close()
+            raise
+        self.rowcount += 1
+        return row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def fetchone(self):
+        """Next row, or None once the result is exhausted."""
+        return next(self, None)
+
+    def fetchmany(self, size=None):
+        """Up to `size` rows (default: arraysize); an empty list at the end."""
+        return list(islice(self, size if size is not None else self.arraysize))
+
+    def fetchall(self):
+        """All remaining rows."""
+        return list(self)
+
+    def close(self):
+        """Stop producing rows and release what the cursor holds."""
+        self.rows = iter(())
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+def format_row(row):
+    """One row of the text table; None (an aggregate over no rows) shows as NULL."""
+    return " | ".join("NULL" if value is None else str(value) for value in row)
+
+
+def render_lines(cursor):
+    """
+    Yield a cursor's rows as lines of the REPL text table:
+    a header, a dash line, one line per row and the row count.
+    """
+    first = cursor.fetchone()
+    if first is None:
+        yield "(0 rows)"
+        return
+
+    header = " | ".join(cursor.column_names)
+    yield header
+    yield "-" * len(header)
+
+    yield format_row(first)
+    for row in cursor:
+        yield format_row(row)
+
+    yield f"\n({cursor.rowcount} rows)"
+
+
+def format_table(cursor):
+    """Render a whole cursor as one text table string."""
+    return "\n".join(render_lines(cursor))
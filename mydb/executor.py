@@ -1,18 +1,294 @@
+import operator
+import threading
+import time
+from contextlib import contextmanager
+from itertools import compress, islice
+
+from mydb.aggregate import (hash_aggregate, index_aggregate, is_aggregate, output_name, output_type,
+                            plan_aggregate, validate_aggregate)
+from mydb.cache import ResultCache, result_key
+from mydb.cursor import Cursor, format_table
+from mydb.statement import PreparedStatement, StatementCache
 from mydb.table import Table
-from mydb.exceptions import TableExistsError, TableNotFoundError
-from mydb.storage import save_database
+from mydb.transaction import Transaction
+from mydb.importer import read_rows
+from mydb.locks import RWLock
+from mydb.metrics import Metrics, format_time
+from mydb.parallel import WorkerPool
+from mydb.planner import (column_distinct, plan_access, plan_join, plan_select, range_bounds, sort_cost,
+                          traced, validate_where)
+from mydb.exceptions import SchemaError, TableExistsError, TableNotFoundError
+from mydb.filelock import LOCK_FILE, ProcessLock
+from mydb.segments import ENCODINGS
+from mydb.storage import (BACKENDS, apply_live_record, load_database, save_database, serialize_columns,
+                          snapshot_size)
+from mydb.vector import COMPARISONS, conditions, filter_positions, selections
+from mydb.wal import CHECKPOINT_BYTES, WAL_FILE, WriteAheadLog, scan_log
+
+def row_matches(row, where, fields):
+    """Evaluate a WHERE clause against a row; fields is the table's column -> tuple position map."""
+    op = where.get("op", "=")
+    if op == "AND":
+        return all(row_matches(row, condition, fields) for condition in where["conditions"])
+    if op == "OR":
+        return any(row_matches(row, condition, fields) for condition in where["conditions"])
+
+    value = row[fields[where["column"]]]
+    if op == "BETWEEN":
+        low, high = where["value"]
+        return low <= value <= high
+    return COMPARISONS[op](value, where["value"])
+
+
+def check_limit(ast):
+    """LIMIT and OFFSET must be non-negative integers (they can be bound ? parameters)."""
+    for clause in ("limit", "offset"):
+        value = ast.get(clause)
+        if value is not None and (type(value) is not int or value < 0):
+            raise ValueError(f"{clause.upper()} must be a non-negative integer, got {value!r}")
+
+
+def limit_rows(rows, ast):
+    """Apply OFFSET and LIMIT lazily, so whatever produces the rows stops once the limit is met."""
+    offset = ast.get("offset") or 0
+    limit = ast.get("limit")
+    if offset or limit is not None:
+        rows = islice(rows, offset, None if limit is None else offset + limit)
+    return rows
+
+
+def project(rows, fields):
+    """Reduce rows to the tuple positions in `fields` (None keeps whole rows)."""
+    if fields is None:
+        return rows
+    if len(fields) == 1:
+        field = fields[0]
+        return ((row[field],) for row in rows)
+    return map(operator.itemgetter(*fields), rows)
+
+
+def sort_rows(rows, field, descending):
+    """Sort rows on one tuple position once the first row is asked for (so EXPLAIN ANALYZE can time it)."""
+    yield from sorted(rows, key=operator.itemgetter(field), reverse=descending)
+
+
+def has_limit(ast):
+    return ast.get("limit") is not None or bool(ast.get("offset"))
+
+
+def describe_where(where, nested=False):
+    """Render a WHERE clause for EXPLAIN, with values replaced by '?'."""
+    op = where.get("op", "=")
+    if op in ("AND", "OR"):
+        text = f" {op} ".join(describe_where(condition, nested=True) for condition in where["conditions"])
+        # OR binds looser than AND, so an OR group inside AND needs parentheses
+        return f"({text})" if nested and op == "OR" else text
+    if op == "BETWEEN":
+        return f"{where['column']} BETWEEN ? AND ?"
+    return f"{where['column']} {op} ?"
+
+
+def describe_limit(output, stmt):
+    """Add the Limit/Offset lines of a query plan."""
+    if stmt.get("limit") is not None:
+        output.append(f"Limit: {stmt['limit']}")
+    if stmt.get("offset"):
+        output.append(f"Offset: {stmt['offset']}")
+
+
+def sorted_groups(table, column, metrics):
+    """
+    Yield (key, rows) in ascending key order, one group per distinct key.
+    Uses the column's ordered index when it has one, otherwise sorts a scan.
+    """
+    if column in table.ordered_indexes:
+        index = table.ordered_indexes[column]
+        metrics.add("index_scans")
+        found = 0
+        try:
+            for key in index.keys():
+                group = [table.rows[row_index] for row_index in index.map[key]]
+                found += len(group)
+                yield key, group
+        finally:
+            metrics.add("index_rows", found)
+        return
+
+    groups = {}
+    field = table.fields[column]
+    for _, row in table.scan():
+        groups.setdefault(row[field], []).append(row)
+    metrics.add("table_scans")
+    metrics.add("rows_scanned", len(table.rows))
+    for key in sorted(groups):
+        yield key, groups[key]
+
+
+# Statements that only read; they run under the shared read lock
+READ_STATEMENTS = ("SELECT", "JOIN", "EXPLAIN")
+
+# Statements that report on the database itself and take no lock
+SHOW_STATEMENTS = ("SHOW_STATS", "SHOW_SLOW_QUERIES")
+
 
 class Database:
-    def __init__(self):
+    def __init__(self, wal=None, backend="json", path=None, lock_path=None, parallelism=1, compression=None):
+        """
+        wal: optional WriteAheadLog. When given, each mutating statement
+        appends one log record instead of rewriting the whole snapshot.
+        backend: snapshot format passed to save_database ("json", "paged"
+        or "segments").
+        path: snapshot file (default: the backend's file in data/).
+        lock_path: lock file shared with other processes using the same
+        files; see Database.open().
+        parallelism: worker processes for large unindexed scans and hash
+        joins; 1 runs everything in this process.
+        compression: "zlib" or "lzma" to compress the segments backend's
+        table files.
+        """
+        if compression is not None and (backend != "segments" or compression not in ENCODINGS):
+            raise ValueError(f"Compression '{compression}' needs the segments backend (zlib or lzma)")
         self.tables = {}
-
-    def execute(self, ast):
+        self.wal = wal
+        self.backend = backend
+        self.path = path
+        self.compression = compression
+        self.snapshot_bytes = 0
+        self.statements = StatementCache()
+        self.results = ResultCache()
+        # Latencies, row and access path counters and the slow query log (SHOW STATS)
+        self.metrics = Metrics()
+        # Open transaction (BEGIN ... COMMIT/ROLLBACK), or None in autocommit mode
+        self.txn = None
+        # Readers share the lock; a writer (or an open transaction) holds it alone
+        self.process_lock = None
+        if lock_path is not None:
+            self.process_lock = ProcessLock(lock_path, on_lock=self.refresh, before_unlock=self.publish)
+        self.lock = RWLock(self.process_lock)
+        # Multi-process state: the generation and checkpoint count from the
+        # lock file this process is in sync with, how far it has read the
+        # log, and whether it changed anything since it took the lock
+        self.generation = None
+        self.checkpoints = 0
+        self.log_offset = 0
+        self.changed = False
+        # Per thread: WAL position this thread still has to fsync
+        self.unsynced = threading.local()
+        self.workers = WorkerPool(parallelism)
+
+    @classmethod
+    def open(cls, path=None, backend="json", wal_path=WAL_FILE, lock_path=LOCK_FILE, fsync=True,
+             parallelism=1, compression=None):
+        """
+        Open a database in WAL mode that other processes (a second web
+        worker, a REPL) may use at the same time.
+        Statements take an advisory lock on `lock_path`: shared for
+        queries, exclusive for changes. On taking it, a process checks the
+        generation counter in the lock file and catches up with what the
+        others changed: new log records are applied to the affected tables
+        only, or, after another process's checkpoint, the tables whose
+        version changed are reloaded from the snapshot.
+        """
+        db = cls(backend=backend, path=path, lock_path=lock_path, parallelism=parallelism, compression=compression)
+        with db.lock.write():
+            # Opening the log repairs a torn tail; only safe while no other
+            # process can be appending to it
+            db.wal = WriteAheadLog(wal_path, fsync=fsync)
+            db.refresh()
+        return db
+
+    def refresh(self):
+        """
+        Catch up with changes other processes made while this one did not
+        hold the process lock. Called by the ProcessLock on every acquire.
+        """
+        if self.wal is None:
+            return
+
+        generation, checkpoints = self.process_lock.read_header()
+        if generation == self.generation:
+            return
+
+        if checkpoints == self.checkpoints and self.generation is not None:
+            # Only new log records: apply them, maintaining indexes
+            records, end = scan_log(self.wal.path, self.log_offset)
+            for record in records:
+                apply_live_record(self.tables, record)
+        else:
+            # The snapshot was rewritten (or this is the first load): swap in
+            # every table whose version or row layout differs from ours
+            fresh = load_database(self.path, wal_path=self.wal.path, backend=self.backend)
+            for name, table in fresh.items():
+                current = self.tables.get(name)
+                if current is None or (current.version, len(current.rows)) != (table.version, len(table.rows)):
+                    self.tables[name] = table
+            for name in set(self.tables) - set(fresh):
+                del self.tables[name]
+            _, end = scan_log(self.wal.path)
+            self.snapshot_bytes = snapshot_size(self.path or BACKENDS[self.backend], self.backend)
+
+        self.wal.size = end
+        self.log_offset = end
+        self.generation = generation
+        self.checkpoints = checkpoints
+
+    def publish(self):
+        """
+        Announce this process's changes by bumping the generation counter.
+        Called by the ProcessLock before it gives up an exclusive lock.
+        """
+        if not self.changed:
+            return
+        self.changed = False
+        self.generation = (self.generation or 0) + 1
+        self.process_lock.write_header(self.generation, self.checkpoints)
+        if self.wal is not None:
+            self.log_offset = self.wal.size
+
+    def execute(self, ast, sql=None):
+        """
+        Run one statement. Queries share the read lock, so they run in
+        parallel; every other statement takes the write lock.
+        Its latency is recorded in self.metrics; `sql`, when given, is the
+        text shown for it in the slow query log.
+        """
+        start = time.perf_counter()
+        try:
+            result = self.run_locked(ast)
+        except BaseException:
+            self.metrics.add("errors")
+            raise
+        self.metrics.statement(ast["type"], time.perf_counter() - start, sql)
+        return result
+
+    def run_locked(self, ast):
+        if ast["type"] in READ_STATEMENTS:
+            with self.lock.read():
+                return self.run(ast)
+
+        # BEGIN/COMMIT/ROLLBACK take and release the write lock themselves;
+        # SHOW only reads the metrics
+        if ast["type"] in ("BEGIN", "COMMIT", "ROLLBACK") + SHOW_STATEMENTS:
+            return self.run(ast)
+
+        with self.lock.write():
+            result = self.run(ast)
+        self.sync_log()
+        return result
+
+    def run(self, ast):
         if ast["type"] == "CREATE_TABLE":
             return self.create_table(ast)
 
+        if ast["type"] == "CREATE_INDEX":
+            return self.create_index(ast)
+
         if ast["type"] == "INSERT":
             return self.insert(ast)
 
+        if ast["type"] == "COPY":
+            return self.copy(ast)
+
         if ast["type"] == "SELECT":
             return self.select(ast)
 
@@ -26,10 +302,183 @@ class Database:
             return self.join(ast)
 
         if ast["type"] == "EXPLAIN":
-            return self.explain(ast["query"])
+            return self.explain(ast["query"], analyze=ast.get("analyze", False))
+
+        if ast["type"] == "BEGIN":
+            return self.begin()
+
+        if ast["type"] == "COMMIT":
+            return self.commit()
+
+        if ast["type"] == "ROLLBACK":
+            return self.rollback()
+
+        if ast["type"] in SHOW_STATEMENTS:
+            return format_table(self.show_cursor(ast))
 
         raise ValueError("Unsupported command")
 
+    def prepare(self, sql):
+        """
+        Parse a statement (or take it from the statement cache) for
+        repeated execution. `?` marks a parameter bound at execute time:
+            stmt = db.prepare("INSERT INTO users VALUES (?, ?)")
+            stmt.execute(1, "a@example.com")
+        """
+        ast, parameter_count = self.statements.get(sql)
+        return PreparedStatement(self, ast, parameter_count, sql)
+
+    def persist(self, table, record, undo=None):
+        """
+        Make one change to `table` durable.
+        Inside a transaction the change is only buffered: its log record is
+        written at COMMIT, and `undo` reverts it on ROLLBACK.
+        """
+        if self.txn is not None:
+            self.txn.record(table, record, undo)
+            table.version += 1
+            record["table"] = table.name
+            record["version"] = table.version
+            return
+
+        table.version += 1
+
+        if self.wal is None:
+            self.checkpoint()
+            return
+
+        record["table"] = table.name
+        record["version"] = table.version
+        self.log(record)
+
+        if self.wal.size >= max(CHECKPOINT_BYTES, self.snapshot_bytes):
+            self.checkpoint()
+
+    def log(self, record):
+        """
+        Append a record to the WAL. Under the write lock the fsync is
+        deferred to sync_log(), called once the lock is released, so that
+        writers queued behind this one can share it (group commit).
+        """
+        self.changed = True
+        if not self.lock.held_for_write():
+            self.wal.append(record)
+            return
+        position = self.wal.append(record, sync=False)
+        self.unsynced.position = max(position, getattr(self.unsynced, "position", 0))
+
+    def sync_log(self):
+        """Wait until this thread's deferred log records are on disk."""
+        position = getattr(self.unsynced, "position", 0)
+        if position and not self.lock.held_for_write():
+            self.unsynced.position = 0
+            self.wal.sync(position)
+
+    def begin(self):
+        """
+        Start a transaction. It holds the write lock until COMMIT or
+        ROLLBACK, so other threads never see its uncommitted changes.
+        """
+        self.lock.acquire_write()
+        if self.txn is not None:
+            self.lock.release_write()
+            raise ValueError("Transaction already in progress")
+        self.txn = Transaction()
+        return "BEGIN"
+
+    def commit(self):
+        """
+        Make every change since BEGIN durable with a single log write.
+        The changes are logged as one record, so a crash part-way through
+        the write leaves a torn record that replay drops as a whole.
+        """
+        if self.txn is None or not self.lock.held_for_write():
+            raise ValueError("No transaction in progress")
+        txn, self.txn = self.txn, None
+
+        try:
+            if not txn.redo:
+                return "COMMIT"
+
+            if self.wal is None:
+                self.checkpoint()
+                return "COMMIT"
+
+            self.log({"op": "transaction", "records": txn.redo})
+            if self.wal.size >= max(CHECKPOINT_BYTES, self.snapshot_bytes):
+                self.checkpoint()
+            return "COMMIT"
+        finally:
+            # Taken by begin()
+            self.lock.release_write()
+            self.sync_log()
+
+    def rollback(self):
+        if self.txn is None or not self.lock.held_for_write():
+            raise ValueError("No transaction in progress")
+        txn, self.txn = self.txn, None
+        try:
+            txn.rollback()
+        finally:
+            self.lock.release_write()
+        return "ROLLBACK"
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block of statements as one transaction:
+            with db.transaction():
+                ...
+        Commits when the block finishes and rolls back if it raises.
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def checkpoint(self):
+        """
+        Compact the write-ahead log back into a snapshot.
+        Tables with many deleted rows have their tombstones dropped first.
+        """
+        with self.lock.write():
+            if self.txn is not None:
+                raise ValueError("Cannot checkpoint inside a transaction")
+
+            for table in self.tables.values():
+                if table.needs_compaction():
+                    table.compact()
+
+            start = time.perf_counter()
+            written = save_database(self.tables, self.path, backend=self.backend, compression=self.compression)
+            self.metrics.add("snapshots")
+            self.metrics.add("snapshot_seconds", time.perf_counter() - start)
+            self.metrics.add("snapshot_bytes", written)
+            # Segmented snapshots rewrite only the changed tables
+            self.snapshot_bytes = snapshot_size(self.path or BACKENDS[self.backend], self.backend)
+            if self.wal is not None:
+                self.wal.truncate()
+            self.checkpoints += 1
+            self.changed = True
+
+    def close(self):
+        with self.lock.write():
+            # Changes of a transaction that was never committed are discarded
+            if self.txn is not None:
+                self.rollback()
+
+            if self.wal is not None:
+                # An empty log means the snapshot is already up to date
+                if self.wal.size:
+                    self.checkpoint()
+                self.wal.close()
+        if self.process_lock is not None:
+            self.process_lock.close()
+        self.workers.close()
+
     def create_table(self, ast):
         name = ast["table"]
         if name in self.tables:
@@ -37,73 +486,313 @@ class Database:
 
         table = Table(name, ast["columns"])
         self.tables[name] = table
-        save_database(self.tables)
+        self.persist(table, {"op": "create", "columns": serialize_columns(table.columns)},
+                     undo=lambda: self.tables.pop(name))
         return f"Table '{name}' created"
 
     def insert(self, ast):
         table_name = ast["table"]
-        values = ast["values"]
+        rows = ast["rows"]
 
         if table_name not in self.tables:
             raise TableNotFoundError(f"Table '{table_name}' does not exist")
 
         table = self.tables[table_name]
-        table.insert(values)
-        save_database(self.tables)
-        return "1 row inserted"
-
-    def select(self, ast):
+        start = len(table.rows)
+        table.insert_many(rows)
+        self.persist(table, {"op": "insert", "rows": rows}, undo=lambda: table.truncate(start))
+        if len(rows) == 1:
+            return "1 row inserted"
+        return f"{len(rows)} rows inserted"
+
+    def copy(self, ast):
+        """
+        Bulk-load a CSV or JSONL file into a table.
+        The whole file is validated before any row is added, then the load
+        is made durable with a single snapshot write instead of one log
+        record per row.
+        """
         table_name = ast["table"]
 
         if table_name not in self.tables:
             raise TableNotFoundError(f"Table '{table_name}' does not exist")
 
         table = self.tables[table_name]
-        headers = list(table.columns.keys())
-
-        # Apply WHERE filter if present
-        rows = table.rows
-        where_clause = ast.get("where")
+        rows = list(read_rows(ast["path"], table.columns))
+        start = len(table.rows)
+        count = table.insert_many(rows)
+
+        if count and self.txn is not None:
+            # Inside a transaction the rows are logged at COMMIT like an INSERT
+            self.persist(table, {"op": "insert", "rows": rows}, undo=lambda: table.truncate(start))
+        elif count:
+            table.version += 1
+            self.checkpoint()
+        return f"{count} row(s) copied"
+
+    def create_index(self, ast):
+        table_name = ast["table"]
+        name = ast["name"]
 
-        if where_clause:
-            column = where_clause["column"]
-            value = where_clause["value"]
+        if table_name not in self.tables:
+            raise TableNotFoundError(f"Table '{table_name}' does not exist")
 
-            # Validate column exists
-            if column not in headers:
-                raise ValueError(f"Unknown column '{column}'")
+        for other in self.tables.values():
+            if name in other.index_names():
+                raise ValueError(f"Index '{name}' already exists")
 
-            # Use index if available for O(1) lookup
-            if column in table.indexes:
-                index = table.indexes[column]["map"]
-                if value in index:
-                    row_index = index[value]
-                    rows = [table.rows[row_index]]
-                else:
-                    rows = []
-            else:
-                # Fallback to table scan
-                filtered_rows = []
-                for row in rows:
-                    if row[column] == value:
-                        filtered_rows.append(row)
-                rows = filtered_rows
+        table = self.tables[table_name]
+        table.create_index(name, ast["column"])
+        self.persist(table, {"op": "create_index", "name": name, "column": ast["column"]},
+                     undo=lambda: table.drop_index(ast["column"]))
+        return f"Index '{name}' created"
 
-        if not rows:
-            return "(0 rows)"
+    def select(self, ast):
+        cursor = self.result_cursor(ast)
+        output = format_table(cursor)
+        self.metrics.add("rows_returned", cursor.rowcount)
+        return output
+
+    def query(self, ast, sql=None):
+        """
+        Run a SELECT or JOIN (or SHOW) and return a Cursor over its rows
+        instead of a formatted table. The cursor holds the read lock until
+        it is exhausted or closed; the statement's latency in the metrics
+        runs until then too.
+        """
+        if ast["type"] in SHOW_STATEMENTS:
+            return self.show_cursor(ast)
+        if ast["type"] not in ("SELECT", "JOIN"):
+            raise ValueError(f"{ast['type']} does not return rows")
+
+        start = time.perf_counter()
+        owner = self.lock.acquire_read()
+        try:
+            cursor = self.result_cursor(ast)
+        except BaseException:
+            self.lock.release_read(owner)
+            self.metrics.add("errors")
+            raise
+
+        def finish():
+            self.lock.release_read(owner)
+            self.metrics.statement(ast["type"], time.perf_counter() - start, sql, cursor.rowcount)
+
+        cursor.on_close = finish
+        return cursor
+
+    def result_cursor(self, ast):
+        """
+        Cursor over a SELECT or JOIN, served from the result cache when the
+        same query already ran against the same state of its tables.
+        """
+        if ast["type"] == "SELECT":
+            names, make_cursor = (ast["table"],), self.select_cursor
+        else:
+            names, make_cursor = (ast["left_table"], ast["right_table"]), self.join_cursor
+        if any(name not in self.tables for name in names):
+            return make_cursor(ast)
+
+        key = result_key(ast, [self.tables[name] for name in names])
+        entry = self.results.get(key)
+        if entry is not None:
+            columns, rows = entry
+            return Cursor(columns, rows)
+        return self.results.collect(key, make_cursor(ast))
+
+    def select_cursor(self, ast, trace=None):
+        table_name = ast["table"]
 
-        # Header
-        output = []
-        output.append(" | ".join(headers))
-        output.append("-" * (len(output[0])))
+        if table_name not in self.tables:
+            raise TableNotFoundError(f"Table '{table_name}' does not exist")
 
-        # Rows
-        for row in rows:
-            line = " | ".join(str(row[col]) for col in headers)
-            output.append(line)
+        table = self.tables[table_name]
+        check_limit(ast)
+        if is_aggregate(ast):
+            return self.aggregate_cursor(table, ast, trace)
+        fields = self.projection(table, ast)
+
+        plan = plan_select(table, ast)
+        if plan["strategy"] == "FULL TABLE SCAN" and not plan["sort"]:
+            rows = traced(trace, "FULL TABLE SCAN", self.scan_range(table, fields, ast))
+        else:
+            rows = self.select_rows(table, ast, plan, trace)
+            if fields is not None:
+                rows = traced(trace, "Project", project(rows, fields))
 
-        output.append(f"\n({len(rows)} rows)")
-        return "\n".join(output)
+        # Stored rows already are tuples in column order
+        headers = list(table.columns.keys())
+        if fields is not None:
+            headers = [headers[field] for field in fields]
+        columns = [(col, table.columns[col]["type"]) for col in headers]
+        return Cursor(columns, rows)
+
+    def projection(self, table, ast):
+        """Tuple positions of a SELECT's column list, in select order; None for all columns."""
+        if ast.get("columns") is None:
+            return None
+        fields = []
+        for item in ast["columns"]:
+            if item["column"] not in table.fields:
+                raise ValueError(f"Unknown column '{item['column']}'")
+            fields.append(table.fields[item["column"]])
+        if fields == list(range(len(table.fields))):
+            return None
+        return fields
+
+    def scan_range(self, table, fields, ast):
+        """
+        Rows of a SELECT with no WHERE or ORDER BY. Without deleted rows,
+        slot n holds row n, so OFFSET and LIMIT become a slot range and
+        nothing outside it is read; only the selected fields are decoded.
+        """
+        self.metrics.add("table_scans")
+        if not table.deleted:
+            offset = ast.get("offset") or 0
+            limit = ast.get("limit")
+            stop = None if limit is None else offset + limit
+            self.metrics.add("rows_scanned", len(range(len(table.rows))[offset:stop]))
+            return table.read_columns(fields, offset, stop)
+        return limit_rows(self.metrics.counted(table.read_columns(fields), "rows_scanned"), ast)
+
+    def aggregate_cursor(self, table, ast, trace=None):
+        """
+        Run a SELECT with aggregate functions and/or GROUP BY.
+        Counts and index-backed MIN/MAX are answered without reading rows;
+        everything else streams the matching rows through hash_aggregate.
+        """
+        validate_aggregate(table, ast)
+        strategy = plan_aggregate(table, ast)
+
+        if strategy == "HASH AGGREGATE":
+            # ORDER BY and LIMIT apply to the groups, not to the input rows
+            source = {"where": ast.get("where"), "order_by": None}
+            rows = self.select_rows(table, source, plan_select(table, source), trace)
+            rows = traced(trace, strategy, hash_aggregate(table, ast, rows))
+        else:
+            if strategy.startswith("INDEX"):
+                self.metrics.add("index_scans")
+            rows = traced(trace, strategy, index_aggregate(table, ast, strategy),
+                          index=strategy.startswith("INDEX"))
+
+        order_by = ast.get("order_by")
+        if order_by:
+            names = [output_name(item) for item in ast["columns"]]
+            rows = traced(trace, "Sort", sort_rows(rows, names.index(order_by["column"]),
+                                                   order_by["direction"] == "DESC"))
+        if has_limit(ast):
+            rows = traced(trace, "Limit", limit_rows(rows, ast))
+
+        columns = [(output_name(item), output_type(table, item)) for item in ast["columns"]]
+        return Cursor(columns, rows)
+
+    def index_positions(self, table, strategy, condition, reverse=False):
+        """Row positions produced by an index access path from plan_access."""
+        if strategy == "INDEX LOOKUP":
+            row_index = table.indexes[condition["column"]]["map"].get(condition["value"])
+            return [] if row_index is None else [row_index]
+
+        if condition.get("op", "=") == "=":
+            try:
+                table.check_value(condition["column"], condition["value"])
+            except SchemaError:
+                # Equals no value of the column, as on a scan; the index cannot compare it
+                return []
+        index = table.ordered_indexes[condition["column"]]
+        return index.range(reverse=reverse, **range_bounds(condition))
+
+    def select_rows(self, table, ast, plan, trace=None):
+        """
+        Produce the rows of a SELECT following a plan from plan_select.
+        Rows are generated lazily; a plan that needs an explicit sort reads
+        all of them when the first row is asked for. With a `trace` list,
+        every operator is recorded in it for EXPLAIN ANALYZE.
+        """
+        where_clause = ast.get("where")
+        order_by = ast.get("order_by")
+        limit = ast.get("limit")
+        strategy = plan["strategy"]
+
+        # Index order only matters when it is also the ORDER BY column
+        descending = (order_by is not None and order_by["column"] == plan["column"]
+                      and order_by["direction"] == "DESC")
+
+        if strategy in ("INDEX LOOKUP", "ORDERED INDEX LOOKUP", "INDEX RANGE SCAN"):
+            positions = self.index_positions(table, strategy, plan["condition"], reverse=descending)
+            rows = self.index_rows(table, positions)
+        elif strategy == "INDEX ORDER SCAN":
+            positions = table.ordered_indexes[plan["column"]].range(reverse=descending)
+            rows = self.index_rows(table, positions)
+        elif plan["filter"]:
+            # No index applies: the WHERE clause is evaluated over column
+            # batches, on the worker pool for large tables unless LIMIT can
+            # stop the scan early
+            rows = self.filter_scan(table, where_clause, parallel=limit is None or plan["sort"])
+        else:
+            rows = self.table_scan(table)
+        rows = traced(trace, strategy, rows, index=plan["column"] is not None)
+
+        if plan["filter"] and strategy != "TABLE SCAN":
+            rows = traced(trace, "Filter", (row for row in rows if row_matches(row, where_clause, table.fields)))
+
+        if plan["sort"]:
+            rows = traced(trace, "Sort", sort_rows(rows, table.fields[order_by["column"]],
+                                                   order_by["direction"] == "DESC"))
+
+        if has_limit(ast):
+            rows = traced(trace, "Limit", limit_rows(rows, ast))
+        return rows
+
+    def filter_scan(self, table, where, parallel):
+        """
+        Live rows matching a WHERE clause, filtered in column batches; on
+        the worker pool when `parallel` and the table is large enough.
+        """
+        self.metrics.add("table_scans")
+        positions = self.workers.filter_positions(table, where) if parallel else None
+        if positions is None:
+            for _, chunk, bitmap in selections(table, where):
+                self.metrics.add("rows_scanned", len(chunk))
+                yield from compress(chunk, bitmap)
+            return
+        self.metrics.add("rows_scanned", len(table.rows))
+        for row_index in positions:
+            yield table.rows[row_index]
+
+    def table_scan(self, table):
+        """Every live row of a table, counted in the metrics as a table scan."""
+        self.metrics.add("table_scans")
+        # The last slot reached tells how far the scan got
+        position = -1
+        try:
+            for position, row in table.scan():
+                yield row
+        finally:
+            self.metrics.add("rows_scanned", position + 1)
+
+    def index_rows(self, table, positions):
+        """The rows at positions found through an index, counted in the metrics as index hits."""
+        self.metrics.add("index_scans")
+        return self.metrics.counted(map(table.rows.__getitem__, positions), "index_rows")
+
+    def matching_positions(self, table, where):
+        """Positions of the live rows matching a WHERE clause, via an index when one applies."""
+        strategy, condition = plan_access(table, where)
+        if strategy is None:
+            self.metrics.add("table_scans")
+            self.metrics.add("rows_scanned", len(table.rows))
+            positions = self.workers.filter_positions(table, where)
+            if positions is None:
+                positions = filter_positions(table, where)
+            return positions
+
+        positions = list(self.index_positions(table, strategy, condition))
+        self.metrics.add("index_scans")
+        self.metrics.add("index_rows", len(positions))
+        if len(conditions(where)) > 1:
+            return [row_index for row_index in positions
+                    if row_matches(table.rows[row_index], where, table.fields)]
+        return positions
 
     def update(self, ast):
         table_name = ast["table"]
@@ -114,45 +803,27 @@ class Database:
         table = self.tables[table_name]
         headers = list(table.columns.keys())
 
-        set_column = ast["set"]["column"]
-        set_value = ast["set"]["value"]
-        where_column = ast["where"]["column"]
-        where_value = ast["where"]["value"]
-
-        # Validate columns exist
-        if set_column not in headers:
-            raise ValueError(f"Unknown column '{set_column}'")
-        if where_column not in headers:
-            raise ValueError(f"Unknown column '{where_column}'")
-
-        # Update rows matching WHERE condition
-        count = 0
-        for row_index, row in enumerate(table.rows):
-            if row[where_column] == where_value:
-                # If updating an indexed column, update the index
-                if set_column in table.indexes:
-                    old_key = row[set_column]
-                    new_key = set_value
-                    
-                    # Check for duplicate if new key already exists (and it's not the same row)
-                    if new_key in table.indexes[set_column]["map"]:
-                        existing_row_index = table.indexes[set_column]["map"][new_key]
-                        if existing_row_index != row_index:
-                            raise ValueError(f"Duplicate value for indexed column '{set_column}': {new_key}")
-                    
-                    # Remove old key from index
-                    if old_key in table.indexes[set_column]["map"]:
-                        del table.indexes[set_column]["map"][old_key]
-                    
-                    # Add new key to index
-                    table.indexes[set_column]["map"][new_key] = row_index
-                
-                # Update the row
-                row[set_column] = set_value
-                count += 1
-
-        save_database(self.tables)
-        return f"{count} row(s) updated"
+        # Validate columns exist and values match their types
+        changes = {}
+        for assignment in ast["set"]:
+            column = assignment["column"]
+            if column not in headers:
+                raise ValueError(f"Unknown column '{column}'")
+            table.check_value(column, assignment["value"])
+            changes[column] = assignment["value"]
+        validate_where(table, ast["where"])
+
+        # Find matching rows (through an index when possible) and update
+        # them as one batch, so a constraint violation changes nothing
+        updated = self.matching_positions(table, ast["where"])
+        saved = [(row_index, {column: table.rows[row_index][table.fields[column]] for column in changes})
+                 for row_index in updated]
+        table.update_rows(updated, changes)
+
+        if updated:
+            self.persist(table, {"op": "update", "rows": updated, "set": changes},
+                         undo=lambda: table.restore_values(saved))
+        return f"{len(updated)} row(s) updated"
 
     def delete(self, ast):
         table_name = ast["table"]
@@ -161,33 +832,79 @@ class Database:
             raise TableNotFoundError(f"Table '{table_name}' does not exist")
 
         table = self.tables[table_name]
-        headers = list(table.columns.keys())
-
-        where_column = ast["where"]["column"]
-        where_value = ast["where"]["value"]
-
-        # Validate column exists
-        if where_column not in headers:
-            raise ValueError(f"Unknown column '{where_column}'")
+        validate_where(table, ast["where"])
 
-        # Delete rows matching WHERE condition
-        before_count = len(table.rows)
-        table.rows = [row for row in table.rows if row[where_column] != where_value]
-        deleted_count = before_count - len(table.rows)
+        # Find matching rows (through an index when possible) and tombstone them
+        deleted = self.matching_positions(table, ast["where"])
+        saved = [(row_index, table.rows[row_index]) for row_index in deleted]
+        for row_index in deleted:
+            table.delete_row(row_index)
 
-        # Rebuild all indexes after deletion (simplest and most correct approach)
-        if deleted_count > 0:
-            table.rebuild_indexes()
+        if deleted:
+            self.persist(table, {"op": "delete", "rows": deleted},
+                         undo=lambda: table.undelete_rows(saved))
 
-        save_database(self.tables)
-        return f"{deleted_count} row(s) deleted"
+        return f"{len(deleted)} row(s) deleted"
 
     def join(self, ast):
+        return self.select(ast)
+
+    def join_cursor(self, ast, trace=None):
         left_table_name = ast["left_table"]
         right_table_name = ast["right_table"]
         left_column = ast["left_column"]
         right_column = ast["right_column"]
 
+        left_table, right_table = self.join_tables(ast)
+        check_limit(ast)
+        fields = self.join_projection(ast, left_table, right_table)
+
+        left_headers = list(left_table.columns.keys())
+        right_headers = list(right_table.columns.keys())
+
+        plan = plan_join(left_table, left_column, right_table, right_column)
+        pairs = traced(trace, plan["strategy"], self.join_pairs(plan, left_table, left_column,
+                                                                  right_table, right_column),
+                       index=plan["strategy"] == "INDEX LOOKUP")
+        # OFFSET/LIMIT apply to the pairs, so skipped pairs are never combined
+        # and a lazy join operator stops once the limit is met
+        if has_limit(ast):
+            pairs = traced(trace, "Limit", limit_rows(pairs, ast))
+
+        # Result columns are prefixed with their table name, left table first
+        columns = [(f"{left_table_name}.{col}", left_table.columns[col]["type"]) for col in left_headers] + \
+                  [(f"{right_table_name}.{col}", right_table.columns[col]["type"]) for col in right_headers]
+        rows = (left_row + right_row for left_row, right_row in pairs)
+        if fields is not None:
+            columns = [columns[field] for field in fields]
+            rows = traced(trace, "Project", project(rows, fields))
+        return Cursor(columns, rows)
+
+    def join_projection(self, ast, left_table, right_table):
+        """
+        Positions of a JOIN's `table.column` list in the combined row (left
+        columns first); None for SELECT *.
+        """
+        if ast.get("columns") is None:
+            return None
+        # The left table wins when a table is joined with itself
+        sides = {ast["right_table"]: (right_table, len(left_table.fields)),
+                 ast["left_table"]: (left_table, 0)}
+        fields = []
+        for item in ast["columns"]:
+            if item["table"] not in sides:
+                raise ValueError(f"Table '{item['table']}' is not part of the JOIN")
+            table, base = sides[item["table"]]
+            if item["column"] not in table.fields:
+                raise ValueError(f"Unknown column '{item['column']}' in table '{item['table']}'")
+            fields.append(base + table.fields[item["column"]])
+        return fields
+
+    def join_tables(self, ast):
+        """Validate a JOIN's tables and columns; returns (left_table, right_table)."""
+        left_table_name = ast["left_table"]
+        right_table_name = ast["right_table"]
+
         # Validate tables exist
         if left_table_name not in self.tables:
             raise TableNotFoundError(f"Table '{left_table_name}' does not exist")
@@ -197,80 +914,148 @@ class Database:
         left_table = self.tables[left_table_name]
         right_table = self.tables[right_table_name]
 
-        left_headers = list(left_table.columns.keys())
-        right_headers = list(right_table.columns.keys())
-
         # Validate columns exist
-        if left_column not in left_headers:
-            raise ValueError(f"Unknown column '{left_column}' in table '{left_table_name}'")
-        if right_column not in right_headers:
-            raise ValueError(f"Unknown column '{right_column}' in table '{right_table_name}'")
-
-        # Prefer index on right table for O(1) lookup
-        result_rows = []
-
-        if right_column in right_table.indexes:
-            # Use index for fast lookup
-            index = right_table.indexes[right_column]["map"]
-            for left_row in left_table.rows:
-                key = left_row[left_column]
-                if key in index:
-                    right_row_index = index[key]
-                    right_row = right_table.rows[right_row_index]
-                    # Combine rows
-                    combined_row = {}
-                    # Add left table columns with table prefix
-                    for col in left_headers:
-                        combined_row[f"{left_table_name}.{col}"] = left_row[col]
-                    # Add right table columns with table prefix
-                    for col in right_headers:
-                        combined_row[f"{right_table_name}.{col}"] = right_row[col]
-                    result_rows.append(combined_row)
-        else:
-            # Fallback to nested loop (table scan)
-            for left_row in left_table.rows:
-                key = left_row[left_column]
-                for right_row in right_table.rows:
-                    if right_row[right_column] == key:
-                        # Combine rows
-                        combined_row = {}
-                        # Add left table columns with table prefix
-                        for col in left_headers:
-                            combined_row[f"{left_table_name}.{col}"] = left_row[col]
-                        # Add right table columns with table prefix
-                        for col in right_headers:
-                            combined_row[f"{right_table_name}.{col}"] = right_row[col]
-                        result_rows.append(combined_row)
-
-        if not result_rows:
-            return "(0 rows)"
-
-        # Build output with prefixed column names
-        output_headers = [f"{left_table_name}.{col}" for col in left_headers] + \
-                        [f"{right_table_name}.{col}" for col in right_headers]
-
-        # Header
-        output = []
-        output.append(" | ".join(output_headers))
-        output.append("-" * (len(output[0])))
+        if ast["left_column"] not in left_table.columns:
+            raise ValueError(f"Unknown column '{ast['left_column']}' in table '{left_table_name}'")
+        if ast["right_column"] not in right_table.columns:
+            raise ValueError(f"Unknown column '{ast['right_column']}' in table '{right_table_name}'")
 
-        # Rows
-        for row in result_rows:
-            line = " | ".join(str(row[col]) for col in output_headers)
-            output.append(line)
+        return left_table, right_table
 
-        output.append(f"\n({len(result_rows)} rows)")
-        return "\n".join(output)
+    def join_pairs(self, plan, left_table, left_column, right_table, right_column):
+        """Yield matching (left_row, right_row) pairs using the operator in `plan`."""
+        strategy = plan["strategy"]
+
+        if strategy == "INDEX LOOKUP":
+            if plan["side"] == "right":
+                outer, outer_column, inner, inner_column = left_table, left_column, right_table, right_column
+            else:
+                outer, outer_column, inner, inner_column = right_table, right_column, left_table, left_column
+
+            outer_field = outer.fields[outer_column]
+            self.metrics.add("index_scans")
+            found = 0
+            try:
+                for outer_row in self.table_scan(outer):
+                    key = outer_row[outer_field]
+                    if plan["index"] == "hash":
+                        row_index = inner.indexes[inner_column]["map"].get(key)
+                        positions = () if row_index is None else (row_index,)
+                    else:
+                        positions = inner.ordered_indexes[inner_column].lookup(key)
+                    for row_index in positions:
+                        found += 1
+                        inner_row = inner.rows[row_index]
+                        if plan["side"] == "right":
+                            yield outer_row, inner_row
+                        else:
+                            yield inner_row, outer_row
+            finally:
+                self.metrics.add("index_rows", found)
+
+        elif strategy == "HASH JOIN":
+            if plan["side"] == "left":
+                build, build_column, probe, probe_column = left_table, left_column, right_table, right_column
+            else:
+                build, build_column, probe, probe_column = right_table, right_column, left_table, left_column
+
+            # Large inputs: build and probe on the worker pool
+            pairs = self.workers.hash_join(build, build_column, probe, probe_column)
+            if pairs is not None:
+                self.metrics.add("table_scans", 2)
+                self.metrics.add("rows_scanned", len(build.rows) + len(probe.rows))
+                for build_index, probe_index in pairs:
+                    if plan["side"] == "left":
+                        yield build.rows[build_index], probe.rows[probe_index]
+                    else:
+                        yield probe.rows[probe_index], build.rows[build_index]
+                return
+
+            # Build phase: key -> every row with that key (duplicates allowed)
+            buckets = {}
+            build_field = build.fields[build_column]
+            for row in self.table_scan(build):
+                buckets.setdefault(row[build_field], []).append(row)
+
+            # Probe phase
+            probe_field = probe.fields[probe_column]
+            for probe_row in self.table_scan(probe):
+                for build_row in buckets.get(probe_row[probe_field], ()):
+                    if plan["side"] == "left":
+                        yield build_row, probe_row
+                    else:
+                        yield probe_row, build_row
+
+        elif strategy == "SORT-MERGE JOIN":
+            left_groups = sorted_groups(left_table, left_column, self.metrics)
+            right_groups = sorted_groups(right_table, right_column, self.metrics)
+            left_key, left_group = next(left_groups, (None, None))
+            right_key, right_group = next(right_groups, (None, None))
+
+            while left_group is not None and right_group is not None:
+                if left_key < right_key:
+                    left_key, left_group = next(left_groups, (None, None))
+                elif left_key > right_key:
+                    right_key, right_group = next(right_groups, (None, None))
+                else:
+                    for left_row in left_group:
+                        for right_row in right_group:
+                            yield left_row, right_row
+                    left_key, left_group = next(left_groups, (None, None))
+                    right_key, right_group = next(right_groups, (None, None))
 
-    def explain(self, stmt):
-        """Explain how a query will be executed without actually running it."""
+        else:
+            # Nested loop (table scan)
+            left_field = left_table.fields[left_column]
+            right_field = right_table.fields[right_column]
+            for left_row in self.table_scan(left_table):
+                key = left_row[left_field]
+                for right_row in self.table_scan(right_table):
+                    if right_row[right_field] == key:
+                        yield left_row, right_row
+
+    def explain(self, stmt, analyze=False):
+        """
+        Explain how a query will be executed. With analyze (EXPLAIN
+        ANALYZE) the query is also run and what actually happened is
+        reported after the plan.
+        """
+        if stmt["type"] == "JOIN":
+            output = self.explain_join(stmt)
+        elif stmt["type"] == "SELECT":
+            output = self.explain_select(stmt)
+        else:
+            raise ValueError("EXPLAIN not supported for this statement type")
+
+        if analyze:
+            output += "\n\n" + self.explain_analyze(stmt)
+        return output
+
+    def explain_analyze(self, stmt):
+        """
+        Run a query with every operator traced and report the rows each
+        produced and its time (which includes the operators it reads
+        from), the rows found through indexes and the total time.
+        """
+        trace = []
+        start = time.perf_counter()
         if stmt["type"] == "JOIN":
-            return self.explain_join(stmt)
-        
-        if stmt["type"] == "SELECT":
-            return self.explain_select(stmt)
-        
-        raise ValueError("EXPLAIN not supported for this statement type")
+            cursor = self.join_cursor(stmt, trace)
+        else:
+            cursor = self.select_cursor(stmt, trace)
+        rows = len(cursor.fetchall())
+        elapsed = time.perf_counter() - start
+
+        output = []
+        output.append("EXECUTION")
+        output.append("---------")
+        for step in trace:
+            output.append(f"{step.name}: {step.rows} rows, {step.seconds * 1000:.3f} ms")
+        output.append(f"Index Hits: {sum(step.rows for step in trace if step.index)}")
+        output.append(f"Actual Rows: {rows}")
+        output.append(f"Execution Time: {elapsed * 1000:.3f} ms")
+
+        return "\n".join(output)
 
     def explain_join(self, stmt):
         """Explain a JOIN query execution plan."""
@@ -279,32 +1064,44 @@ class Database:
         left_column = stmt["left_column"]
         right_column = stmt["right_column"]
 
-        # Validate tables exist
-        if left_table_name not in self.tables:
-            raise TableNotFoundError(f"Table '{left_table_name}' does not exist")
-        if right_table_name not in self.tables:
-            raise TableNotFoundError(f"Table '{right_table_name}' does not exist")
-
-        right_table = self.tables[right_table_name]
+        left_table, right_table = self.join_tables(stmt)
+        check_limit(stmt)
+        self.join_projection(stmt, left_table, right_table)
+        plan = plan_join(left_table, left_column, right_table, right_column)
 
-        # Determine strategy based on index availability
-        if right_column in right_table.indexes:
-            strategy = f"INDEX LOOKUP ({right_table_name}.{right_column})"
-            cost = "O(n)"
+        # Describe the chosen operator
+        if plan["strategy"] == "INDEX LOOKUP":
+            if plan["side"] == "right":
+                strategy = f"INDEX LOOKUP ({right_table_name}.{right_column})"
+            else:
+                strategy = f"INDEX LOOKUP ({left_table_name}.{left_column})"
+        elif plan["strategy"] == "HASH JOIN":
+            build_table = left_table_name if plan["side"] == "left" else right_table_name
+            strategy = f"HASH JOIN (build: {build_table})"
         else:
-            strategy = "NESTED LOOP JOIN"
-            cost = "O(n²)"
+            strategy = plan["strategy"]
 
         output = []
         output.append("QUERY PLAN")
         output.append("----------")
         output.append("Operation: JOIN")
         output.append("Join Type: INNER")
-        output.append(f"Left Table: {left_table_name}")
-        output.append(f"Right Table: {right_table_name}")
+        output.append(f"Left Table: {left_table_name} ({plan['left_rows']} rows)")
+        output.append(f"Right Table: {right_table_name} ({plan['right_rows']} rows)")
         output.append(f"Join Condition: {left_table_name}.{left_column} = {right_table_name}.{right_column}")
+        if stmt.get("columns") is not None:
+            output.append(f"Columns: {', '.join(item['table'] + '.' + item['column'] for item in stmt['columns'])}")
         output.append(f"Strategy: {strategy}")
-        output.append(f"Estimated Cost: {cost}")
+        if plan["strategy"] == "HASH JOIN":
+            probe_table = right_table if plan["side"] == "left" else left_table
+            if self.workers.applies(probe_table):
+                output.append(f"Workers: {self.workers.workers}")
+        describe_limit(output, stmt)
+        rows = max(plan["estimated_rows"] - (stmt.get("offset") or 0), 0)
+        if stmt.get("limit") is not None:
+            rows = min(rows, stmt["limit"])
+        output.append(f"Estimated Rows: {rows}")
+        output.append(f"Estimated Cost: {plan['cost']}")
 
         return "\n".join(output)
 
@@ -312,31 +1109,125 @@ class Database:
         """Explain a SELECT query execution plan."""
         table_name = stmt["table"]
         where_clause = stmt.get("where")
+        order_by = stmt.get("order_by")
+        limit = stmt.get("limit")
 
         # Validate table exists
         if table_name not in self.tables:
             raise TableNotFoundError(f"Table '{table_name}' does not exist")
 
         table = self.tables[table_name]
+        check_limit(stmt)
+        if is_aggregate(stmt):
+            return self.explain_aggregate(table, stmt)
+        fields = self.projection(table, stmt)
+        plan = plan_select(table, stmt)
+        strategy = plan["strategy"]
 
         output = []
         output.append("QUERY PLAN")
         output.append("----------")
         output.append("Operation: SELECT")
         output.append(f"Table: {table_name}")
+        if fields is not None:
+            output.append(f"Columns: {', '.join(item['column'] for item in stmt['columns'])}")
 
         if where_clause:
-            column = where_clause["column"]
-            if column in table.indexes:
-                output.append(f"Filter: {column} = ?")
-                output.append("Strategy: INDEX LOOKUP")
-                output.append("Estimated Cost: O(1)")
-            else:
-                output.append(f"Filter: {column} = ?")
-                output.append("Strategy: TABLE SCAN")
-                output.append("Estimated Cost: O(n)")
+            output.append(f"Filter: {describe_where(where_clause)}")
+
+        if strategy in ("ORDERED INDEX LOOKUP", "INDEX RANGE SCAN", "INDEX ORDER SCAN"):
+            index = table.ordered_indexes[plan["column"]]
+            output.append(f"Strategy: {strategy} ({index.name} on {table_name}.{index.column})")
         else:
-            output.append("Strategy: FULL TABLE SCAN")
-            output.append("Estimated Cost: O(n)")
+            output.append(f"Strategy: {strategy}")
+        if strategy == "TABLE SCAN" and (limit is None or plan["sort"]) and self.workers.applies(table):
+            output.append(f"Workers: {self.workers.workers}")
+        if plan["filter"] and plan["condition"] is not None:
+            output.append(f"Index Condition: {describe_where(plan['condition'])}")
+
+        if order_by:
+            how = "SORT" if plan["sort"] else "INDEX ORDER"
+            output.append(f"Order: {order_by['column']} {order_by['direction']} ({how})")
+        describe_limit(output, stmt)
+        output.append(f"Estimated Rows: {plan['estimated_rows']}")
+        output.append(f"Estimated Cost: {plan['cost']}")
 
         return "\n".join(output)
+
+    def explain_aggregate(self, table, stmt):
+        """Explain a SELECT with aggregates and/or GROUP BY."""
+        validate_aggregate(table, stmt)
+        strategy = plan_aggregate(table, stmt)
+        where_clause = stmt.get("where")
+        order_by = stmt.get("order_by")
+
+        output = []
+        output.append("QUERY PLAN")
+        output.append("----------")
+        output.append("Operation: SELECT (aggregate)")
+        output.append(f"Table: {table.name}")
+        output.append(f"Columns: {', '.join(output_name(item) for item in stmt['columns'])}")
+
+        if where_clause:
+            output.append(f"Filter: {describe_where(where_clause)}")
+        if stmt.get("group_by"):
+            output.append(f"Group By: {stmt['group_by']}")
+
+        group_by = stmt.get("group_by")
+        if strategy == "HASH AGGREGATE":
+            source = {"where": where_clause, "order_by": None}
+            scan = plan_select(table, source)
+            output.append(f"Strategy: HASH AGGREGATE over {scan['strategy']}")
+            # One group per distinct key among the matching rows
+            groups = 1 if group_by is None else min(column_distinct(table, group_by), scan["estimated_rows"])
+            cost = scan["cost"] + scan["estimated_rows"]
+        elif strategy == "INDEX GROUP COUNT":
+            index = table.ordered_indexes[group_by]
+            output.append(f"Strategy: {strategy} ({index.name} on {table.name}.{index.column})")
+            groups = cost = len(index)
+        else:
+            output.append(f"Strategy: {strategy}")
+            groups = cost = 1
+
+        if order_by:
+            output.append(f"Order: {order_by['column']} {order_by['direction']} (SORT)")
+            cost += sort_cost(groups)
+        describe_limit(output, stmt)
+        groups = max(groups - (stmt.get("offset") or 0), 0)
+        if stmt.get("limit") is not None:
+            groups = min(groups, stmt["limit"])
+        output.append(f"Estimated Rows: {groups}")
+        output.append(f"Estimated Cost: {cost}")
+
+        return "\n".join(output)
+
+    def show_cursor(self, ast):
+        """Rows of SHOW STATS (metric, value) or SHOW SLOW QUERIES (oldest first)."""
+        if ast["type"] == "SHOW_STATS":
+            return Cursor([("metric", "TEXT"), ("value", "REAL")], self.metrics.summary(self.counters()))
+
+        with self.metrics.lock:
+            entries = list(self.metrics.slow_queries)
+        rows = [(format_time(timestamp), round(ms, 3), sql or kind) for timestamp, kind, ms, sql in entries]
+        return Cursor([("time", "TEXT"), ("ms", "REAL"), ("statement", "TEXT")], rows)
+
+    def counters(self):
+        """(name, value, description) of the counters kept outside self.metrics."""
+        counters = [
+            ("statement_cache_hits", self.statements.hits, "Statements found in the statement cache"),
+            ("statement_cache_misses", self.statements.misses, "Statements parsed on a statement cache miss"),
+            ("result_cache_hits", self.results.hits, "Queries answered from the result cache"),
+            ("result_cache_misses", self.results.misses, "Queries not found in the result cache"),
+        ]
+        if self.wal is not None:
+            counters += [
+                ("wal_appends", self.wal.appends, "Records appended to the write-ahead log"),
+                ("wal_bytes", self.wal.written, "Bytes appended to the write-ahead log"),
+                ("wal_syncs", self.wal.syncs, "fsync calls on the write-ahead log"),
+                ("wal_sync_seconds", round(self.wal.sync_seconds, 6), "Time spent in fsync on the write-ahead log"),
+            ]
+        return counters
+
+    def prometheus(self):
+        """All metrics in the Prometheus text format, for a /metrics endpoint."""
+        return self.metrics.prometheus(self.counters())
@@ -0,0 +1,99 @@
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_FILE = "data/db.lock"
+MAGIC = b"MYDBLK01"
+
+# Lock file contents: magic, generation (bumped by every process that
+# changes the database), checkpoint count (bumped when the snapshot is
+# rewritten and the log truncated)
+_HEADER = struct.Struct("<8sQQ")
+
+
+class ProcessLock:
+    """
+    Advisory lock on data/db.lock, coordinating processes that share a
+    database. Holders are readers (shared) or one writer (exclusive); on
+    Windows, where only exclusive locks exist, readers are serialized too.
+
+    The file also holds the generation header. on_lock is called each time
+    the lock is (re)acquired, so the owner can catch up with changes made
+    by other processes; before_unlock is called while an exclusive lock
+    is still held, so the owner can publish its own changes.
+    """
+
+    def __init__(self, path=LOCK_FILE, on_lock=None, before_unlock=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.file = open(path, "a+b")
+        self.mode = None
+        self.on_lock = on_lock
+        self.before_unlock = before_unlock
+
+    def acquire(self, shared):
+        """Take (or convert to) a shared or exclusive lock."""
+        mode = "shared" if shared else "exclusive"
+        if self.mode == mode:
+            return
+        if self.mode == "exclusive" and self.before_unlock is not None:
+            self.before_unlock()
+
+        if fcntl is not None:
+            # Converting an existing lock is not atomic: another process may
+            # get in between, which is why on_lock runs after every acquire
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        elif self.mode is None:
+            self.file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+
+        self.mode = mode
+        if self.on_lock is not None:
+            self.on_lock()
+
+    def release(self):
+        if self.mode is None:
+            return
+        if self.mode == "exclusive" and self.before_unlock is not None:
+            self.before_unlock()
+
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.mode = None
+
+    def read_header(self):
+        """Return (generation, checkpoints); (0, 0) for a new lock file."""
+        self.file.seek(0)
+        data = self.file.read(_HEADER.size)
+        if len(data) < _HEADER.size:
+            return 0, 0
+        magic, generation, checkpoints = _HEADER.unpack(data)
+        if magic != MAGIC:
+            return 0, 0
+        return generation, checkpoints
+
+    def write_header(self, generation, checkpoints):
+        """Update the header. Only call while holding the exclusive lock."""
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(_HEADER.pack(MAGIC, generation, checkpoints))
+        self.file.flush()
+
+    def close(self):
+        self.release()
+        self.file.close()
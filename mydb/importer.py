@@ -0,0 +1,89 @@
+import csv
+import json
+import os
+
+# File extension -> import format
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl"
+}
+
+
+def import_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported import file '{path}' (expected .csv or .jsonl)")
+    return FORMATS[extension]
+
+
+def read_rows(path, columns):
+    """
+    Yield the rows of an import file as value lists in schema order.
+
+    CSV files need a header row naming every column (in any order); INT
+    columns are converted from text. JSONL files hold one JSON object per
+    line keyed by column name, or one array in schema order.
+    """
+    file_format = import_format(path)
+    if not os.path.exists(path):
+        raise ValueError(f"Import file '{path}' does not exist")
+
+    if file_format == "csv":
+        yield from _read_csv(path, columns)
+    else:
+        yield from _read_jsonl(path, columns)
+
+
+def _read_csv(path, columns):
+    names = list(columns.keys())
+    int_columns = [columns[name]["type"] == "INT" for name in names]
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip() for name in header]
+        missing = [name for name in names if name not in header]
+        if missing:
+            raise ValueError(f"{path}: header is missing column(s) {', '.join(missing)}")
+        order = [header.index(name) for name in names]
+
+        for line_no, record in enumerate(reader, start=2):
+            if not record:
+                continue
+            if len(record) != len(header):
+                raise ValueError(f"{path}, line {line_no}: expected {len(header)} fields, got {len(record)}")
+            values = [record[i] for i in order]
+            for i, is_int in enumerate(int_columns):
+                if is_int:
+                    try:
+                        values[i] = int(values[i])
+                    except ValueError:
+                        raise ValueError(f"{path}, line {line_no}: column '{names[i]}' "
+                                         f"expects INT, got {values[i]!r}")
+            yield values
+
+
+def _read_jsonl(path, columns):
+    names = list(columns.keys())
+
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"{path}, line {line_no}: invalid JSON")
+
+            if isinstance(record, list):
+                yield record
+            elif isinstance(record, dict):
+                try:
+                    yield [record[name] for name in names]
+                except KeyError as e:
+                    raise ValueError(f"{path}, line {line_no}: missing column {e.args[0]!r}")
+            else:
+                raise ValueError(f"{path}, line {line_no}: expected a JSON object or array")
@@ -0,0 +1,180 @@
+import bisect
+
+# Keys per leaf block. Blocks are split once they grow past twice this,
+# which keeps inserts into the middle of a large index cheap.
+BLOCK_SIZE = 512
+
+
+class OrderedIndex:
+    """
+    Sorted secondary index created with CREATE INDEX.
+
+    map holds the row positions for every key, so non-unique columns are
+    supported. The distinct keys are kept sorted in a list of blocks (a
+    two-level B+-tree): `maxes` holds the last key of each block, so a
+    lookup is one bisect over the blocks and one inside a block.
+    """
+
+    def __init__(self, name, column):
+        self.name = name
+        self.column = column
+        self.map = {}
+        self.blocks = []
+        self.maxes = []
+
+    def __len__(self):
+        """Number of distinct keys."""
+        return len(self.map)
+
+    def clear(self):
+        self.map = {}
+        self.blocks = []
+        self.maxes = []
+
+    def build(self, entries):
+        """Bulk-load the index from (key, row_index) pairs."""
+        self.map = {}
+        for key, row_index in entries:
+            positions = self.map.get(key)
+            if positions is None:
+                self.map[key] = [row_index]
+            else:
+                positions.append(row_index)
+        self.load(sorted(self.map), self.map)
+
+    def load(self, sorted_keys, index_map):
+        """Install an already sorted key list and its key -> positions map."""
+        self.map = index_map
+        self.blocks = [sorted_keys[i:i + BLOCK_SIZE]
+                       for i in range(0, len(sorted_keys), BLOCK_SIZE)]
+        self.maxes = [block[-1] for block in self.blocks]
+
+    def add(self, key, row_index):
+        positions = self.map.get(key)
+        if positions is not None:
+            # Keep positions in table order
+            if positions[-1] < row_index:
+                positions.append(row_index)
+            else:
+                bisect.insort(positions, row_index)
+            return
+
+        self.map[key] = [row_index]
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+
+        block_no = bisect.bisect_left(self.maxes, key)
+        if block_no == len(self.blocks):
+            block_no -= 1
+        block = self.blocks[block_no]
+        bisect.insort(block, key)
+        self.maxes[block_no] = block[-1]
+
+        if len(block) > 2 * BLOCK_SIZE:
+            self.blocks[block_no:block_no + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self.maxes[block_no:block_no + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+
+    def remove(self, key, row_index):
+        positions = self.map.get(key)
+        if positions is None:
+            return
+        positions.remove(row_index)
+        if positions:
+            return
+
+        del self.map[key]
+        block_no = bisect.bisect_left(self.maxes, key)
+        block = self.blocks[block_no]
+        del block[bisect.bisect_left(block, key)]
+        if block:
+            self.maxes[block_no] = block[-1]
+        else:
+            del self.blocks[block_no]
+            del self.maxes[block_no]
+
+    def lookup(self, key):
+        """Row positions for one key."""
+        return self.map.get(key, [])
+
+    def min(self):
+        return self.blocks[0][0] if self.blocks else None
+
+    def max(self):
+        return self.blocks[-1][-1] if self.blocks else None
+
+    def rank(self, key, inclusive=False):
+        """Number of distinct keys below `key` (at most `key` with inclusive)."""
+        block_no = bisect.bisect_left(self.maxes, key)
+        count = sum(map(len, self.blocks[:block_no]))
+        if block_no < len(self.blocks):
+            find = bisect.bisect_right if inclusive else bisect.bisect_left
+            count += find(self.blocks[block_no], key)
+        return count
+
+    def sorted_keys(self):
+        keys = []
+        for block in self.blocks:
+            keys.extend(block)
+        return keys
+
+    def keys(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Yield the distinct keys within [low, high] in sorted order (bounds optional)."""
+        if reverse:
+            yield from self._keys_descending(low, high, low_inclusive, high_inclusive)
+            return
+
+        block_no, pos = 0, 0
+        if low is not None:
+            block_no = bisect.bisect_left(self.maxes, low)
+            if block_no < len(self.blocks):
+                find = bisect.bisect_left if low_inclusive else bisect.bisect_right
+                pos = find(self.blocks[block_no], low)
+
+        while block_no < len(self.blocks):
+            block = self.blocks[block_no]
+            while pos < len(block):
+                key = block[pos]
+                if high is not None and (key > high or (key == high and not high_inclusive)):
+                    return
+                yield key
+                pos += 1
+            block_no += 1
+            pos = 0
+
+    def _keys_descending(self, low, high, low_inclusive, high_inclusive):
+        if not self.blocks:
+            return
+
+        block_no = len(self.blocks) - 1
+        pos = len(self.blocks[block_no]) - 1
+        if high is not None:
+            block_no = bisect.bisect_left(self.maxes, high)
+            if block_no == len(self.blocks):
+                block_no -= 1
+                pos = len(self.blocks[block_no]) - 1
+            else:
+                find = bisect.bisect_right if high_inclusive else bisect.bisect_left
+                pos = find(self.blocks[block_no], high) - 1
+
+        while block_no >= 0:
+            block = self.blocks[block_no]
+            while pos >= 0:
+                key = block[pos]
+                if low is not None and (key < low or (key == low and not low_inclusive)):
+                    return
+                yield key
+                pos -= 1
+            block_no -= 1
+            if block_no >= 0:
+                pos = len(self.blocks[block_no]) - 1
+
+    def range(self, low=None, high=None, low_inclusive=True, high_inclusive=True, reverse=False):
+        """Yield row positions whose key lies within the range, in key order."""
+        for key in self.keys(low, high, low_inclusive, high_inclusive, reverse):
+            positions = self.map[key]
+            if reverse:
+                yield from reversed(positions)
+            else:
+                yield from positions
@@ -0,0 +1,185 @@
+import json
+import os
+import struct
+import zlib
+from array import array
+
+MAGIC = b"MYDBIX01"
+
+# File layout:
+#   magic, header length
+#   header          JSON: per table the version and row count the indexes
+#                   were built from, and per index the location, key
+#                   encoding and CRC32 of its data
+#   index data      hash indexes: keys (int64 array or JSON list) followed
+#                   by an int64 array of row positions.
+#                   ordered indexes: sorted distinct keys, an int64 array
+#                   of position counts per key, then all positions.
+_HEADER = struct.Struct("<8sI")
+
+
+def index_path(snapshot_path):
+    """Index files live next to the snapshot they describe."""
+    return snapshot_path + ".idx"
+
+
+def _encode_keys(keys):
+    if all(type(key) is int for key in keys):
+        try:
+            return "int", array("q", keys).tobytes()
+        except OverflowError:
+            pass
+    return "json", json.dumps(keys, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_keys(encoding, data):
+    if encoding == "int":
+        keys = array("q")
+        keys.frombytes(data)
+        return keys
+    return json.loads(data)
+
+
+def save_indexes(tables, path):
+    """
+    Persist every table's index maps.
+    The file is written to a temporary path and renamed into place.
+    """
+    header = {}
+    blobs = []
+    offset = 0
+
+    for table_name, table in tables.items():
+        entry = {
+            "version": table.version,
+            "rows": len(table.rows),
+            "indexes": {},
+            "ordered": {}
+        }
+
+        for col_name, index in table.indexes.items():
+            encoding, key_data = _encode_keys(list(index["map"].keys()))
+            position_data = array("q", index["map"].values()).tobytes()
+            data = key_data + position_data
+
+            entry["indexes"][col_name] = {
+                "keys": encoding,
+                "offset": offset,
+                "key_bytes": len(key_data),
+                "length": len(data),
+                "crc": zlib.crc32(data)
+            }
+            blobs.append(data)
+            offset += len(data)
+
+        for col_name, index in table.ordered_indexes.items():
+            sorted_keys = index.sorted_keys()
+            encoding, key_data = _encode_keys(sorted_keys)
+            counts = array("q")
+            positions = array("q")
+            for key in sorted_keys:
+                key_positions = index.map[key]
+                counts.append(len(key_positions))
+                positions.extend(key_positions)
+            count_data = counts.tobytes()
+            data = key_data + count_data + positions.tobytes()
+
+            entry["ordered"][col_name] = {
+                "keys": encoding,
+                "offset": offset,
+                "key_bytes": len(key_data),
+                "count_bytes": len(count_data),
+                "length": len(data),
+                "crc": zlib.crc32(data)
+            }
+            blobs.append(data)
+            offset += len(data)
+
+        header[table_name] = entry
+
+    header_data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(header_data)))
+        f.write(header_data)
+        for data in blobs:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class IndexFile:
+    """Header of a persisted index file; index data is read on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, header_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"'{path}' is not an index file")
+            self.header = json.loads(f.read(header_length))
+        self.data_offset = _HEADER.size + header_length
+
+    def matches(self, table_name, version, row_count):
+        """True if the stored indexes were built from exactly this table state."""
+        entry = self.header.get(table_name)
+        return entry is not None and entry["version"] == version and entry["rows"] == row_count
+
+    def read_table(self, table_name):
+        """
+        Read every index of one table.
+        Returns (column -> hash map, column -> (sorted keys, map)), or None
+        if any index fails its checksum.
+        """
+        entry = self.header[table_name]
+        maps = {}
+        ordered = {}
+
+        with open(self.path, "rb") as f:
+            def read(meta):
+                f.seek(self.data_offset + meta["offset"])
+                data = f.read(meta["length"])
+                if len(data) != meta["length"] or zlib.crc32(data) != meta["crc"]:
+                    return None
+                return data
+
+            for col_name, meta in entry["indexes"].items():
+                data = read(meta)
+                if data is None:
+                    return None
+                keys = _decode_keys(meta["keys"], data[:meta["key_bytes"]])
+                positions = array("q")
+                positions.frombytes(data[meta["key_bytes"]:])
+                maps[col_name] = dict(zip(keys, positions))
+
+            for col_name, meta in entry.get("ordered", {}).items():
+                data = read(meta)
+                if data is None:
+                    return None
+                count_end = meta["key_bytes"] + meta["count_bytes"]
+                keys = list(_decode_keys(meta["keys"], data[:meta["key_bytes"]]))
+                counts = array("q")
+                counts.frombytes(data[meta["key_bytes"]:count_end])
+                positions = array("q")
+                positions.frombytes(data[count_end:])
+
+                index_map = {}
+                start = 0
+                for key, count in zip(keys, counts):
+                    index_map[key] = positions[start:start + count].tolist()
+                    start += count
+                ordered[col_name] = (keys, index_map)
+
+        return maps, ordered
+
+
+def open_index_file(path):
+    """Return an IndexFile, or None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return IndexFile(path)
+    except (OSError, ValueError, struct.error):
+        return None
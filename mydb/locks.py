@@ -0,0 +1,116 @@
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    Reader/writer lock: any number of readers, or one writer.
+
+    - Reentrant: a thread holding the lock may take it again, and the
+      writer may also take read locks.
+    - Writer-preferring: new readers wait while a writer is waiting, so a
+      steady stream of queries cannot starve writers. Threads that already
+      hold a read lock are let in regardless, so nested reads cannot
+      deadlock against a waiting writer.
+    - A read lock may be released from another thread than the one that
+      took it (a cursor may be closed by the garbage collector); pass the
+      owner returned by acquire_read().
+
+    process_lock: optional ProcessLock extending the lock to other
+    processes. It is held shared while any thread reads and exclusive
+    while a thread writes.
+    """
+
+    def __init__(self, process_lock=None):
+        self.process_lock = process_lock
+        self.cond = threading.Condition(threading.Lock())
+        self.readers = {}         # thread id -> read locks held
+        self.writer = None        # thread id holding the write lock
+        self.writer_depth = 0
+        self.waiting_writers = 0
+        self.upgrading = None     # reader thread waiting to become the writer
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self.cond:
+            if self.writer != me and me not in self.readers:
+                while self.writer is not None or self.waiting_writers:
+                    self.cond.wait()
+            if self.process_lock is not None and not self.readers and self.writer is None:
+                self.process_lock.acquire(shared=True)
+            self.readers[me] = self.readers.get(me, 0) + 1
+        return me
+
+    def release_read(self, owner=None):
+        owner = threading.get_ident() if owner is None else owner
+        with self.cond:
+            count = self.readers[owner] - 1
+            if count:
+                self.readers[owner] = count
+            else:
+                del self.readers[owner]
+                if self.process_lock is not None and not self.readers and self.writer is None:
+                    self.process_lock.release()
+                self.cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self.cond:
+            if self.writer == me:
+                self.writer_depth += 1
+                return
+
+            # A reader may upgrade once the other readers are gone; two
+            # readers upgrading at once would wait for each other forever
+            if me in self.readers:
+                if self.upgrading is not None:
+                    raise RuntimeError("Write would deadlock: close open cursors before writing")
+                self.upgrading = me
+
+            self.waiting_writers += 1
+            try:
+                while self.writer is not None or any(owner != me for owner in self.readers):
+                    self.cond.wait()
+            finally:
+                self.waiting_writers -= 1
+                if self.upgrading == me:
+                    self.upgrading = None
+            if self.process_lock is not None:
+                self.process_lock.acquire(shared=False)
+            self.writer = me
+            self.writer_depth = 1
+
+    def release_write(self):
+        with self.cond:
+            if self.writer != threading.get_ident():
+                raise RuntimeError("Write lock released by a thread that does not hold it")
+            self.writer_depth -= 1
+            if not self.writer_depth:
+                self.writer = None
+                if self.process_lock is not None:
+                    # An upgraded reader keeps its shared lock
+                    if self.readers:
+                        self.process_lock.acquire(shared=True)
+                    else:
+                        self.process_lock.release()
+                self.cond.notify_all()
+
+    def held_for_write(self):
+        """True if the calling thread holds the write lock."""
+        return self.writer == threading.get_ident()
+
+    @contextmanager
+    def read(self):
+        owner = self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read(owner)
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
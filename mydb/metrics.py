@@ -0,0 +1,168 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from mydb.statement import normalize_sql
+
+# Upper bounds, in seconds, of the statement latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Slow statements kept in memory for SHOW SLOW QUERIES
+SLOW_LOG_SIZE = 100
+
+# Where the REPL and the server append slow statements when a threshold is set
+SLOW_LOG_FILE = "data/slow_queries.log"
+
+# Counters kept by Metrics, with their descriptions for the Prometheus export
+COUNTERS = {
+    "rows_scanned": "Table rows read by table scans",
+    "rows_returned": "Rows returned by queries",
+    "index_rows": "Rows found through indexes",
+    "table_scans": "Table scans started",
+    "index_scans": "Index lookups and index scans started",
+    "errors": "Statements that failed",
+    "slow_queries": "Statements slower than the slow query threshold",
+    "snapshots": "Snapshots written by checkpoints",
+    "snapshot_seconds": "Time spent writing snapshots",
+    "snapshot_bytes": "Bytes of snapshots written",
+}
+
+
+class Histogram:
+    """Statement latencies counted in fixed buckets (the Prometheus layout)."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One count per bucket, plus one for latencies above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile (0 < q <= 1): the bucket holding it is
+        found exactly, and the value is interpolated within the bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[bucket - 1] if bucket else 0.0
+                upper = self.bounds[bucket] if bucket < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class Metrics:
+    """
+    Instrumentation of one Database: a latency histogram per statement
+    type, counters for rows and access paths, snapshot writes, and a log
+    of statements slower than `slow_query_ms` (None turns it off).
+    With `slow_log_path`, slow statements are also appended to that file.
+    """
+
+    def __init__(self, slow_query_ms=None, slow_log_path=None):
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_path = slow_log_path
+        self.latency = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # (time, statement type, milliseconds, SQL text or None), oldest first
+        self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+        self.lock = threading.Lock()
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def counted(self, rows, name):
+        """Yield `rows`, adding how many went by to counter `name` once they stop."""
+        count = 0
+        try:
+            for row in rows:
+                count += 1
+                yield row
+        finally:
+            self.add(name, count)
+
+    def statement(self, kind, seconds, sql=None, rows=0):
+        """Record one finished statement: its latency, the rows it returned, and whether it was slow."""
+        slow = self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms
+        with self.lock:
+            histogram = self.latency.get(kind)
+            if histogram is None:
+                histogram = self.latency[kind] = Histogram()
+            histogram.observe(seconds)
+            self.counters["rows_returned"] += rows
+            if slow:
+                self.counters["slow_queries"] += 1
+                entry = (time.time(), kind, seconds * 1000, None if sql is None else normalize_sql(sql))
+                self.slow_queries.append(entry)
+        if slow and self.slow_log_path is not None:
+            self.write_slow_log(entry)
+
+    def write_slow_log(self, entry):
+        timestamp, kind, ms, sql = entry
+        line = f"{format_time(timestamp)}  {ms:10.3f} ms  {sql or kind}\n"
+        with self.lock, open(self.slow_log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def summary(self, extra=()):
+        """
+        (metric, value) pairs for SHOW STATS: count, mean, p50/p95/p99 and
+        max latency per statement type, then the counters and `extra`
+        (name, value, description) counters kept elsewhere.
+        """
+        rows = []
+        with self.lock:
+            for kind in sorted(self.latency):
+                histogram = self.latency[kind]
+                rows.append((f"{kind}.count", histogram.count))
+                rows.append((f"{kind}.avg_ms", round(histogram.sum / histogram.count * 1000, 3)))
+                for q in (50, 95, 99):
+                    rows.append((f"{kind}.p{q}_ms", round(histogram.quantile(q / 100) * 1000, 3)))
+                rows.append((f"{kind}.max_ms", round(histogram.max * 1000, 3)))
+            for name, value in self.counters.items():
+                rows.append((name, round(value, 6) if isinstance(value, float) else value))
+        rows.extend((name, value) for name, value, _ in extra)
+        rows.append(("slow_query_ms", self.slow_query_ms))
+        return rows
+
+    def prometheus(self, extra=()):
+        """
+        The metrics in the Prometheus text exposition format: the latency
+        histograms, then every counter (and `extra` counter) as mydb_<name>_total.
+        """
+        lines = ["# HELP mydb_statement_duration_seconds Statement latency by statement type",
+                 "# TYPE mydb_statement_duration_seconds histogram"]
+        with self.lock:
+            for kind in sorted(self.latency):
+                histogram = self.latency[kind]
+                bounds = [repr(bound) for bound in histogram.bounds] + ["+Inf"]
+                cumulative = 0
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'mydb_statement_duration_seconds_bucket{{type="{kind}",le="{bound}"}} {cumulative}')
+                lines.append(f'mydb_statement_duration_seconds_sum{{type="{kind}"}} {histogram.sum!r}')
+                lines.append(f'mydb_statement_duration_seconds_count{{type="{kind}"}} {histogram.count}')
+            counters = [(name, value, COUNTERS[name]) for name, value in self.counters.items()]
+        for name, value, description in counters + list(extra):
+            lines.append(f"# HELP mydb_{name}_total {description}")
+            lines.append(f"# TYPE mydb_{name}_total counter")
+            lines.append(f"mydb_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
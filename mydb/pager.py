@@ -0,0 +1,399 @@
+import bisect
+import json
+import mmap
+import operator
+import os
+import struct
+
+from mydb.exceptions import SchemaError
+
+PAGED_DB_FILE = "data/db.pages"
+PAGE_SIZE = 8192
+MAGIC = b"MYDBPG01"
+
+# File layout:
+#   page 0          header: magic, page size, catalog offset, catalog length
+#   pages 1..n      row pages; a page holding one oversized row spans
+#                   several consecutive pages
+#   directory       per table: (page offset, row count) for every page
+#   catalog         JSON: columns, version, ordered index definitions and
+#                   directory location per table
+_HEADER = struct.Struct("<8sIQQ")
+_PAGE_HEADER = struct.Struct("<II")  # row count, pages spanned
+_DIR_ENTRY = struct.Struct("<QI")    # page offset, row count
+_LENGTH = struct.Struct("<I")
+_INT = struct.Struct("<q")
+
+# Row length marking a deleted row (tombstone)
+_TOMBSTONE = 0xFFFFFFFF
+
+
+def _column_layout(columns):
+    """Return (names, is_int) for a table's columns, in schema order."""
+    names = list(columns.keys())
+    is_int = [columns[name]["type"] == "INT" for name in names]
+    return names, is_int
+
+
+def encode_row(row, names, is_int):
+    """Encode one row as a length-prefixed record of typed fields."""
+    if row is None:
+        return _LENGTH.pack(_TOMBSTONE)
+
+    parts = []
+    for name, int_column, value in zip(names, is_int, row):
+        if int_column:
+            if type(value) is not int:
+                raise SchemaError(f"Cannot store {value!r} in INT column '{name}'")
+            try:
+                parts.append(_INT.pack(value))
+            except struct.error:
+                raise SchemaError(f"Value out of range for INT column '{name}': {value}")
+        else:
+            if not isinstance(value, str):
+                raise SchemaError(f"Cannot store {value!r} in TEXT column '{name}'")
+            data = value.encode("utf-8")
+            parts.append(_LENGTH.pack(len(data)))
+            parts.append(data)
+
+    body = b"".join(parts)
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_page(buffer, offset, names, is_int):
+    """Decode every row of the page starting at `offset` into row tuples (None for deleted rows)."""
+    row_count, _ = _PAGE_HEADER.unpack_from(buffer, offset)
+    pos = offset + _PAGE_HEADER.size
+
+    rows = []
+    for _ in range(row_count):
+        (length,) = _LENGTH.unpack_from(buffer, pos)
+        pos += _LENGTH.size
+        if length == _TOMBSTONE:
+            rows.append(None)
+            continue
+        values = []
+        for int_column in is_int:
+            if int_column:
+                values.append(_INT.unpack_from(buffer, pos)[0])
+                pos += _INT.size
+            else:
+                (length,) = _LENGTH.unpack_from(buffer, pos)
+                pos += _LENGTH.size
+                values.append(str(buffer[pos:pos + length], "utf-8"))
+                pos += length
+        rows.append(tuple(values))
+
+    return rows
+
+
+def decode_fields(buffer, offset, is_int, fields, low, high):
+    """
+    Yield the values of `fields` (column positions, in that order) for the
+    live rows low..high-1 of the page at `offset`. Other columns are
+    skipped over without being decoded, and rows past a row's last wanted
+    column are jumped over using its length prefix.
+    """
+    pos = offset + _PAGE_HEADER.size
+    for _ in range(low):
+        (length,) = _LENGTH.unpack_from(buffer, pos)
+        pos += _LENGTH.size + (0 if length == _TOMBSTONE else length)
+
+    wanted = set(fields)
+    last = max(fields)
+    values = [None] * len(is_int)
+    for _ in range(high - low):
+        (length,) = _LENGTH.unpack_from(buffer, pos)
+        pos += _LENGTH.size
+        if length == _TOMBSTONE:
+            continue
+        end = pos + length
+
+        field_pos = pos
+        for field in range(last + 1):
+            if is_int[field]:
+                if field in wanted:
+                    values[field] = _INT.unpack_from(buffer, field_pos)[0]
+                field_pos += _INT.size
+            else:
+                (text_length,) = _LENGTH.unpack_from(buffer, field_pos)
+                field_pos += _LENGTH.size
+                if field in wanted:
+                    values[field] = str(buffer[field_pos:field_pos + text_length], "utf-8")
+                field_pos += text_length
+
+        yield tuple(values[field] for field in fields)
+        pos = end
+
+
+def _build_page(encoded_rows):
+    """Pack encoded rows into one page, padded to a whole number of pages."""
+    body = _PAGE_HEADER.size + sum(len(row) for row in encoded_rows)
+    span = -(-body // PAGE_SIZE)
+    page = bytearray(span * PAGE_SIZE)
+    _PAGE_HEADER.pack_into(page, 0, len(encoded_rows), span)
+    pos = _PAGE_HEADER.size
+    for row in encoded_rows:
+        page[pos:pos + len(row)] = row
+        pos += len(row)
+    return page
+
+
+class PagedFile:
+    """A read-only memory map over a page file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, page_size, catalog_offset, catalog_length = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise SchemaError(f"'{path}' is not a page file")
+        if page_size != PAGE_SIZE:
+            raise SchemaError(f"Unsupported page size {page_size} in '{path}'")
+
+        self.catalog = json.loads(self.map[catalog_offset:catalog_offset + catalog_length])
+
+    def table_rows(self, table_name, columns):
+        """Return a lazily decoded row list for one table."""
+        directory_offset, page_count = self.catalog[table_name]["directory"]
+        entries = self.map[directory_offset:directory_offset + page_count * _DIR_ENTRY.size]
+        return PagedRows(self, columns, list(_DIR_ENTRY.iter_unpack(entries)))
+
+    def close(self):
+        self.map.close()
+
+
+class PagedRows:
+    """
+    List-like view over a table's pages.
+    A page is decoded the first time one of its rows is touched and then
+    kept in memory, so in-place row updates behave like a plain list.
+    Appended rows live in memory until the next checkpoint.
+    """
+
+    def __init__(self, pagefile, columns, directory):
+        self.pagefile = pagefile
+        self.names, self.is_int = _column_layout(columns)
+        self.directory = directory
+        self.decoded = {}
+        self.tail = []
+
+        self.starts = []
+        total = 0
+        for _, row_count in directory:
+            self.starts.append(total)
+            total += row_count
+        self.paged_count = total
+
+    def __len__(self):
+        return self.paged_count + len(self.tail)
+
+    def page(self, page_no):
+        rows = self.decoded.get(page_no)
+        if rows is None:
+            offset, _ = self.directory[page_no]
+            rows = decode_page(self.pagefile.map, offset, self.names, self.is_int)
+            # Readers decoding the same page concurrently all keep the first copy
+            rows = self.decoded.setdefault(page_no, rows)
+        return rows
+
+    def __getitem__(self, row_index):
+        if row_index < 0:
+            row_index += len(self)
+        if row_index < 0 or row_index >= len(self):
+            raise IndexError("row index out of range")
+
+        if row_index >= self.paged_count:
+            return self.tail[row_index - self.paged_count]
+
+        page_no = bisect.bisect_right(self.starts, row_index) - 1
+        return self.page(page_no)[row_index - self.starts[page_no]]
+
+    def __iter__(self):
+        for page_no in range(len(self.directory)):
+            yield from self.page(page_no)
+        yield from self.tail
+
+    def __setitem__(self, row_index, row):
+        if row_index < 0:
+            row_index += len(self)
+        if row_index >= self.paged_count:
+            self.tail[row_index - self.paged_count] = row
+            return
+
+        page_no = bisect.bisect_right(self.starts, row_index) - 1
+        self.page(page_no)[row_index - self.starts[page_no]] = row
+
+    def append(self, row):
+        self.tail.append(row)
+
+    def __delitem__(self, key):
+        """Only `del rows[n:]` of rows appended since the file was opened is supported."""
+        if not isinstance(key, slice) or key.stop is not None or key.step is not None:
+            raise TypeError("PagedRows only supports deleting a tail slice")
+        start = key.start or 0
+        if start < self.paged_count:
+            raise IndexError("cannot delete rows stored in pages")
+        del self.tail[start - self.paged_count:]
+
+    def read_columns(self, fields=None, start=0, stop=None):
+        """
+        Yield `fields` of the live rows in slots [start, stop) as tuples
+        (whole rows for None). Pages outside the range are not touched,
+        and pages not decoded yet have only the wanted fields decoded (and
+        are not kept).
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if fields is None:
+            getter = None
+        elif len(fields) > 1:
+            getter = operator.itemgetter(*fields)
+        else:
+            getter = lambda row: (row[fields[0]],)
+
+        if start < self.paged_count:
+            page_no = bisect.bisect_right(self.starts, start) - 1
+            while page_no < len(self.directory) and self.starts[page_no] < stop:
+                page_start = self.starts[page_no]
+                offset, row_count = self.directory[page_no]
+                low = max(start, page_start) - page_start
+                high = min(stop, page_start + row_count) - page_start
+
+                rows = self.decoded.get(page_no)
+                if rows is None and fields is not None:
+                    yield from decode_fields(self.pagefile.map, offset, self.is_int, fields, low, high)
+                else:
+                    if rows is None:
+                        rows = self.page(page_no)
+                    for row in rows[low:high]:
+                        if row is not None:
+                            yield row if getter is None else getter(row)
+                page_no += 1
+
+        tail_start = max(start - self.paged_count, 0)
+        for row in self.tail[tail_start:max(stop - self.paged_count, 0)]:
+            if row is not None:
+                yield row if getter is None else getter(row)
+
+    def raw_pages(self):
+        """Yield (page bytes, row count); pages never decoded are copied verbatim."""
+        buffer = self.pagefile.map
+        for page_no, (offset, row_count) in enumerate(self.directory):
+            if page_no in self.decoded:
+                continue
+            _, span = _PAGE_HEADER.unpack_from(buffer, offset)
+            yield page_no, buffer[offset:offset + span * PAGE_SIZE], row_count
+
+
+def _table_pages(table):
+    """Yield (page bytes, row count) for every page of a table."""
+    names, is_int = _column_layout(table.columns)
+    rows = table.rows
+
+    def pack(row_iter):
+        encoded = []
+        used = _PAGE_HEADER.size
+        for row in row_iter:
+            record = encode_row(row, names, is_int)
+            if encoded and used + len(record) > PAGE_SIZE:
+                yield _build_page(encoded), len(encoded)
+                encoded = []
+                used = _PAGE_HEADER.size
+            encoded.append(record)
+            used += len(record)
+        if encoded:
+            yield _build_page(encoded), len(encoded)
+
+    if not isinstance(rows, PagedRows) or rows.names != names:
+        yield from pack(rows)
+        return
+
+    # Untouched pages cannot have changed since they were read
+    raw = {page_no: (page, row_count) for page_no, page, row_count in rows.raw_pages()}
+    for page_no in range(len(rows.directory)):
+        if page_no in raw:
+            yield raw[page_no]
+        else:
+            yield from pack(rows.decoded[page_no])
+    yield from pack(rows.tail)
+
+
+def save_paged(tables, path=PAGED_DB_FILE):
+    """
+    Write all tables to a page file, atomically replacing `path`.
+    Tables are re-bound to lazily decoded views of the new file.
+    Returns the number of bytes written.
+    """
+    from mydb.storage import serialize_columns, serialize_indexes
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    catalog = {}
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(bytes(PAGE_SIZE))
+
+        for table_name, table in tables.items():
+            entries = bytearray()
+            for page, row_count in _table_pages(table):
+                entries += _DIR_ENTRY.pack(f.tell(), row_count)
+                f.write(page)
+
+            directory_offset = f.tell()
+            f.write(entries)
+            catalog[table_name] = {
+                "columns": serialize_columns(table.columns),
+                "version": table.version,
+                "deleted": table.deleted,
+                "indexes": serialize_indexes(table),
+                "directory": [directory_offset, len(entries) // _DIR_ENTRY.size]
+            }
+
+        catalog_bytes = json.dumps(catalog, separators=(",", ":")).encode("utf-8")
+        catalog_offset = f.tell()
+        f.write(catalog_bytes)
+        size = f.tell()
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, PAGE_SIZE, catalog_offset, len(catalog_bytes)))
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Release the old mapping before replacing the file (required on Windows)
+    old_files = {id(t.rows.pagefile): t.rows.pagefile
+                 for t in tables.values() if isinstance(t.rows, PagedRows)}
+    for pagefile in old_files.values():
+        pagefile.close()
+
+    os.replace(temp_path, path)
+
+    pagefile = PagedFile(path)
+    for table_name, table in tables.items():
+        table.rows = pagefile.table_rows(table_name, table.columns)
+
+    return size
+
+
+def open_paged(path=PAGED_DB_FILE):
+    """
+    Open a page file without decoding any rows.
+    Returns table_name -> {"columns", "version", "deleted", "indexes", "rows"}.
+    """
+    from mydb.storage import deserialize_columns
+
+    pagefile = PagedFile(path)
+    tables = {}
+    for table_name, meta in pagefile.catalog.items():
+        columns = deserialize_columns(meta["columns"])
+        tables[table_name] = {
+            "columns": columns,
+            "version": meta["version"],
+            "deleted": meta.get("deleted", 0),
+            "indexes": meta.get("indexes", []),
+            "rows": pagefile.table_rows(table_name, columns)
+        }
+    return tables
@@ -0,0 +1,305 @@
+import multiprocessing
+import operator
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, compress
+from multiprocessing import shared_memory
+
+from mydb import vector
+
+# Tables with fewer live rows are scanned in-process: handing the work to
+# the pool costs more than it saves
+MIN_PARALLEL_ROWS = 100000
+
+# Rows per task (morsel); several per worker keep the workers evenly busy
+MORSEL_SIZE = 65536
+
+# Shared memory segments a worker keeps attached between tasks
+ATTACHED_SEGMENTS = 16
+
+_INT_SIZE = 8
+
+
+class Segment:
+    """
+    One table column copied into shared memory, valid for as long as the
+    table keeps the stamp it was copied at. Not its version: ROLLBACK
+    restores that with different rows behind it.
+
+    Layouts: INT columns are int64 values; TEXT columns are row count + 1
+    int64 offsets followed by the UTF-8 data; the LIVE segment holds one
+    byte per row slot, 0 for deleted rows.
+    """
+
+    def __init__(self, table, kind, data):
+        self.table = table
+        self.stamp = table.stamp
+        self.slots = len(table.rows)
+        self.kind = kind
+        self.shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        self.shm.buf[:len(data)] = data
+
+    def current(self, table):
+        return self.table is table and self.stamp == table.stamp
+
+    def spec(self):
+        """What a worker needs to read the segment: (name, kind, row slots)."""
+        return self.shm.name, self.kind, self.slots
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def encode_column(table, column, rows):
+    """
+    Encode a column of `rows` (table slots with tombstones replaced by a
+    placeholder) for shared memory. Returns (kind, bytes), or None for
+    values the layouts cannot hold (ints beyond 64 bits, BOOL columns).
+    """
+    field = table.fields[column]
+    col_type = table.columns[column]["type"]
+    try:
+        if col_type == "INT":
+            return "INT", array("q", map(operator.itemgetter(field), rows)).tobytes()
+        if col_type == "TEXT":
+            encoded = list(map(str.encode, map(operator.itemgetter(field), rows)))
+            offsets = array("q", accumulate(map(len, encoded), initial=0))
+            return "TEXT", offsets.tobytes() + b"".join(encoded)
+    except (OverflowError, TypeError, UnicodeEncodeError):
+        pass
+    return None
+
+
+class WorkerPool:
+    """
+    Runs table scans and hash join probes on a process pool.
+
+    The columns a scan needs are copied into shared memory once per table
+    stamp and reused by later scans, so workers never receive pickled
+    rows: a task is a row range (morsel) plus segment names, and only the
+    matching row positions come back. Results are merged in row order, so
+    they match a serial scan exactly.
+    """
+
+    def __init__(self, workers=1):
+        """workers: degree of parallelism; 1 keeps every scan in-process."""
+        self.workers = workers
+        self.pool = None
+        self.segments = {}  # (table name, column or None for LIVE) -> Segment
+        self.lock = threading.Lock()
+
+    def applies(self, table):
+        """True if a scan of `table` would run on the pool."""
+        return self.workers > 1 and table.row_count >= MIN_PARALLEL_ROWS
+
+    def start_pool(self):
+        if self.pool is None:
+            # Not fork: another thread (a server session, a web request) may
+            # hold a lock, which a forked child would inherit held. Workers come
+            # from a fork server (spawned where there is none) and import the
+            # main script like any multiprocessing child, so a script using
+            # parallelism > 1 keeps its work under if __name__ == "__main__".
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self.pool
+
+    def column_specs(self, table, columns):
+        """
+        Shared memory specs for `columns` of a table, plus the LIVE spec
+        (None when the table has no deleted rows). Returns None if a column
+        cannot be shared.
+        """
+        with self.lock:
+            rows = None
+            specs = {}
+            for column in columns:
+                key = (table.name, column)
+                segment = self.segments.get(key)
+                if segment is None or not segment.current(table):
+                    if rows is None:
+                        rows = self.live_rows(table)
+                    encoded = encode_column(table, column, rows)
+                    if encoded is None:
+                        return None
+                    segment = self.replace(key, Segment(table, *encoded))
+                specs[column] = segment.spec()
+
+            live = None
+            if table.deleted:
+                key = (table.name, None)
+                segment = self.segments.get(key)
+                if segment is None or not segment.current(table):
+                    data = bytes(row is not None for row in table.rows)
+                    segment = self.replace(key, Segment(table, "LIVE", data))
+                live = segment.spec()
+            return specs, live
+
+    def live_rows(self, table):
+        """Every row slot, with deleted rows replaced by a placeholder of the right types."""
+        rows = list(table.rows)
+        if table.deleted:
+            placeholder = vector.placeholder_row(table)
+            rows = [placeholder if row is None else row for row in rows]
+        return rows
+
+    def replace(self, key, segment):
+        old = self.segments.get(key)
+        if old is not None:
+            old.release()
+        self.segments[key] = segment
+        return segment
+
+    def morsels(self, table):
+        slots = len(table.rows)
+        size = min(MORSEL_SIZE, -(-slots // self.workers))
+        return [(start, min(start + size, slots)) for start in range(0, slots, size)]
+
+    def filter_positions(self, table, where):
+        """
+        Positions of the live rows matching a WHERE clause, computed on
+        the pool; None when the scan should run in-process instead.
+        """
+        if not self.applies(table):
+            return None
+        shared = self.column_specs(table, {condition["column"] for condition in vector.leaves(where)})
+        if shared is None:
+            return None
+        specs, live = shared
+
+        tasks = [(specs, live, where, start, stop) for start, stop in self.morsels(table)]
+        positions = []
+        for part in self.start_pool().map(_scan_morsel, *zip(*tasks)):
+            positions.extend(part)
+        return positions
+
+    def hash_join(self, build, build_column, probe, probe_column):
+        """
+        (build position, probe position) pairs of an equi-join, probe rows
+        in table order; None when the join should run in-process. Every
+        worker builds the hash table of the (smaller) build side once and
+        probes its morsels of the probe side.
+        """
+        if not self.applies(probe):
+            return None
+        build_shared = self.column_specs(build, [build_column])
+        probe_shared = self.column_specs(probe, [probe_column])
+        if build_shared is None or probe_shared is None:
+            return None
+
+        build_spec, build_live = build_shared[0][build_column], build_shared[1]
+        probe_spec, probe_live = probe_shared[0][probe_column], probe_shared[1]
+        tasks = [(build_spec, build_live, probe_spec, probe_live, start, stop)
+                 for start, stop in self.morsels(probe)]
+
+        pairs = []
+        for build_positions, probe_positions in self.start_pool().map(_probe_morsel, *zip(*tasks)):
+            pairs.extend(zip(build_positions, probe_positions))
+        return pairs
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        with self.lock:
+            for segment in self.segments.values():
+                segment.release()
+            self.segments.clear()
+
+
+# Worker side. Each pool process keeps the segments it has attached, and
+# the hash table of the last join build side, between tasks.
+_attached = {}
+_build_table = {}
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is not None:
+        return shm
+
+    # Pool workers share the parent's resource tracker, so attaching does
+    # not make them owners: the parent unlinks the segment
+    shm = shared_memory.SharedMemory(name)
+    _attached[name] = shm
+    while len(_attached) > ATTACHED_SEGMENTS:
+        oldest = next(iter(_attached))
+        try:
+            _attached.pop(oldest).close()
+        except BufferError:
+            pass  # still referenced by an array; freed with it
+    return shm
+
+
+def _read_column(spec, start, stop, use_numpy):
+    """A row range of a shared segment as a list (or a NumPy array for INT/LIVE)."""
+    name, kind, slots = spec
+    buf = _attach(name).buf
+
+    if kind == "LIVE":
+        if use_numpy:
+            return vector.numpy.frombuffer(buf, dtype=vector.numpy.bool_, count=stop - start, offset=start)
+        return list(map(bool, buf[start:stop]))
+
+    if kind == "INT":
+        if use_numpy:
+            return vector.numpy.frombuffer(buf, dtype=vector.numpy.int64, count=stop - start,
+                                           offset=start * _INT_SIZE)
+        return buf[start * _INT_SIZE:stop * _INT_SIZE].cast("q").tolist()
+
+    base = (slots + 1) * _INT_SIZE
+    offsets = buf[start * _INT_SIZE:(stop + 1) * _INT_SIZE].cast("q").tolist()
+    first = offsets[0]
+    data = bytes(buf[base + first:base + offsets[-1]])
+    return [str(data[low - first:high - first], "utf-8") for low, high in zip(offsets, offsets[1:])]
+
+
+def _scan_morsel(specs, live, where, start, stop):
+    use_numpy = vector.numpy is not None
+    columns = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = _read_column(specs[name], start, stop, use_numpy)
+        return columns[name]
+
+    # Segment kinds are the declared column types (INT or TEXT)
+    types = {name: spec[1] for name, spec in specs.items()}
+    bitmap = vector.evaluate(where, column, types, use_numpy)
+    if live is not None:
+        bitmap = vector.combine(bitmap, _read_column(live, start, stop, use_numpy))
+
+    if isinstance(bitmap, list):
+        return array("q", compress(range(start, stop), bitmap))
+    positions = vector.numpy.flatnonzero(bitmap).astype(vector.numpy.int64) + start
+    return array("q", positions.tobytes())
+
+
+def _probe_morsel(build_spec, build_live, probe_spec, probe_live, start, stop):
+    key = (build_spec, build_live)
+    buckets = _build_table.get(key)
+    if buckets is None:
+        _build_table.clear()
+        slots = build_spec[2]
+        keys = _read_column(build_spec, 0, slots, use_numpy=False)
+        alive = _read_column(build_live, 0, slots, use_numpy=False) if build_live else None
+        buckets = {}
+        for position, value in enumerate(keys):
+            if alive is None or alive[position]:
+                buckets.setdefault(value, []).append(position)
+        _build_table[key] = buckets
+
+    keys = _read_column(probe_spec, start, stop, use_numpy=False)
+    alive = _read_column(probe_live, start, stop, use_numpy=False) if probe_live else None
+
+    build_positions = array("q")
+    probe_positions = array("q")
+    for position, value in enumerate(keys, start):
+        matches = buckets.get(value)
+        if matches is None or (alive is not None and not alive[position - start]):
+            continue
+        build_positions.extend(matches)
+        probe_positions.extend([position] * len(matches))
+    return build_positions, probe_positions
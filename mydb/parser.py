@@ -1,218 +1,484 @@
 import re
 
-def parse(sql):
-    sql = sql.strip().rstrip(";")
-
-    if sql.upper().startswith("EXPLAIN"):
-        return parse_explain(sql)
-
-    if sql.upper().startswith("CREATE TABLE"):
-        return parse_create_table(sql)
+from mydb.aggregate import AGGREGATES, output_name
 
-    if sql.upper().startswith("INSERT INTO"):
-        return parse_insert(sql)
+class Parameter:
+    """A `?` placeholder in a prepared statement, filled in when it is executed."""
+    __slots__ = ("index",)
 
-    if sql.upper().startswith("SELECT"):
-        # Check if it's a JOIN query
-        if "JOIN" in sql.upper():
-            return parse_join(sql)
-        return parse_select(sql)
+    def __init__(self, index=None):
+        self.index = index
 
-    if sql.upper().startswith("UPDATE"):
-        return parse_update(sql)
+    def __repr__(self):
+        return "?"
 
-    if sql.upper().startswith("DELETE"):
-        return parse_delete(sql)
-
-    raise ValueError("Unsupported SQL")
-
-def parse_create_table(sql):
-    pattern = r"CREATE TABLE (\w+)\s*\((.+)\)"
-    match = re.match(pattern, sql, re.IGNORECASE)
+def parse(sql):
+    """
+    Parse one SQL statement into an AST.
+    `?` placeholders are only accepted through Database.prepare().
+    """
+    ast = parse_statement(sql)
+    if find_parameters(ast):
+        raise ValueError("Statement has ? parameters; use Database.prepare() to bind them")
+    return ast
+
+def find_parameters(node, found=None):
+    """List the Parameter placeholders of an AST in statement order."""
+    if found is None:
+        found = []
+    if isinstance(node, Parameter):
+        found.append(node)
+    elif isinstance(node, dict):
+        for value in node.values():
+            find_parameters(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            find_parameters(value, found)
+    return found
+
+def parse_statement(sql):
+    """Parse one SQL statement (an optional trailing semicolon is allowed) into an AST."""
+    parser = Parser(sql)
+    ast = parser.statement()
+    parser.finish()
+    return ast
+
+# One token per match, in a single left-to-right pass: a word (name,
+# keyword or number), a quoted string ("..." for values, '...' for COPY
+# paths; a doubled quote inside stands for the quote itself), or an
+# operator. A character that cannot start a token swallows the rest of
+# the text, so only the last token can be invalid.
+TOKEN = r"""\w+|"(?:[^"]|"")*"|'(?:[^']|'')*'|[<>!]=|<>|[<>=(),.*;?-]"""
+TOKEN_PATTERN = re.compile(r"\s*(" + TOKEN + r"|\S.*)", re.DOTALL)
+VALID_TOKEN = re.compile(TOKEN)
+
+# Comparison operators of WHERE conditions; <> is stored as !=
+COMPARISON_OPS = {"=": "=", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "!=": "!=", "<>": "!="}
+
+# Marks the end of the token list
+END = ""
+
+def tokenize(sql):
+    """
+    Split SQL text into tokens (strings as written, quotes included),
+    ending with END. Raises ValueError for unterminated strings and
+    characters that cannot start a token.
+    """
+    tokens = TOKEN_PATTERN.findall(sql)
+    if tokens and not VALID_TOKEN.fullmatch(tokens[-1]):
+        rest = tokens[-1]
+        if rest[0] in "\"'":
+            raise ValueError(f"Unterminated string starting at {rest[:20]!r}")
+        raise ValueError(f"Unexpected character {rest[0]!r} near {rest[:20]!r}")
+    tokens.append(END)
+    return tokens
+
+class Parser:
+    """
+    Recursive-descent parser over the tokens of one statement. Each
+    statement method consumes its tokens and returns the statement's AST;
+    keywords are case-insensitive, names are kept as written.
+    """
+
+    def __init__(self, sql):
+        self.tokens = tokenize(sql)
+        # Upper-cased tokens, for keyword comparisons
+        self.words = [token.upper() for token in self.tokens]
+        self.pos = 0
+        self.kind = "SQL"  # statement being parsed, for error messages
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def error(self, expected):
+        token = self.tokens[self.pos]
+        found = "end of statement" if token == END else repr(token)
+        raise ValueError(f"Invalid {self.kind} syntax: expected {expected}, found {found}")
+
+    def at_keyword(self, *words):
+        return self.words[self.pos] in words
+
+    def accept_keyword(self, word):
+        if self.words[self.pos] == word:
+            self.pos += 1
+            return True
+        return False
+
+    def expect_keyword(self, word):
+        if not self.accept_keyword(word):
+            self.error(word)
+
+    def accept(self, op):
+        if self.tokens[self.pos] == op:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, op):
+        if not self.accept(op):
+            self.error(f"'{op}'")
+
+    def name(self, what="a name"):
+        token = self.tokens[self.pos]
+        if not token.isidentifier():
+            self.error(what)
+        self.pos += 1
+        return token
+
+    def finish(self):
+        """Only an optional semicolon may follow the statement."""
+        self.accept(";")
+        if self.tokens[self.pos] != END:
+            self.error("end of statement")
+
+    # Statements
+
+    def statement(self):
+        if not self.at_keyword("BEGIN", "COMMIT", "ROLLBACK", "EXPLAIN", "CREATE", "INSERT",
+                               "COPY", "SELECT", "UPDATE", "DELETE", "SHOW"):
+            raise ValueError("Unsupported SQL")
+        word = self.advance().upper()
+
+        if word in ("BEGIN", "COMMIT", "ROLLBACK"):
+            if not self.accept_keyword("TRANSACTION"):
+                self.accept_keyword("WORK")
+            return {"type": word}
+        if word == "EXPLAIN":
+            analyze = self.accept_keyword("ANALYZE")
+            return {"type": "EXPLAIN", "analyze": analyze, "query": self.statement()}
+        if word == "CREATE":
+            if self.accept_keyword("INDEX"):
+                return self.create_index()
+            self.kind = "CREATE TABLE"
+            self.expect_keyword("TABLE")
+            return self.create_table()
+        return getattr(self, word.lower())()
+
+    def create_table(self):
+        # CREATE TABLE name (column TYPE [PRIMARY KEY] [UNIQUE], ...)
+        table = self.name("a table name")
+        self.expect("(")
+        columns = {}
+        while True:
+            column = self.name("a column name")
+            if column in columns:
+                raise ValueError(f"Duplicate column '{column}'")
+            definition = {"type": self.name("a column type").upper(), "primary": False, "unique": False}
+            while True:
+                if self.accept_keyword("PRIMARY"):
+                    self.expect_keyword("KEY")
+                    definition["primary"] = True
+                elif self.accept_keyword("UNIQUE"):
+                    definition["unique"] = True
+                else:
+                    break
+            columns[column] = definition
+            if not self.accept(","):
+                break
+        self.expect(")")
+
+        return {
+            "type": "CREATE_TABLE",
+            "table": table,
+            "columns": columns
+        }
 
-    if not match:
-        raise ValueError("Invalid CREATE TABLE syntax")
+    def create_index(self):
+        # CREATE INDEX name ON table(column)
+        self.kind = "CREATE INDEX"
+        name = self.name("an index name")
+        self.expect_keyword("ON")
+        table = self.name("a table name")
+        self.expect("(")
+        column = self.name("a column name")
+        self.expect(")")
+
+        return {
+            "type": "CREATE_INDEX",
+            "name": name,
+            "table": table,
+            "column": column
+        }
 
-    table_name = match.group(1)
-    columns_raw = match.group(2)
+    def insert(self):
+        # INSERT INTO table VALUES (value, ...) [, (value, ...) ...]
+        self.kind = "INSERT"
+        self.expect_keyword("INTO")
+        table = self.name("a table name")
+        self.expect_keyword("VALUES")
+
+        rows = []
+        while True:
+            self.expect("(")
+            values = [self.literal()]
+            while self.accept(","):
+                values.append(self.literal())
+            self.expect(")")
+            rows.append(values)
+            if not self.accept(","):
+                break
+
+        return {
+            "type": "INSERT",
+            "table": table,
+            "rows": rows
+        }
 
-    columns = {}
-    for col_def in columns_raw.split(","):
-        parts = col_def.strip().split()
-        col_name = parts[0]
-        col_type = parts[1].upper()
+    def copy(self):
+        # COPY table FROM 'file.csv'
+        self.kind = "COPY"
+        table = self.name("a table name")
+        self.expect_keyword("FROM")
+        path = self.peek()
+        if path[:1] not in ("'", '"'):
+            self.error("a quoted file path")
+        path = unquote(self.advance())
+
+        return {
+            "type": "COPY",
+            "table": table,
+            "path": path
+        }
 
-        columns[col_name] = {
-            "type": col_type,
-            "primary": "PRIMARY" in col_def.upper(),
-            "unique": "UNIQUE" in col_def.upper()
+    def show(self):
+        # SHOW STATS | SHOW SLOW QUERIES
+        self.kind = "SHOW"
+        if self.accept_keyword("SLOW"):
+            self.expect_keyword("QUERIES")
+            return {"type": "SHOW_SLOW_QUERIES"}
+        self.expect_keyword("STATS")
+        return {"type": "SHOW_STATS"}
+
+    def select(self):
+        # SELECT * | items FROM table [WHERE conditions] [GROUP BY column]
+        #   [ORDER BY column [ASC|DESC]] [LIMIT n] [OFFSET m]
+        # or SELECT * | table.col, ... FROM table1 [INNER] JOIN table2
+        #   ON table1.col = table2.col [LIMIT n] [OFFSET m]
+        self.kind = "SELECT"
+        columns = self.select_list()
+        self.expect_keyword("FROM")
+        table = self.name("a table name")
+
+        if self.at_keyword("JOIN", "INNER"):
+            return self.join(columns, table)
+
+        if columns is not None:
+            for item in columns:
+                # A qualified column must name the selected table
+                qualifier = item.pop("table", None)
+                if qualifier is not None and qualifier != table:
+                    raise ValueError(f"Table '{qualifier}' is not part of the SELECT")
+
+        where = self.expression() if self.accept_keyword("WHERE") else None
+
+        group_by = None
+        if self.accept_keyword("GROUP"):
+            self.expect_keyword("BY")
+            group_by = self.name("a column name")
+
+        order_by = None
+        if self.accept_keyword("ORDER"):
+            self.expect_keyword("BY")
+            # ORDER BY an aggregate names it as in the result: COUNT(*), SUM(age)
+            item = self.select_item()
+            if "table" in item:
+                self.error("a column name or aggregate")
+            direction = "ASC"
+            if self.at_keyword("ASC", "DESC"):
+                direction = self.advance().upper()
+            order_by = {"column": output_name(item), "direction": direction}
+
+        limit, offset = self.limit_offset()
+
+        return {
+            "type": "SELECT",
+            "table": table,
+            "columns": columns,
+            "where": where,
+            "group_by": group_by,
+            "order_by": order_by,
+            "limit": limit,
+            "offset": offset
         }
 
-    return {
-        "type": "CREATE_TABLE",
-        "table": table_name,
-        "columns": columns
-    }
-
-def parse_insert(sql):
-    pattern = r"INSERT INTO (\w+)\s+VALUES\s*\((.+)\)"
-    match = re.match(pattern, sql, re.IGNORECASE)
-
-    if not match:
-        raise ValueError("Invalid INSERT syntax")
-
-    table = match.group(1)
-    raw_values = match.group(2)
-
-    values = []
-    for val in raw_values.split(","):
-        val = val.strip()
-        if val.startswith('"') and val.endswith('"'):
-            values.append(val[1:-1])
-        elif val.isdigit():
-            values.append(int(val))
-        else:
-            raise ValueError(f"Unsupported value: {val}")
-
-    return {
-        "type": "INSERT",
-        "table": table,
-        "values": values
-    }
-
-def parse_select(sql):
-    # Pattern to match: SELECT * FROM table [WHERE column = value]
-    pattern = r"SELECT\s+\*\s+FROM\s+(\w+)(?:\s+WHERE\s+(\w+)\s*=\s*(.+))?\s*$"
-    match = re.match(pattern, sql, re.IGNORECASE)
-
-    if not match:
-        raise ValueError("Invalid SELECT syntax. Supported: SELECT * FROM table [WHERE column = value]")
-
-    table = match.group(1)
-    where_clause = None
-
-    # If WHERE clause is present
-    if match.group(2):
-        column = match.group(2)
-        raw_value = match.group(3).strip()
-
-        # Parse value (string or integer)
-        if raw_value.startswith('"') and raw_value.endswith('"'):
-            value = raw_value[1:-1]
-        elif raw_value.isdigit():
-            value = int(raw_value)
-        else:
-            raise ValueError(f"Invalid WHERE value: {raw_value}")
-
-        where_clause = {
-            "column": column,
-            "value": value
+    def join(self, columns, left_table):
+        self.kind = "JOIN"
+        self.accept_keyword("INNER")
+        self.expect_keyword("JOIN")
+        right_table = self.name("a table name")
+        self.expect_keyword("ON")
+        first_table, first_column = self.qualified_column()
+        self.expect("=")
+        second_table, second_column = self.qualified_column()
+
+        # The condition may name the tables in either order
+        if first_table == right_table and second_table == left_table and left_table != right_table:
+            first_table, first_column, second_table, second_column = \
+                second_table, second_column, first_table, first_column
+        if first_table != left_table:
+            raise ValueError(f"Table name mismatch: '{first_table}' != '{left_table}'")
+        if second_table != right_table:
+            raise ValueError(f"Table name mismatch: '{second_table}' != '{right_table}'")
+
+        # None stands for SELECT *; join columns are always qualified
+        if columns is not None:
+            for item in columns:
+                if "table" not in item:
+                    raise ValueError(f"Invalid JOIN select item: {output_name(item)} (use table.column)")
+
+        limit, offset = self.limit_offset()
+
+        return {
+            "type": "JOIN",
+            "left_table": left_table,
+            "right_table": right_table,
+            "left_column": first_column,
+            "right_column": second_column,
+            "columns": columns,
+            "limit": limit,
+            "offset": offset
         }
 
-    return {
-        "type": "SELECT",
-        "table": table,
-        "where": where_clause
-    }
-
-def parse_update(sql):
-    # Pattern: UPDATE table SET column = value WHERE column = value;
-    pattern = r"UPDATE\s+(\w+)\s+SET\s+(\w+)\s*=\s*(.+?)\s+WHERE\s+(\w+)\s*=\s*(.+)\s*$"
-    match = re.match(pattern, sql, re.IGNORECASE)
-
-    if not match:
-        raise ValueError("Invalid UPDATE syntax. Required: UPDATE table SET column = value WHERE column = value")
-
-    table = match.group(1)
-    set_column = match.group(2)
-    set_raw = match.group(3).strip()
-    where_column = match.group(4)
-    where_raw = match.group(5).strip()
-
-    def parse_value(raw):
-        if raw.startswith('"') and raw.endswith('"'):
-            return raw[1:-1]
-        if raw.isdigit():
-            return int(raw)
-        raise ValueError(f"Invalid value: {raw}")
-
-    return {
-        "type": "UPDATE",
-        "table": table,
-        "set": {
-            "column": set_column,
-            "value": parse_value(set_raw)
-        },
-        "where": {
-            "column": where_column,
-            "value": parse_value(where_raw)
+    def update(self):
+        # UPDATE table SET column = value [, column = value ...] WHERE conditions
+        self.kind = "UPDATE"
+        table = self.name("a table name")
+        self.expect_keyword("SET")
+        assignments = []
+        while True:
+            column = self.name("a column name")
+            self.expect("=")
+            assignments.append({"column": column, "value": self.literal()})
+            if not self.accept(","):
+                break
+        self.expect_keyword("WHERE")
+
+        return {
+            "type": "UPDATE",
+            "table": table,
+            "set": assignments,
+            "where": self.expression()
         }
-    }
-
-def parse_delete(sql):
-    # Pattern: DELETE FROM table WHERE column = value;
-    pattern = r"DELETE\s+FROM\s+(\w+)\s+WHERE\s+(\w+)\s*=\s*(.+)\s*$"
-    match = re.match(pattern, sql, re.IGNORECASE)
-
-    if not match:
-        raise ValueError("Invalid DELETE syntax. Required: DELETE FROM table WHERE column = value")
-
-    table = match.group(1)
-    column = match.group(2)
-    raw = match.group(3).strip()
-
-    # Parse value (string or integer)
-    if raw.startswith('"') and raw.endswith('"'):
-        value = raw[1:-1]
-    elif raw.isdigit():
-        value = int(raw)
-    else:
-        raise ValueError(f"Invalid WHERE value: {raw}")
-
-    return {
-        "type": "DELETE",
-        "table": table,
-        "where": {
-            "column": column,
-            "value": value
+
+    def delete(self):
+        # DELETE FROM table WHERE conditions
+        self.kind = "DELETE"
+        self.expect_keyword("FROM")
+        table = self.name("a table name")
+        self.expect_keyword("WHERE")
+
+        return {
+            "type": "DELETE",
+            "table": table,
+            "where": self.expression()
         }
-    }
-
-def parse_join(sql):
-    # Pattern: SELECT * FROM table1 JOIN table2 ON table1.col = table2.col;
-    pattern = r"SELECT\s+\*\s+FROM\s+(\w+)\s+JOIN\s+(\w+)\s+ON\s+(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)\s*$"
-    match = re.match(pattern, sql, re.IGNORECASE)
-
-    if not match:
-        raise ValueError("Invalid JOIN syntax. Required: SELECT * FROM table1 JOIN table2 ON table1.col = table2.col")
-
-    left_table = match.group(1)
-    right_table = match.group(2)
-    left_table_name = match.group(3)
-    left_column = match.group(4)
-    right_table_name = match.group(5)
-    right_column = match.group(6)
-
-    # Validate table names match
-    if left_table_name != left_table:
-        raise ValueError(f"Table name mismatch: '{left_table_name}' != '{left_table}'")
-    if right_table_name != right_table:
-        raise ValueError(f"Table name mismatch: '{right_table_name}' != '{right_table}'")
-
-    return {
-        "type": "JOIN",
-        "left_table": left_table,
-        "right_table": right_table,
-        "left_column": left_column,
-        "right_column": right_column
-    }
-
-def parse_explain(sql):
-    # Remove "EXPLAIN" prefix and parse the inner query
-    inner_sql = sql[len("EXPLAIN"):].strip()
-    inner_query = parse(inner_sql)
-    
-    return {
-        "type": "EXPLAIN",
-        "query": inner_query
-    }
+
+    # Clauses
+
+    def select_list(self):
+        """`*` (returned as None) or a comma-separated list of select items."""
+        if self.accept("*"):
+            return None
+        items = [self.select_item()]
+        while self.accept(","):
+            items.append(self.select_item())
+        return items
+
+    def select_item(self):
+        """
+        One select item: `column`, `table.column`, `COUNT(*)` or
+        `FUNCTION(column)` (FUNCTION: COUNT, SUM, MIN, MAX, AVG).
+        """
+        name = self.name("a column name or aggregate")
+        if self.accept("("):
+            function = name.upper()
+            if function not in AGGREGATES:
+                raise ValueError(f"Unknown function '{name}'. Supported: {', '.join(AGGREGATES)}")
+            column = "*" if self.accept("*") else self.name("a column name or *")
+            self.expect(")")
+            return {"function": function, "column": column}
+        if self.accept("."):
+            return {"table": name, "column": self.name("a column name")}
+        return {"column": name}
+
+    def qualified_column(self):
+        table = self.name("table.column")
+        self.expect(".")
+        return table, self.name("a column name")
+
+    def limit_offset(self):
+        """[LIMIT n] [OFFSET m]: (value or None, value or None)."""
+        limit = self.literal() if self.accept_keyword("LIMIT") else None
+        offset = self.literal() if self.accept_keyword("OFFSET") else None
+        return limit, offset
+
+    def expression(self):
+        """
+        A WHERE clause: conditions combined with AND and OR (AND binds
+        tighter) and grouped with parentheses. Returns a single condition
+        {"column", "op", "value"} or {"op": "AND" | "OR", "conditions": [...]}.
+        """
+        return self.combination("OR", self.conjunction)
+
+    def conjunction(self):
+        return self.combination("AND", self.predicate)
+
+    def combination(self, op, operand):
+        conditions = []
+        while True:
+            condition = operand()
+            # Nested groups of the same operator are flattened: a AND (b AND c)
+            if condition.get("op") == op:
+                conditions.extend(condition["conditions"])
+            else:
+                conditions.append(condition)
+            if not self.accept_keyword(op):
+                break
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"op": op, "conditions": conditions}
+
+    def predicate(self):
+        """`( expression )`, `column op value` or `column BETWEEN low AND high`."""
+        if self.accept("("):
+            condition = self.expression()
+            self.expect(")")
+            return condition
+
+        column = self.name("a column name")
+        if self.accept_keyword("BETWEEN"):
+            low = self.literal()
+            self.expect_keyword("AND")
+            return {"column": column, "op": "BETWEEN", "value": [low, self.literal()]}
+
+        op = COMPARISON_OPS.get(self.peek())
+        if op is None:
+            self.error("a comparison (=, !=, <, <=, >, >=, BETWEEN)")
+        self.pos += 1
+        return {"column": column, "op": op, "value": self.literal()}
+
+    def literal(self):
+        """A string or (possibly negative) integer literal, or a `?` parameter placeholder."""
+        token = self.advance()
+        if token[:1] == '"':
+            return unquote(token)
+        if token.isdigit() and token.isascii():
+            return int(token)
+        if token == "?":
+            return Parameter()
+        if token == "-" and self.peek().isdigit() and self.peek().isascii():
+            return -int(self.advance())
+        self.pos -= 1
+        if token == END:
+            self.error("a value")
+        raise ValueError(f"Unsupported value: {token}")
+
+def unquote(token):
+    """The text of a quoted string token, with doubled quotes undone."""
+    quote = token[0]
+    return token[1:-1].replace(quote * 2, quote)
@@ -0,0 +1,337 @@
+import math
+import time
+
+from mydb.vector import conditions, leaves
+
+# Cost units: reading one row slot in a batched table scan costs 1.
+# Rows reached through index positions are fetched and checked one at a
+# time in Python, which costs several times more per row; a filtered scan
+# pays a fixed setup cost for its column batches.
+SCAN_ROW_COST = 1
+SCAN_SETUP_COST = 10
+FETCH_ROW_COST = 4
+
+# Selectivity of a range condition on a TEXT column, per bound, when no
+# ordered index tells how the keys are spread
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+
+
+def range_bounds(where):
+    """Translate a single WHERE condition into OrderedIndex.range() arguments."""
+    op = where.get("op", "=")
+    value = where["value"]
+    if op == "BETWEEN":
+        return {"low": value[0], "high": value[1]}
+    if op == "=":
+        return {"low": value, "high": value}
+    if op == "<":
+        return {"high": value, "high_inclusive": False}
+    if op == "<=":
+        return {"high": value}
+    if op == ">":
+        return {"low": value, "low_inclusive": False}
+    return {"low": value}
+
+
+def validate_where(table, where):
+    """Check that every WHERE column exists and range bounds match its type."""
+    headers = list(table.columns.keys())
+    for condition in leaves(where):
+        column = condition["column"]
+        if column not in headers:
+            raise ValueError(f"Unknown column '{column}'")
+
+        op = condition.get("op", "=")
+        if op == "BETWEEN":
+            for bound in condition["value"]:
+                table.check_value(column, bound)
+        elif op != "=":
+            table.check_value(column, condition["value"])
+
+
+def column_distinct(table, column):
+    """
+    Number of distinct values in a column: exact from its index when it
+    has one, otherwise estimated from the table statistics.
+    """
+    if column in table.indexes:
+        return len(table.indexes[column]["map"])
+    if column in table.ordered_indexes:
+        return len(table.ordered_indexes[column])
+    if not table.row_count:
+        return 0
+    return min(max(table.stats.column(column).distinct(), 1), table.row_count)
+
+
+def column_bounds(table, column):
+    """(min, max) of a column; exact from an ordered index, otherwise from the statistics."""
+    if column in table.ordered_indexes:
+        index = table.ordered_indexes[column]
+        return index.min(), index.max()
+    stats = table.stats.column(column)
+    return stats.min, stats.max
+
+
+def range_selectivity(table, column, bounds):
+    """Fraction of a column's rows within OrderedIndex.range() style bounds."""
+    low, high = bounds.get("low"), bounds.get("high")
+    low_inclusive = bounds.get("low_inclusive", True)
+    high_inclusive = bounds.get("high_inclusive", True)
+
+    # Count the keys in range, assuming every key has about as many rows
+    if column in table.ordered_indexes:
+        index = table.ordered_indexes[column]
+        if not len(index):
+            return 0.0
+        first = 0 if low is None else index.rank(low, inclusive=not low_inclusive)
+        last = len(index) if high is None else index.rank(high, inclusive=high_inclusive)
+        return max(last - first, 0) / len(index)
+
+    # Otherwise INT columns are assumed to be spread evenly over [min, max]
+    if table.columns[column]["type"] == "INT":
+        stats = table.stats.column(column)
+        if stats.min is None:
+            return 0.0
+        smallest, largest = stats.min, stats.max
+        if low is not None:
+            smallest = max(smallest, low if low_inclusive else low + 1)
+        if high is not None:
+            largest = min(largest, high if high_inclusive else high - 1)
+        return max(largest - smallest + 1, 0) / (stats.max - stats.min + 1)
+
+    return DEFAULT_RANGE_SELECTIVITY ** ((low is not None) + (high is not None))
+
+
+def selectivity(table, where):
+    """Estimated fraction of the live rows matching a WHERE clause (a condition or AND/OR group)."""
+    op = where.get("op", "=")
+    if op == "AND":
+        fraction = 1.0
+        for condition in where["conditions"]:
+            fraction *= selectivity(table, condition)
+        return fraction
+    if op == "OR":
+        # Conditions are taken as independent: P(a or b) = P(a) + P(b) - P(a)P(b)
+        fraction = 0.0
+        for condition in where["conditions"]:
+            matched = selectivity(table, condition)
+            fraction += matched - fraction * matched
+        return fraction
+
+    if not table.row_count:
+        return 0.0
+    column = where["column"]
+    if op in ("=", "!="):
+        smallest, largest = column_bounds(table, column)
+        value = where["value"]
+        outside = (type(value) is type(smallest) and (value < smallest or value > largest))
+        equal = 0.0 if outside else 1 / max(column_distinct(table, column), 1)
+        return equal if op == "=" else 1 - equal
+    return range_selectivity(table, column, range_bounds(where))
+
+
+def estimate_rows(table, where):
+    """Estimated number of live rows matching a WHERE clause (all of them without one)."""
+    if not where:
+        return table.row_count
+    return round(table.row_count * selectivity(table, where))
+
+
+def scan_cost(table, where):
+    """Cost of reading every row slot, filtered in column batches when there is a WHERE clause."""
+    cost = len(table.rows) * SCAN_ROW_COST
+    return cost + SCAN_SETUP_COST if where else cost
+
+
+def sort_cost(rows):
+    return int(rows * math.log2(max(rows, 2)))
+
+
+def access_paths(table, where):
+    """
+    Index access paths for the conditions ANDed at the top level of a
+    WHERE clause; OR groups and != are checked per row. Each path is a
+    dict with the strategy, the condition the index answers, the rows it
+    produces and the cost of fetching them.
+    """
+    paths = []
+    if not where:
+        return paths
+    for condition in conditions(where):
+        op = condition.get("op", "=")
+        if op in ("OR", "!="):
+            continue
+        column = condition["column"]
+        if op == "=" and column in table.indexes:
+            strategy, lookup = "INDEX LOOKUP", 1
+        elif column in table.ordered_indexes:
+            strategy = "ORDERED INDEX LOOKUP" if op == "=" else "INDEX RANGE SCAN"
+            lookup = math.log2(len(table.ordered_indexes[column]) + 1)
+        else:
+            continue
+        rows = estimate_rows(table, condition)
+        paths.append({"strategy": strategy, "column": column, "condition": condition,
+                      "rows": rows, "cost": lookup + rows * FETCH_ROW_COST})
+    return paths
+
+
+def plan_access(table, where):
+    """
+    Pick the cheapest way to find the rows matching a WHERE clause.
+    Returns (strategy, condition): the index and the condition it answers,
+    or (None, None) when scanning the table is cheaper.
+    """
+    paths = access_paths(table, where)
+    if paths:
+        # min() keeps the first of equally cheap paths, in WHERE order
+        path = min(paths, key=lambda candidate: candidate["cost"])
+        if path["cost"] <= scan_cost(table, where):
+            return path["strategy"], path["condition"]
+    return None, None
+
+
+def plan_select(table, ast):
+    """
+    Choose the access path for a SELECT from the table statistics.
+    Every applicable path (index lookups and ranges, walking the ORDER BY
+    column's index, scanning the table) is costed, including the sort it
+    leaves to do and how early LIMIT lets it stop; the cheapest wins.
+    Returns a dict with the strategy, the index column it uses (if any),
+    whether rows still need the WHERE filter or an explicit sort, and the
+    estimated rows and cost.
+    """
+    where_clause = ast.get("where")
+    order_by = ast.get("order_by")
+    limit = ast.get("limit")
+
+    # Validate columns exist
+    if where_clause:
+        validate_where(table, where_clause)
+    if order_by and order_by["column"] not in table.columns:
+        raise ValueError(f"Unknown column '{order_by['column']}'")
+
+    matched = estimate_rows(table, where_clause)
+    candidates = []
+    for path in access_paths(table, where_clause):
+        in_order = (order_by is not None and order_by["column"] == path["column"]
+                    and path["strategy"] != "INDEX LOOKUP")
+        candidates.append({"strategy": path["strategy"], "column": path["column"],
+                           "condition": path["condition"], "filter": len(conditions(where_clause)) > 1,
+                           "sort": order_by is not None and not in_order, "cost": path["cost"]})
+
+    # Walk an ordered index in ORDER BY order so LIMIT can stop early
+    if order_by and order_by["column"] in table.ordered_indexes:
+        candidates.append({"strategy": "INDEX ORDER SCAN", "column": order_by["column"], "condition": None,
+                           "filter": where_clause is not None, "sort": False,
+                           "cost": table.row_count * FETCH_ROW_COST})
+
+    candidates.append({"strategy": "TABLE SCAN" if where_clause else "FULL TABLE SCAN",
+                       "column": None, "condition": None, "filter": where_clause is not None,
+                       "sort": order_by is not None, "cost": scan_cost(table, where_clause)})
+
+    offset = ast.get("offset") or 0
+    for candidate in candidates:
+        if candidate["sort"]:
+            candidate["cost"] += sort_cost(matched)
+        elif limit is not None and matched:
+            # Rows stream out, so the plan stops after offset + limit matches
+            candidate["cost"] *= min(1, (offset + limit) / matched)
+        candidate["cost"] = math.ceil(candidate["cost"])
+
+    plan = min(candidates, key=lambda candidate: candidate["cost"])
+    rows = max(matched - offset, 0)
+    plan["estimated_rows"] = rows if limit is None else min(rows, limit)
+    return plan
+
+
+def plan_join(left_table, left_column, right_table, right_column):
+    """
+    Choose a join operator from row counts, statistics and index
+    availability. Every applicable operator gets a cost in row visits;
+    the cheapest wins, and the smaller input is the one hashed or probed
+    into. Returns a dict with the strategy, the side it probes or builds
+    on, its cost and the estimated number of output rows.
+    """
+    left_rows = left_table.row_count
+    right_rows = right_table.row_count
+
+    # Classic equi-join estimate: |L| * |R| / max(distinct(L.col), distinct(R.col))
+    distinct = max(column_distinct(left_table, left_column),
+                   column_distinct(right_table, right_column), 1)
+    estimated_rows = (left_rows * right_rows) // distinct
+
+    candidates = []
+
+    # Index nested loop: scan one side, probe the other side's index
+    for probe_side, table, column, outer_rows in (("right", right_table, right_column, left_rows),
+                                                  ("left", left_table, left_column, right_rows)):
+        if column in table.indexes:
+            candidates.append({"strategy": "INDEX LOOKUP", "side": probe_side,
+                               "index": "hash", "cost": outer_rows})
+        elif column in table.ordered_indexes:
+            candidates.append({"strategy": "INDEX LOOKUP", "side": probe_side,
+                               "index": "ordered", "cost": 2 * outer_rows})
+
+    # Sort-merge: inputs with an ordered index on the join column are
+    # already sorted; the other side (if any) has to be sorted first
+    left_sorted = left_column in left_table.ordered_indexes
+    right_sorted = right_column in right_table.ordered_indexes
+    same_type = left_table.columns[left_column]["type"] == right_table.columns[right_column]["type"]
+    if (left_sorted or right_sorted) and same_type:
+        cost = left_rows + right_rows
+        for is_sorted, rows in ((left_sorted, left_rows), (right_sorted, right_rows)):
+            if not is_sorted:
+                cost += sort_cost(rows)
+        candidates.append({"strategy": "SORT-MERGE JOIN", "side": None, "cost": cost})
+
+    # Hash join: build on the smaller input, probe with the larger one
+    build_side = "left" if left_rows < right_rows else "right"
+    candidates.append({"strategy": "HASH JOIN", "side": build_side,
+                       "cost": 2 * min(left_rows, right_rows) + max(left_rows, right_rows)})
+
+    candidates.append({"strategy": "NESTED LOOP JOIN", "side": None,
+                       "cost": left_rows * right_rows})
+
+    # min() keeps the first of equally cheap candidates, in the order above
+    plan = min(candidates, key=lambda candidate: candidate["cost"])
+    plan["estimated_rows"] = estimated_rows
+    plan["left_rows"] = left_rows
+    plan["right_rows"] = right_rows
+    return plan
+
+
+class Step:
+    """
+    One operator of an executed plan, for EXPLAIN ANALYZE: the rows it
+    produced and the time spent producing them, including the time of
+    the operators it reads from.
+    """
+
+    def __init__(self, name, index=False):
+        self.name = name
+        self.index = index  # rows come from index lookups
+        self.rows = 0
+        self.seconds = 0.0
+
+    def wrap(self, rows):
+        rows = iter(rows)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                row = next(rows)
+            except StopIteration:
+                self.seconds += clock() - start
+                return
+            self.seconds += clock() - start
+            self.rows += 1
+            yield row
+
+
+def traced(trace, name, rows, index=False):
+    """Record `rows` as a Step in `trace` (a list); without a trace, return them untouched."""
+    if trace is None:
+        return rows
+    step = Step(name, index)
+    trace.append(step)
+    return step.wrap(rows)
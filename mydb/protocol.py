@@ -0,0 +1,77 @@
+import json
+import struct
+
+# Wire protocol between mydb.server and mydb.client.
+#
+# Every message is a frame: a 4-byte big-endian payload length followed by
+# a UTF-8 JSON object. The client sends one request and reads its replies
+# before sending the next:
+#
+#   {"op": "prepare", "sql": ...}                  -> {"parameters": n}
+#   {"op": "execute", "sql": ..., "params": [...]} -> {"result": text, "transaction": bool}
+#   {"op": "query", "sql": ..., "params": [...], "batch": n}
+#       -> {"columns": [[name, type], ...]}, then {"rows": [[...], ...]} per
+#          full batch of n rows, then the last (short, maybe empty) batch as
+#          {"rows": [...], "end": true, "rowcount": n, "transaction": bool}
+#   {"op": "metrics"}                              -> {"metrics": Prometheus text}
+#
+# Any request can instead be answered (or a row stream ended) by
+# {"error": message, "kind": exception class name, "transaction": bool}.
+# "transaction" tells the client whether its connection has a transaction open.
+
+DEFAULT_PORT = 5480
+
+_HEADER = struct.Struct(">I")
+
+# Frames larger than this are refused (and the connection dropped)
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode(message):
+    """Frame a message for sending."""
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(payload)) + payload
+
+
+def payload_size(header):
+    """Payload length from a frame's 4 header bytes."""
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ProtocolError(f"Frame of {size} bytes exceeds the {MAX_FRAME} byte limit")
+    return size
+
+
+def decode(payload):
+    try:
+        message = json.loads(payload)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ProtocolError(f"Malformed frame: {e}") from None
+    if not isinstance(message, dict):
+        raise ProtocolError("Malformed frame: expected a JSON object")
+    return message
+
+
+async def read_frame(reader):
+    """Next message from an asyncio stream, or None once the peer has closed it."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        return decode(await reader.readexactly(payload_size(header)))
+    except EOFError:
+        # asyncio.IncompleteReadError: closed between or inside frames
+        return None
+
+
+def read_message(stream):
+    """Next message from a blocking binary file (a socket's makefile("rb")), or None at EOF."""
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    size = payload_size(header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        return None
+    return decode(payload)
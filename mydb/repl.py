@@ -1,11 +1,15 @@
-from mydb.parser import parse
-from mydb.executor import Database
-from mydb.storage import load_database
+import argparse
 
-def run_repl():
-    tables = load_database()
-    db = Database()
-    db.tables = tables
+from mydb.cursor import render_lines
+from mydb.executor import Database
+from mydb.metrics import SLOW_LOG_FILE
+
+def run_repl(backend="json", parallelism=1, slow_query_ms=None, compression=None):
+    # Other processes (web workers, another shell) may use the same files
+    db = Database.open(backend=backend, parallelism=parallelism, compression=compression)
+    if slow_query_ms is not None:
+        db.metrics.slow_query_ms = slow_query_ms
+        db.metrics.slow_log_path = SLOW_LOG_FILE
     print("Welcome to MyDB. Type 'exit' to quit.")
 
     buffer = ""
@@ -26,13 +30,33 @@ def run_repl():
             sql = buffer
             buffer = ""
 
-            ast = parse(sql)
-            result = db.execute(ast)
+            statement = db.prepare(sql)
+            if statement.ast["type"] in ("SELECT", "JOIN", "SHOW_STATS", "SHOW_SLOW_QUERIES"):
+                # Stream query results instead of building one big string
+                for output_line in render_lines(statement.query()):
+                    print(output_line)
+                continue
+
+            result = statement.execute()
             print(result)
 
         except Exception as e:
             buffer = ""
             print(f"Error: {e}")
 
+    # Fold the log into the snapshot on a clean exit
+    db.close()
+
 if __name__ == "__main__":
-    run_repl()
+    arg_parser = argparse.ArgumentParser(description="MyDB interactive shell")
+    arg_parser.add_argument("--storage", choices=["json", "paged", "segments"], default="json",
+                            help="snapshot format (default: json)")
+    arg_parser.add_argument("--compression", choices=["zlib", "lzma"],
+                            help="compress table segments (with --storage segments)")
+    arg_parser.add_argument("--parallel", type=int, default=1, metavar="N",
+                            help="worker processes for large table scans (default: 1)")
+    arg_parser.add_argument("--slow-query-ms", type=float, metavar="MS",
+                            help=f"log statements taking at least MS milliseconds to {SLOW_LOG_FILE}")
+    args = arg_parser.parse_args()
+    run_repl(backend=args.storage, parallelism=args.parallel, slow_query_ms=args.slow_query_ms,
+             compression=args.compression)
@@ -0,0 +1,145 @@
+import json
+import lzma
+import os
+import zlib
+
+SEGMENTS_DB_FILE = "data/db.manifest"
+
+# Segmented snapshot layout:
+#   data/db.manifest       JSON: the generation and, per table, its segment
+#                          file, encoding, version, row count, size and CRC32
+#   data/db.segments/      one segment file per table (plus its index file):
+#                          a JSON header line (columns, version, indexes),
+#                          then the rows as one compact JSON array with a row
+#                          per line, the whole optionally compressed
+# A checkpoint writes new segments for the tables that changed under new
+# names, then replaces the manifest in one rename: until then the old
+# manifest and every segment it names are untouched, so a crash at any
+# point leaves a complete snapshot.
+
+# Segment encodings: (compress, decompress)
+ENCODINGS = {
+    "json": (bytes, bytes),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def segment_directory(path):
+    return os.path.splitext(path)[0] + ".segments"
+
+
+def read_manifest(path):
+    """The manifest at `path`, or None if there is none yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def encode_segment(table):
+    from mydb.storage import serialize_columns, serialize_indexes
+
+    header = {"columns": serialize_columns(table.columns), "version": table.version,
+              "indexes": serialize_indexes(table)}
+    # Rows are tuples in schema order; deleted rows are stored as null
+    rows = ",\n".join(map(json.dumps, table.rows))
+    return f"{json.dumps(header)}\n[{rows}]\n".encode("utf-8")
+
+
+def save_segments(tables, path=SEGMENTS_DB_FILE, compression=None):
+    """
+    Write a segmented snapshot of `tables`, replacing `path` atomically.
+    Only tables whose version or row count differ from their manifest
+    entry are written again; the others keep their segment (and index)
+    files. Segments no longer named by the manifest are removed.
+    Returns the number of bytes written.
+    """
+    from mydb.indexfile import index_path, save_indexes
+    from mydb.storage import sync_directory
+
+    encoding = compression or "json"
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown compression '{compression}'")
+    directory = segment_directory(path)
+    os.makedirs(directory, exist_ok=True)
+
+    old = read_manifest(path) or {"generation": 0, "tables": {}}
+    generation = old["generation"] + 1
+    entries = {}
+    written = 0
+
+    for number, (table_name, table) in enumerate(tables.items()):
+        entry = old["tables"].get(table_name)
+        if entry is not None and (entry["version"], entry["rows"]) == (table.version, len(table.rows)):
+            entries[table_name] = entry
+            continue
+
+        data = ENCODINGS[encoding][0](encode_segment(table))
+        # A new name every generation, so the previous snapshot's file is never overwritten
+        filename = f"{generation}-{number}-{table_name}.seg"
+        with open(os.path.join(directory, filename), "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        save_indexes({table_name: table}, index_path(os.path.join(directory, filename)))
+        written += len(data)
+        entries[table_name] = {"file": filename, "encoding": encoding, "version": table.version,
+                               "rows": len(table.rows), "bytes": len(data), "crc": zlib.crc32(data)}
+    sync_directory(directory)
+
+    manifest = json.dumps({"generation": generation, "tables": entries}, indent=2).encode("utf-8")
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(manifest)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    sync_directory(os.path.dirname(path))
+    written += len(manifest)
+
+    # Segments of older generations (or left by an interrupted checkpoint)
+    keep = {entry["file"] for entry in entries.values()}
+    keep |= {index_path(name) for name in keep}
+    for filename in os.listdir(directory):
+        if filename not in keep:
+            os.remove(os.path.join(directory, filename))
+
+    return written
+
+
+def open_segments(path=SEGMENTS_DB_FILE):
+    """
+    Read a segmented snapshot. Returns table_name -> {"columns" (on-disk
+    list format), "version", "indexes", "rows" (tuples, None for deleted
+    rows), "index_path"}; raises ValueError if a segment is damaged.
+    """
+    from mydb.indexfile import index_path
+
+    manifest = read_manifest(path)
+    if manifest is None:
+        return {}
+    directory = segment_directory(path)
+
+    tables = {}
+    for table_name, entry in manifest["tables"].items():
+        segment_path = os.path.join(directory, entry["file"])
+        with open(segment_path, "rb") as f:
+            data = f.read()
+        if len(data) != entry["bytes"] or zlib.crc32(data) != entry["crc"]:
+            raise ValueError(f"Segment '{segment_path}' of table '{table_name}' is damaged")
+
+        header, _, rows = ENCODINGS[entry["encoding"]][1](data).partition(b"\n")
+        table_data = json.loads(header)
+        table_data["rows"] = [None if values is None else tuple(values) for values in json.loads(rows)]
+        table_data["index_path"] = index_path(segment_path)
+        tables[table_name] = table_data
+    return tables
+
+
+def segments_size(path=SEGMENTS_DB_FILE):
+    """Total size of the segments named by the manifest at `path`."""
+    manifest = read_manifest(path)
+    if manifest is None:
+        return 0
+    return sum(entry["bytes"] for entry in manifest["tables"].values())
@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from mydb.executor import Database
+from mydb.metrics import SLOW_LOG_FILE
+from mydb.protocol import DEFAULT_PORT, ProtocolError, encode, read_frame
+
+# Rows per result frame when the client does not ask for a size
+BATCH_SIZE = 500
+
+
+class Session:
+    """
+    Server side of one client connection. Its statements run one at a
+    time on a thread of their own: Database calls block, and a
+    transaction's write lock belongs to the thread that ran BEGIN.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.thread = ThreadPoolExecutor(max_workers=1)
+        self.in_transaction = False
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.thread, function, *args)
+
+    async def close(self):
+        """Roll back a transaction the client left open, so its write lock is released."""
+        try:
+            if self.in_transaction:
+                await self.run(self.db.rollback)
+        finally:
+            self.thread.shutdown(wait=False)
+
+
+class Server:
+    """
+    Serves one Database over TCP (see mydb/protocol.py). Query rows are
+    streamed in batches as the client reads them, so a large result is
+    never held in memory as a whole.
+    """
+
+    def __init__(self, db, host="127.0.0.1", port=DEFAULT_PORT, batch_size=BATCH_SIZE):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        # Port 0 picks a free port
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle(self, reader, writer):
+        # Replies are small frames; do not let Nagle hold them back
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = Session(self.db)
+        try:
+            while True:
+                try:
+                    request = await read_frame(reader)
+                except ProtocolError as e:
+                    await self.send(writer, self.error(session, e))
+                    break
+                if request is None:
+                    break
+                await self.respond(session, request, writer)
+        except ConnectionError:
+            pass
+        finally:
+            await session.close()
+            writer.close()
+
+    async def respond(self, session, request, writer):
+        """Answer one request. Statement errors are reported to the client, which keeps the connection."""
+        try:
+            op = request.get("op")
+            if op == "metrics":
+                await self.send(writer, {"metrics": self.db.prometheus()})
+                return
+            if op not in ("prepare", "execute", "query"):
+                raise ProtocolError(f"Unknown request: {op!r}")
+            if not isinstance(request.get("sql"), str):
+                raise ProtocolError("Request has no SQL text")
+            # Parsed through the statement cache; parameters are bound, never spliced
+            statement = await session.run(self.db.prepare, request["sql"])
+            if op == "prepare":
+                await self.send(writer, {"parameters": statement.parameter_count})
+                return
+
+            params = request.get("params") or []
+            if op == "execute":
+                kind = statement.ast["type"]
+                try:
+                    result = await session.run(statement.execute, *params)
+                finally:
+                    # COMMIT ends the transaction even when it fails
+                    if kind in ("COMMIT", "ROLLBACK"):
+                        session.in_transaction = False
+                if kind == "BEGIN":
+                    session.in_transaction = True
+                await self.send(writer, {"result": result, "transaction": session.in_transaction})
+                return
+
+            cursor = await session.run(statement.query, *params)
+            try:
+                await self.send(writer, {"columns": cursor.columns})
+                size = request.get("batch") or self.batch_size
+                while True:
+                    rows = await session.run(cursor.fetchmany, size)
+                    if len(rows) < size:
+                        break
+                    # drain() in send() waits while the client is not reading
+                    await self.send(writer, {"rows": rows})
+            finally:
+                # Releases the read lock, also when the client went away
+                await session.run(cursor.close)
+            # The last batch carries the end, so a client that stops reading
+            # after a short result (a COUNT, a page) has nothing left to skip
+            await self.send(writer, {"rows": rows, "end": True, "rowcount": cursor.rowcount,
+                                     "transaction": session.in_transaction})
+        except ConnectionError:
+            raise
+        except Exception as e:
+            await self.send(writer, self.error(session, e))
+
+    def error(self, session, error):
+        return {"error": str(error), "kind": type(error).__name__, "transaction": session.in_transaction}
+
+    async def send(self, writer, message):
+        writer.write(encode(message))
+        await writer.drain()
+
+
+def run_server(host="127.0.0.1", port=DEFAULT_PORT, backend="json", parallelism=1, slow_query_ms=None,
+               compression=None):
+    # Other processes (web workers, a shell) may still open the same files
+    db = Database.open(backend=backend, parallelism=parallelism, compression=compression)
+    if slow_query_ms is not None:
+        db.metrics.slow_query_ms = slow_query_ms
+        db.metrics.slow_log_path = SLOW_LOG_FILE
+    server = Server(db, host, port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Fold the log into the snapshot on a clean exit
+        db.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="MyDB network server")
+    arg_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                            help=f"port to listen on (default: {DEFAULT_PORT})")
+    arg_parser.add_argument("--storage", choices=["json", "paged", "segments"], default="json",
+                            help="snapshot format (default: json)")
+    arg_parser.add_argument("--compression", choices=["zlib", "lzma"],
+                            help="compress table segments (with --storage segments)")
+    arg_parser.add_argument("--parallel", type=int, default=1, metavar="N",
+                            help="worker processes for large table scans (default: 1)")
+    arg_parser.add_argument("--slow-query-ms", type=float, metavar="MS",
+                            help=f"log statements taking at least MS milliseconds to {SLOW_LOG_FILE}")
+    args = arg_parser.parse_args()
+    run_server(args.host, args.port, backend=args.storage, parallelism=args.parallel,
+               slow_query_ms=args.slow_query_ms, compression=args.compression)
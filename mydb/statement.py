@@ -0,0 +1,114 @@
+import re
+import threading
+from collections import OrderedDict
+
+from mydb.parser import Parameter, find_parameters, parse_statement
+
+# Parsed statements kept per database
+CACHE_SIZE = 256
+
+# Runs of whitespace outside quoted strings ("..." or '...', where a
+# doubled quote stands for the quote itself)
+_TOKENS = re.compile(r"""("(?:[^"]|"")*"|'(?:[^']|'')*')|\s+""")
+
+
+def normalize_sql(sql):
+    """
+    Cache key for a statement: surrounding whitespace and the trailing
+    semicolon are dropped and whitespace runs outside string literals are
+    collapsed to one space. Case is kept, since table names are case-sensitive.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    return _TOKENS.sub(lambda match: match.group(1) or " ", sql)
+
+
+class StatementCache:
+    """LRU cache of parsed statements keyed by normalized SQL text."""
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, sql):
+        """
+        Return (ast, parameter_count) for a statement, parsing it on a miss.
+        The AST is shared between callers and must not be modified.
+        """
+        key = normalize_sql(sql)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock; two threads missing on the same
+        # statement both parse it and the second entry wins
+        ast = parse_statement(key)
+        parameters = find_parameters(ast)
+        for index, parameter in enumerate(parameters):
+            parameter.index = index
+
+        entry = (ast, len(parameters))
+        with self.lock:
+            self.entries[key] = entry
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def bind(node, params):
+    """Copy an AST with every Parameter replaced by its bound value."""
+    if isinstance(node, Parameter):
+        return params[node.index]
+    if isinstance(node, dict):
+        return {key: bind(value, params) for key, value in node.items()}
+    if isinstance(node, list):
+        return [bind(value, params) for value in node]
+    return node
+
+
+class PreparedStatement:
+    """
+    A parsed statement that can be executed many times.
+    Values for `?` placeholders are passed to execute()/query() in order
+    and are never spliced into SQL text, so they cannot change the statement.
+    """
+
+    def __init__(self, db, ast, parameter_count, sql=None):
+        self.db = db
+        self.ast = ast
+        self.parameter_count = parameter_count
+        # Shown in the slow query log
+        self.sql = sql
+
+    def bind(self, params):
+        """Return the statement's AST with `params` filled in."""
+        if len(params) != self.parameter_count:
+            raise ValueError(f"Statement expects {self.parameter_count} parameter(s), got {len(params)}")
+        if not params:
+            return self.ast
+
+        for value in params:
+            if type(value) not in (int, str):
+                raise ValueError(f"Unsupported parameter value: {value!r} (expected INT or TEXT)")
+        return bind(self.ast, params)
+
+    def execute(self, *params):
+        """Run the statement; returns the same result as Database.execute()."""
+        return self.db.execute(self.bind(params), self.sql)
+
+    def query(self, *params):
+        """Run a SELECT or JOIN statement and return a Cursor over its rows."""
+        return self.db.query(self.bind(params), self.sql)
@@ -0,0 +1,128 @@
+import bisect
+import heapq
+import operator
+
+# Distinct values are estimated from the SKETCH_SIZE smallest value hashes
+# (a k-minimum-values sketch): exact up to that many, about 6% off beyond
+SKETCH_SIZE = 256
+
+# Updates and deletes cannot be taken back out of the statistics (min/max
+# only widen, the sketch never forgets a value); once they add up to this
+# fraction of the rows, the statistics are recomputed on next use
+REFRESH_RATIO = 0.2
+REFRESH_MIN_CHANGES = 100
+
+_HASH_RANGE = 2 ** 64
+
+
+class ColumnStats:
+    """Smallest and largest value of a column and an estimate of its distinct values."""
+    __slots__ = ("min", "max", "sketch")
+
+    def __init__(self):
+        self.min = None
+        self.max = None
+        self.sketch = []  # smallest distinct value hashes, sorted
+
+    def add(self, values):
+        """Fold a list of new values into the statistics."""
+        if not values:
+            return
+        low, high = min(values), max(values)
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+
+        # Hashing 1-tuples mixes the bits; ints hash to themselves
+        self.sketch = heapq.nsmallest(SKETCH_SIZE, set(self.sketch).union(map(hash, zip(values))))
+
+    def add_value(self, value):
+        """Fold in a single new value (cheaper than add() for one row)."""
+        if self.min is None:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+        value_hash = hash((value,))
+        sketch = self.sketch
+        if len(sketch) == SKETCH_SIZE and value_hash >= sketch[-1]:
+            return
+        pos = bisect.bisect_left(sketch, value_hash)
+        if pos < len(sketch) and sketch[pos] == value_hash:
+            return
+        sketch.insert(pos, value_hash)
+        if len(sketch) > SKETCH_SIZE:
+            sketch.pop()
+
+    def distinct(self):
+        if len(self.sketch) < SKETCH_SIZE:
+            return len(self.sketch)
+        # The k-th smallest of n evenly spread hashes sits at about k/n of the range
+        return int((SKETCH_SIZE - 1) * _HASH_RANGE / (self.sketch[-1] + _HASH_RANGE // 2 + 1))
+
+
+class TableStats:
+    """
+    Planner statistics of one table: per column min/max and distinct count.
+
+    Computed from the rows the first time the planner asks, so loading a
+    table costs nothing. From then on inserts are folded in as they
+    happen; updates and deletes are counted, and the statistics are
+    recomputed once they make up REFRESH_RATIO of the table.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = None  # column -> ColumnStats, None until computed
+        self.changes = 0
+
+    def invalidate(self):
+        """Forget the statistics (rows were replaced); they are recomputed on next use."""
+        self.columns = None
+
+    def column(self, name):
+        columns = self.columns
+        if columns is None or self.changes > max(REFRESH_MIN_CHANGES, REFRESH_RATIO * self.table.row_count):
+            columns = self.analyze()
+        return columns[name]
+
+    def analyze(self):
+        """Recompute every column's statistics from the live rows."""
+        table = self.table
+        live = list(table.read_columns())
+        columns = {}
+        for name, field in table.fields.items():
+            stats = ColumnStats()
+            stats.add(list(map(operator.itemgetter(field), live)))
+            columns[name] = stats
+        self.columns = columns
+        self.changes = 0
+        return columns
+
+    def added(self, rows):
+        """New rows were inserted."""
+        if self.columns is None:
+            return
+        if len(rows) == 1:
+            # Columns are kept in schema order, like the row's values
+            for stats, value in zip(self.columns.values(), rows[0]):
+                stats.add_value(value)
+            return
+        for name, field in self.table.fields.items():
+            self.columns[name].add(list(map(operator.itemgetter(field), rows)))
+
+    def updated(self, changes, count):
+        """`count` rows had `changes` (column -> value) applied."""
+        if self.columns is None:
+            return
+        for name, value in changes.items():
+            self.columns[name].add_value(value)
+        self.changes += count
+
+    def removed(self, count):
+        """`count` rows were deleted, or had their values put back by a rollback."""
+        if self.columns is not None:
+            self.changes += count
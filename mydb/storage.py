@@ -1,83 +1,355 @@
 import json
 import os
 
+from mydb.indexfile import index_path, open_index_file, save_indexes
+from mydb.pager import PAGED_DB_FILE, open_paged, save_paged
+from mydb.segments import SEGMENTS_DB_FILE, open_segments, save_segments, segments_size
+from mydb.wal import WAL_FILE, scan_log
+
 DB_FILE = "data/db.json"
 
+# Snapshot formats: human-readable JSON, binary pages read through mmap,
+# or one compact (optionally compressed) segment file per table
+BACKENDS = {
+    "json": DB_FILE,
+    "paged": PAGED_DB_FILE,
+    "segments": SEGMENTS_DB_FILE
+}
+
+
+def serialize_columns(columns):
+    """Convert columns from dict format to the list format used on disk."""
+    serialized = []
+    for col_name, col_meta in columns.items():
+        serialized.append({
+            "name": col_name,
+            "type": col_meta["type"],
+            "primary_key": col_meta.get("primary", False),
+            "unique": col_meta.get("unique", False)
+        })
+    return serialized
+
+
+def serialize_indexes(table):
+    """List the ordered indexes of a table as {"name", "column"} entries."""
+    return [{"name": index.name, "column": column}
+            for column, index in table.ordered_indexes.items()]
+
+
+def deserialize_columns(columns_data):
+    """Convert columns from list format back to dict format."""
+    columns = {}
+    for col_def in columns_data:
+        columns[col_def["name"]] = {
+            "type": col_def["type"],
+            "primary": col_def.get("primary_key", False),
+            "unique": col_def.get("unique", False)
+        }
+    return columns
+
 
-def load_database():
+def sync_directory(directory):
+    """
+    Flush a directory entry change (a rename) to disk, so it survives a
+    crash. Skipped where directories cannot be opened, as on Windows.
+    """
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def snapshot_size(path, backend="json"):
+    """Bytes the snapshot at `path` takes on disk (0 if there is none)."""
+    if backend == "segments":
+        return segments_size(path)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def write_snapshot(f, serialized):
+    """
+    Write the JSON snapshot with one row per line.
+    Same layout as json.dump(indent=2) down to the table fields, but each
+    row is encoded by the C JSON encoder in one call, which is far faster
+    than indenting every value.
+    """
+    f.write("{")
+    for table_no, (table_name, table_data) in enumerate(serialized.items()):
+        f.write("," if table_no else "")
+        f.write(f"\n  {json.dumps(table_name)}: {{")
+        for field_no, (field, value) in enumerate(table_data.items()):
+            f.write("," if field_no else "")
+            f.write(f"\n    {json.dumps(field)}: ")
+            if field != "rows":
+                f.write(json.dumps(value))
+                continue
+            if not value:
+                f.write("[]")
+                continue
+            f.write("[\n      ")
+            f.write(",\n      ".join(map(json.dumps, value)))
+            f.write("\n    ]")
+        f.write("\n  }")
+    f.write("\n}\n" if serialized else "}\n")
+
+
+def load_database(path=None, wal_path=WAL_FILE, backend="json"):
     """
     Load database state from disk.
+    Reads the last snapshot, then replays the write-ahead log over it.
+    Indexes are restored lazily, the first time a table's index is used:
+    from the persisted index file when it matches the snapshot, otherwise
+    by a full rebuild.
     Returns a dictionary of table_name -> Table objects.
     """
-    if not os.path.exists(DB_FILE):
-        return {}
+    from mydb.table import Table
 
-    with open(DB_FILE, "r") as f:
-        raw = json.load(f)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'")
+    path = path or BACKENDS[backend]
 
-    from mydb.table import Table
-    
     tables = {}
-    for table_name, table_data in raw.items():
-        # Convert columns from list format back to dict format
-        columns = {}
-        for col_def in table_data["columns"]:
-            columns[col_def["name"]] = {
-                "type": col_def["type"],
-                "primary": col_def.get("primary_key", False),
-                "unique": col_def.get("unique", False)
-            }
-        
-        # Create table
-        table = Table(table_name, columns)
-        
-        # Convert rows from array format back to dict format
-        column_names = list(columns.keys())
-        for row_values in table_data["rows"]:
-            row = {}
-            for col_name, value in zip(column_names, row_values):
-                row[col_name] = value
-            table.rows.append(row)
-        
-        # Rebuild indexes from loaded rows
-        table.rebuild_indexes()
-        
-        tables[table_name] = table
+    # Segmented snapshots keep an index file per table
+    index_paths = {}
+
+    if backend == "segments":
+        for table_name, table_data in open_segments(path).items():
+            table = Table(table_name, deserialize_columns(table_data["columns"]))
+            table.version = table_data["version"]
+            table.rows = table_data["rows"]
+            table.deleted = table.rows.count(None)
+            for index_def in table_data["indexes"]:
+                table.create_index(index_def["name"], index_def["column"], build=False)
+            tables[table_name] = table
+            index_paths[table_name] = table_data["index_path"]
+
+    elif backend == "paged" and os.path.exists(path):
+        for table_name, table_data in open_paged(path).items():
+            table = Table(table_name, table_data["columns"])
+            table.version = table_data["version"]
+            table.rows = table_data["rows"]
+            table.deleted = table_data["deleted"]
+            for index_def in table_data["indexes"]:
+                table.create_index(index_def["name"], index_def["column"], build=False)
+            tables[table_name] = table
+
+    elif os.path.exists(path):
+        with open(path, "r") as f:
+            raw = json.load(f)
+
+        for table_name, table_data in raw.items():
+            columns = deserialize_columns(table_data["columns"])
+
+            # Create table
+            table = Table(table_name, columns)
+            table.version = table_data.get("version", 0)
+
+            # Rows are stored as arrays in schema order and kept as
+            # tuples (null marks a deleted row)
+            table.rows = [None if row_values is None else tuple(row_values)
+                          for row_values in table_data["rows"]]
+            table.deleted = table.rows.count(None)
+
+            for index_def in table_data.get("indexes", []):
+                table.create_index(index_def["name"], index_def["column"], build=False)
+
+            tables[table_name] = table
+
+    # Table state the persisted indexes must match
+    snapshot_state = {name: (table.version, len(table.rows))
+                      for name, table in tables.items()}
+
+    records, _ = scan_log(wal_path)
+    rewritten = set()
+    for record in records:
+        # A committed transaction is logged as one record holding its changes
+        changes = record["records"] if record["op"] == "transaction" else [record]
+        for change in changes:
+            applied = apply_log_record(tables, change)
+            if applied and change["op"] in ("update", "delete"):
+                rewritten.add(change["table"])
+
+    shared_index_file = None if backend == "segments" else open_index_file(index_path(path))
+    for table_name, table in tables.items():
+        loader = None
+        index_file = shared_index_file
+        if table_name in index_paths:
+            index_file = open_index_file(index_paths[table_name])
+        if index_file is not None and table_name in snapshot_state and table_name not in rewritten:
+            version, row_count = snapshot_state[table_name]
+            if index_file.matches(table_name, version, row_count):
+                loader = _index_loader(index_file, row_count)
+        table.invalidate_indexes(loader)
 
     return tables
 
 
-def save_database(tables):
+def _index_loader(index_file, snapshot_rows):
+    """
+    Build a Table index loader reading from a persisted index file.
+    Rows replayed from the log after the snapshot are indexed on top.
+    """
+    def load(table):
+        stored = index_file.read_table(table.name)
+        if stored is None:
+            return False
+        maps, ordered = stored
+        return table.load_indexes(maps, ordered, start=snapshot_rows)
+    return load
+
+
+def apply_log_record(tables, record):
+    """
+    Replay one write-ahead log record onto loaded tables.
+    Records already contained in the snapshot (version <= table.version)
+    are skipped, so replaying after an interrupted checkpoint is safe.
+    Indexes are not maintained here; the caller invalidates them afterwards.
+    Returns True if the record changed the tables.
+    """
+    from mydb.table import Table
+
+    table_name = record["table"]
+    table = tables.get(table_name)
+
+    if record["op"] == "create":
+        if table is None:
+            table = Table(table_name, deserialize_columns(record["columns"]))
+            table.version = record["version"]
+            tables[table_name] = table
+            return True
+        return False
+
+    if table is None or record["version"] <= table.version:
+        return False
+
+    if record["op"] == "insert":
+        # Older logs hold one row per record
+        for values in record.get("rows") or [record["row"]]:
+            table.rows.append(tuple(values))
+
+    elif record["op"] == "update":
+        for row_index in record["rows"]:
+            table.set_values(row_index, record["set"])
+
+    elif record["op"] == "create_index":
+        table.create_index(record["name"], record["column"], build=False)
+
+    elif record["op"] == "delete":
+        for row_index in record["rows"]:
+            if table.rows[row_index] is not None:
+                table.rows[row_index] = None
+                table.deleted += 1
+
+    else:
+        raise ValueError(f"Unknown log record: {record['op']}")
+
+    # Rows were changed behind the table's back
+    table.stats.invalidate()
+    table.touch()
+    table.version = record["version"]
+    return True
+
+
+def apply_live_record(tables, record):
+    """
+    Apply a log record written by another process to tables in use.
+    Unlike apply_log_record, indexes are kept up to date, so nothing has
+    to be rebuilt. Records the tables already contain are skipped.
+    """
+    from mydb.table import Table
+
+    if record["op"] == "transaction":
+        for change in record["records"]:
+            apply_live_record(tables, change)
+        return
+
+    table_name = record["table"]
+    table = tables.get(table_name)
+
+    if record["op"] == "create":
+        if table is None:
+            table = Table(table_name, deserialize_columns(record["columns"]))
+            table.version = record["version"]
+            tables[table_name] = table
+        return
+
+    if table is None or record["version"] <= table.version:
+        return
+
+    if record["op"] == "insert":
+        table.insert_many(record.get("rows") or [record["row"]])
+
+    elif record["op"] == "update":
+        table.update_rows(record["rows"], record["set"])
+
+    elif record["op"] == "create_index":
+        table.create_index(record["name"], record["column"])
+
+    elif record["op"] == "delete":
+        for row_index in record["rows"]:
+            table.delete_row(row_index)
+
+    else:
+        raise ValueError(f"Unknown log record: {record['op']}")
+
+    table.version = record["version"]
+
+
+def save_database(tables, path=None, backend="json", compression=None):
     """
     Save database state to disk.
     tables: dictionary of table_name -> Table objects
+    The snapshot is written to a temporary file and renamed into place,
+    so a checkpoint interrupted part-way leaves the previous one intact.
+    Index maps are persisted next to it so the next start can skip
+    rebuilding them.
+    compression: None, "zlib" or "lzma" for the segments backend, which
+    also rewrites only the tables that changed since the last save.
+    Returns the number of bytes written.
     """
-    os.makedirs("data", exist_ok=True)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'")
+    path = path or BACKENDS[backend]
+
+    if backend == "segments":
+        return save_segments(tables, path, compression)
+    if compression is not None:
+        raise ValueError(f"The {backend} backend does not support compression")
+
+    if backend == "paged":
+        size = save_paged(tables, path)
+        save_indexes(tables, index_path(path))
+        return size
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
 
     # Convert Table objects to JSON-serializable format
     serialized = {}
     for table_name, table in tables.items():
-        # Convert columns from dict to list format
-        columns = []
-        for col_name, col_meta in table.columns.items():
-            columns.append({
-                "name": col_name,
-                "type": col_meta["type"],
-                "primary_key": col_meta.get("primary", False),
-                "unique": col_meta.get("unique", False)
-            })
-        
-        # Convert rows from dict format to array format
-        column_names = list(table.columns.keys())
-        rows = []
-        for row_dict in table.rows:
-            row_array = [row_dict[col] for col in column_names]
-            rows.append(row_array)
-        
+        # Row tuples are already in schema order; JSON writes them as arrays
         serialized[table_name] = {
-            "columns": columns,
-            "rows": rows
+            "columns": serialize_columns(table.columns),
+            "version": table.version,
+            "indexes": serialize_indexes(table),
+            "rows": table.rows
         }
 
-    with open(DB_FILE, "w") as f:
-        json.dump(serialized, f, indent=2)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        write_snapshot(f, serialized)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(temp_path, path)
+    sync_directory(directory)
+
+    save_indexes(tables, index_path(path))
+    return size
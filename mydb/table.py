@@ -1,3 +1,23 @@
+import itertools
+import operator
+import threading
+from itertools import islice
+
+from mydb.exceptions import SchemaError
+from mydb.index import OrderedIndex
+from mydb.pager import PagedRows
+from mydb.stats import TableStats
+
+# Tombstones are compacted away at checkpoint once they make up this
+# fraction of a table's row slots.
+COMPACT_RATIO = 0.25
+
+# Source of Table.stamp values. They are unique across all tables, so a
+# cached query result or shared-memory column copy can only match the exact
+# table state it was read from.
+_stamps = itertools.count(1)
+
+
 class Table:
     def __init__(self, name, columns):
         """
@@ -8,18 +28,38 @@ class Table:
         """
         self.name = name
         self.columns = columns
+        # Rows are tuples of values in schema order; fields maps a column
+        # name to its position in the tuple. A tuple costs a fraction of a
+        # dict keyed by column name, and query results can use it as is.
+        self.fields = {col_name: field for field, col_name in enumerate(columns)}
+        # Deleted rows are left in place as None (tombstones) so the
+        # positions stored in indexes stay valid; see compact().
         self.rows = []
-        self.indexes = {}
+        self.deleted = 0
+        self._indexes = {}
+        self._ordered_indexes = {}
+        self.indexes_stale = False
+        self.index_loader = None
+        self.index_lock = threading.Lock()
+        # Bumped on every logged change; lets WAL replay skip records
+        # that are already part of the snapshot.
+        self.version = 0
+        # Replaced on every change to the rows, including rollbacks (which
+        # restore `version`) and compaction; keys every cache derived from
+        # the rows: query results and shared-memory column copies
+        self.stamp = next(_stamps)
+        # Column statistics for the query planner
+        self.stats = TableStats(self)
 
         # Create indexes for PRIMARY KEY and UNIQUE columns
         for col_name, col_meta in columns.items():
             if col_meta.get("primary"):
-                self.indexes[col_name] = {
+                self._indexes[col_name] = {
                     "type": "primary",
                     "map": {}
                 }
             elif col_meta.get("unique"):
-                self.indexes[col_name] = {
+                self._indexes[col_name] = {
                     "type": "unique",
                     "map": {}
                 }
@@ -29,38 +69,353 @@ class Table:
             if meta.get("primary"):
                 self.primary_key = col
 
+    @property
+    def indexes(self):
+        """Index maps, loaded or rebuilt on first use after invalidate_indexes()."""
+        if self.indexes_stale:
+            self._restore_indexes()
+        return self._indexes
+
+    @property
+    def ordered_indexes(self):
+        """column -> OrderedIndex for indexes created with CREATE INDEX."""
+        if self.indexes_stale:
+            self._restore_indexes()
+        return self._ordered_indexes
+
+    @property
+    def row_count(self):
+        """Number of live (non-deleted) rows."""
+        return len(self.rows) - self.deleted
+
+    def touch(self):
+        """Give the table a new stamp after its rows changed."""
+        self.stamp = next(_stamps)
+
+    def scan(self):
+        """Yield (row_index, row) for every live row."""
+        for row_index, row in enumerate(self.rows):
+            if row is not None:
+                yield row_index, row
+
+    def read_columns(self, fields=None, start=0, stop=None):
+        """
+        Yield the live rows in slots [start, stop), reduced to `fields`
+        (tuple positions, in output order; None keeps whole rows). Paged
+        tables decode only those fields of pages that are not in memory.
+        """
+        if isinstance(self.rows, PagedRows):
+            yield from self.rows.read_columns(fields, start, stop)
+            return
+
+        if isinstance(self.rows, list) and stop is not None:
+            rows = self.rows[start:stop]
+        else:
+            rows = islice(self.rows, start, stop)
+        live = (row for row in rows if row is not None)
+        if fields is None:
+            yield from live
+        elif len(fields) == 1:
+            field = fields[0]
+            yield from ((row[field],) for row in live)
+        else:
+            yield from map(operator.itemgetter(*fields), live)
+
+    def index_names(self):
+        """Names of the ordered indexes, without loading any index data."""
+        return {index.name for index in self._ordered_indexes.values()}
+
+    def _restore_indexes(self):
+        # Concurrent readers may all find the indexes stale; one restores them
+        with self.index_lock:
+            if not self.indexes_stale:
+                return
+            loader, self.index_loader = self.index_loader, None
+            if loader is None or not loader(self):
+                self.rebuild_indexes()
+            self.indexes_stale = False
+
+    def invalidate_indexes(self, loader=None):
+        """
+        Mark indexes as out of date without touching any rows.
+        loader: optional callable(table) tried before a full rebuild; it
+        returns True if it restored the indexes (e.g. from an index file).
+        """
+        self.indexes_stale = True
+        self.index_loader = loader
+
+    def load_indexes(self, maps, ordered, start=0):
+        """
+        Install persisted index maps, then index rows from position `start`
+        onwards (rows appended after the maps were saved).
+        maps: column -> hash map; ordered: column -> (sorted keys, map).
+        Returns False if they do not cover exactly this table's indexes.
+        """
+        if maps.keys() != self._indexes.keys() or ordered.keys() != self._ordered_indexes.keys():
+            return False
+
+        for col_name, index_map in maps.items():
+            self._indexes[col_name]["map"] = index_map
+        for col_name, (sorted_keys, index_map) in ordered.items():
+            self._ordered_indexes[col_name].load(sorted_keys, index_map)
+
+        for row_index in range(start, len(self.rows)):
+            row = self.rows[row_index]
+            if row is None:
+                continue
+            for col_name, index in self._indexes.items():
+                index["map"][row[self.fields[col_name]]] = row_index
+            for col_name, index in self._ordered_indexes.items():
+                index.add(row[self.fields[col_name]], row_index)
+        return True
+
+    def create_index(self, name, column, build=True):
+        """
+        Add an ordered (non-unique) index on `column`.
+        build=False only registers it; it is filled by the next rebuild.
+        """
+        if column not in self.columns:
+            raise ValueError(f"Unknown column '{column}'")
+        if self.columns[column]["type"] not in ("INT", "TEXT"):
+            raise SchemaError(f"Cannot create an ordered index on {self.columns[column]['type']} column '{column}'")
+        if column in self._ordered_indexes:
+            raise ValueError(f"Column '{column}' already has an ordered index")
+
+        index = OrderedIndex(name, column)
+        if build:
+            field = self.fields[column]
+            index.build((row[field], row_index) for row_index, row in self.scan())
+        self._ordered_indexes[column] = index
+        return index
+
+    def check_value(self, column, value):
+        """Reject values that do not match the declared INT/TEXT column type."""
+        col_type = self.columns[column]["type"]
+        if col_type == "INT" and type(value) is not int:
+            raise SchemaError(f"Column '{column}' expects INT, got {value!r}")
+        if col_type == "TEXT" and not isinstance(value, str):
+            raise SchemaError(f"Column '{column}' expects TEXT, got {value!r}")
+
     def insert(self, values):
-        if len(values) != len(self.columns):
-            raise ValueError("Column count mismatch")
+        self.insert_many([values])
+
+    def insert_many(self, value_lists):
+        """
+        Insert a batch of rows (sequences of values in schema order).
+        Types and PRIMARY/UNIQUE constraints are checked for the whole
+        batch, against existing rows and within the batch, before anything
+        is added, so one bad row leaves the table unchanged. Indexes are
+        then filled in bulk.
+        Returns the number of rows inserted.
+        """
+        names = list(self.columns.keys())
+        int_fields = [(field, name) for field, name in enumerate(names) if self.columns[name]["type"] == "INT"]
+        text_fields = [(field, name) for field, name in enumerate(names) if self.columns[name]["type"] == "TEXT"]
 
-        row = {}
-        for col, value in zip(self.columns.keys(), values):
-            row[col] = value
+        rows = []
+        for values in value_lists:
+            if len(values) != len(names):
+                raise ValueError("Column count mismatch")
+            row = tuple(values)
+            for field, col in int_fields:
+                if type(row[field]) is not int:
+                    self.check_value(col, row[field])
+            for field, col in text_fields:
+                if not isinstance(row[field], str):
+                    self.check_value(col, row[field])
+            rows.append(row)
 
         # Check for duplicate keys in indexed columns before inserting
         for col_name, index in self.indexes.items():
-            key = row[col_name]
-            if key in index["map"]:
-                raise ValueError(f"Duplicate value for indexed column '{col_name}': {key}")
+            index_map = index["map"]
+            field = self.fields[col_name]
+            seen = set()
+            for row in rows:
+                key = row[field]
+                if key in index_map or key in seen:
+                    raise ValueError(f"Duplicate value for indexed column '{col_name}': {key}")
+                seen.add(key)
 
-        # Insert the row
-        row_index = len(self.rows)
-        self.rows.append(row)
+        # Insert the rows
+        start = len(self.rows)
+        append = self.rows.append
+        for row in rows:
+            append(row)
+        positions = range(start, start + len(rows))
 
         # Populate indexes
         for col_name, index in self.indexes.items():
-            key = row[col_name]
-            index["map"][key] = row_index
+            field = self.fields[col_name]
+            index["map"].update(zip((row[field] for row in rows), positions))
+        for col_name, index in self.ordered_indexes.items():
+            field = self.fields[col_name]
+            if 2 * len(rows) > self.row_count:
+                # Cheaper to sort everything once than to insert key by key
+                index.build((row[field], row_index) for row_index, row in self.scan())
+            else:
+                for row, row_index in zip(rows, positions):
+                    index.add(row[field], row_index)
+        self.stats.added(rows)
+        self.touch()
+
+        return len(rows)
+
+    def update_rows(self, positions, changes):
+        """
+        Set `changes` (column -> value) on the rows at `positions`.
+        PRIMARY/UNIQUE constraints are checked for the whole batch before
+        anything is modified, so a duplicate key leaves rows and indexes
+        exactly as they were.
+        """
+        if not positions:
+            return
+
+        # Validate the batch
+        updated = set(positions)
+        for col_name, index in self.indexes.items():
+            if col_name not in changes:
+                continue
+            new_key = changes[col_name]
+            owner = index["map"].get(new_key)
+            if len(updated) > 1 or (owner is not None and owner not in updated):
+                raise ValueError(f"Duplicate value for indexed column '{col_name}': {new_key}")
+
+        # Apply rows and index entries together
+        for row_index in positions:
+            row = self.rows[row_index]
+            for col_name, new_key in changes.items():
+                old_key = row[self.fields[col_name]]
+                if col_name in self.indexes:
+                    index_map = self.indexes[col_name]["map"]
+                    if index_map.get(old_key) == row_index:
+                        del index_map[old_key]
+                    index_map[new_key] = row_index
+                if col_name in self.ordered_indexes:
+                    ordered = self.ordered_indexes[col_name]
+                    ordered.remove(old_key, row_index)
+                    ordered.add(new_key, row_index)
+            self.set_values(row_index, changes)
+        self.stats.updated(changes, len(positions))
+        self.touch()
+
+    def set_values(self, row_index, changes):
+        """Replace the row at `row_index` with `changes` applied; indexes are not touched."""
+        row = list(self.rows[row_index])
+        for col_name, value in changes.items():
+            row[self.fields[col_name]] = value
+        self.rows[row_index] = tuple(row)
+
+    def delete_row(self, row_index):
+        """
+        Tombstone one row and drop its index entries.
+        Returns False if the row was already deleted.
+        """
+        row = self.rows[row_index]
+        if row is None:
+            return False
+
+        for col_name, index in self.indexes.items():
+            key = row[self.fields[col_name]]
+            if index["map"].get(key) == row_index:
+                del index["map"][key]
+        for col_name, index in self.ordered_indexes.items():
+            index.remove(row[self.fields[col_name]], row_index)
+
+        self.rows[row_index] = None
+        self.deleted += 1
+        self.stats.removed(1)
+        self.touch()
+        return True
+
+    def undelete_rows(self, saved):
+        """Put back rows removed by delete_row(); saved is a list of (row_index, row)."""
+        for row_index, row in saved:
+            self.rows[row_index] = row
+            self.deleted -= 1
+            for col_name, index in self.indexes.items():
+                index["map"][row[self.fields[col_name]]] = row_index
+            for col_name, index in self.ordered_indexes.items():
+                index.add(row[self.fields[col_name]], row_index)
+        self.stats.removed(len(saved))
+        self.touch()
+
+    def restore_values(self, saved):
+        """
+        Undo update_rows(): saved is a list of (row_index, {column: old value}).
+        All index entries are removed before any is re-added, so keys swapped
+        between rows do not collide.
+        """
+        for row_index, old_values in saved:
+            row = self.rows[row_index]
+            for col_name in old_values:
+                key = row[self.fields[col_name]]
+                if col_name in self.indexes:
+                    index_map = self.indexes[col_name]["map"]
+                    if index_map.get(key) == row_index:
+                        del index_map[key]
+                if col_name in self.ordered_indexes:
+                    self.ordered_indexes[col_name].remove(key, row_index)
+
+        for row_index, old_values in saved:
+            self.set_values(row_index, old_values)
+            for col_name, key in old_values.items():
+                if col_name in self.indexes:
+                    self.indexes[col_name]["map"][key] = row_index
+                if col_name in self.ordered_indexes:
+                    self.ordered_indexes[col_name].add(key, row_index)
+        self.stats.removed(len(saved))
+        self.touch()
+
+    def truncate(self, length):
+        """Drop every row slot from position `length` on (undo of an insert)."""
+        for row_index in range(length, len(self.rows)):
+            row = self.rows[row_index]
+            if row is None:
+                self.deleted -= 1
+                continue
+            for col_name, index in self.indexes.items():
+                key = row[self.fields[col_name]]
+                if index["map"].get(key) == row_index:
+                    del index["map"][key]
+            for col_name, index in self.ordered_indexes.items():
+                index.remove(row[self.fields[col_name]], row_index)
+        self.stats.removed(len(self.rows) - length)
+        del self.rows[length:]
+        self.touch()
+
+    def drop_index(self, column):
+        """Remove the ordered index on `column` (undo of create_index)."""
+        del self._ordered_indexes[column]
+
+    def needs_compaction(self):
+        return self.deleted > 0 and self.deleted >= COMPACT_RATIO * len(self.rows)
+
+    def compact(self):
+        """Drop tombstones. Row positions change, so indexes are rebuilt."""
+        if not self.deleted:
+            return
+        self.rows = [row for row in self.rows if row is not None]
+        self.deleted = 0
+        self.rebuild_indexes()
+        self.touch()
 
     def rebuild_indexes(self):
-        """Rebuild all indexes from current rows. Used after DELETE operations."""
+        """Rebuild all indexes from current rows. Used after load and compaction."""
         # Clear all indexes
-        for index in self.indexes.values():
+        for index in self._indexes.values():
             index["map"].clear()
 
         # Rebuild indexes from rows
-        column_names = list(self.columns.keys())
-        for row_index, row in enumerate(self.rows):
-            for col_name, index in self.indexes.items():
-                key = row[col_name]
-                index["map"][key] = row_index
+        if self._indexes:
+            for row_index, row in self.scan():
+                for col_name, index in self._indexes.items():
+                    key = row[self.fields[col_name]]
+                    index["map"][key] = row_index
+
+        for col_name, index in self._ordered_indexes.items():
+            field = self.fields[col_name]
+            index.build((row[field], row_index) for row_index, row in self.scan())
+
+        # Cleared last: concurrent readers must not use half-built indexes
+        self.index_loader = None
+        self.indexes_stale = False
@@ -0,0 +1,30 @@
+class Transaction:
+    """
+    Changes made since BEGIN.
+
+    redo holds the log records to write at COMMIT; undo holds callables
+    that revert each in-memory change, run newest first on ROLLBACK.
+    versions remembers every touched table's version at its first change.
+    """
+
+    def __init__(self):
+        self.redo = []
+        self.undo = []
+        self.versions = {}
+
+    def record(self, table, record, undo):
+        """Register one change; table.version has not been bumped yet."""
+        self.versions.setdefault(table.name, (table, table.version))
+        self.redo.append(record)
+        if undo is not None:
+            self.undo.append(undo)
+
+    def rollback(self):
+        """Revert every change in reverse order and restore table versions."""
+        for undo in reversed(self.undo):
+            undo()
+        for table, version in self.versions.values():
+            table.version = version
+        self.redo = []
+        self.undo = []
+        self.versions = {}
@@ -0,0 +1,169 @@
+import operator
+from itertools import chain, compress, islice, repeat
+
+try:
+    import numpy
+except ImportError:  # optional; the pure-Python batches are used instead
+    numpy = None
+
+# Rows evaluated together by filter_rows() / filter_positions()
+BATCH_SIZE = 4096
+
+COMPARISONS = {
+    "=": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "!=": operator.ne
+}
+
+
+def conditions(where):
+    """The top-level conditions of a WHERE clause (an AND of one or more); an OR group counts as one."""
+    if where.get("op") == "AND":
+        return where["conditions"]
+    return [where]
+
+
+def leaves(where):
+    """Every single-column comparison of a WHERE clause, through nested AND/OR groups."""
+    if where.get("op") in ("AND", "OR"):
+        return [leaf for condition in where["conditions"] for leaf in leaves(condition)]
+    return [where]
+
+
+def batches(table, size=BATCH_SIZE):
+    """Yield (start position, list of row slots) chunks of a table, tombstones included."""
+    rows = iter(table.rows)
+    start = 0
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def placeholder_row(table):
+    """
+    Stand-in for deleted rows while columns are extracted: values of the
+    right type, so comparisons never fail. Tombstones are masked out anyway.
+    """
+    return tuple("" if meta["type"] == "TEXT" else 0 for meta in table.columns.values())
+
+
+def compare(column, op, value, use_numpy):
+    """
+    Selection bitmap of one condition over a column chunk.
+    column: list of values, or (with use_numpy) an int64 NumPy array.
+    use_numpy must only be set for INT columns: NumPy would read numeric
+    TEXT such as "007" as an integer.
+    Returns a list of booleans or a NumPy boolean array.
+    """
+    bounds = value if op == "BETWEEN" else (value,)
+    if use_numpy and all(type(bound) is int for bound in bounds):
+        try:
+            if isinstance(column, numpy.ndarray):
+                values = column
+            else:
+                values = numpy.fromiter(column, dtype=numpy.int64, count=len(column))
+            if op == "BETWEEN":
+                low, high = value
+                return (values >= low) & (values <= high)
+            return COMPARISONS[op](values, value)
+        except (OverflowError, TypeError, ValueError):
+            pass  # not an int64 column chunk; compare as Python objects
+
+    if not isinstance(column, list):
+        column = column.tolist()
+    count = len(column)
+    if op == "BETWEEN":
+        low, high = value
+        return list(map(operator.and_,
+                        map(operator.le, repeat(low, count), column),
+                        map(operator.le, column, repeat(high, count))))
+    return list(map(COMPARISONS[op], column, repeat(value, count)))
+
+
+def combine(left, right, join=operator.and_):
+    """AND (or, with join=operator.or_, OR) two selection bitmaps."""
+    if not isinstance(left, list) and not isinstance(right, list):
+        return join(left, right)
+    if not isinstance(left, list):
+        left = left.tolist()
+    if not isinstance(right, list):
+        right = right.tolist()
+    return list(map(join, left, right))
+
+
+def evaluate(where, column, types, use_numpy):
+    """
+    Selection bitmap of a WHERE clause over one batch. column(name)
+    returns the batch's values of a column and types maps it to its
+    declared type; each condition is applied to a whole column at once
+    (with NumPy only for INT columns), and AND/OR groups combine their
+    bitmaps. Returns a list of booleans or a NumPy array.
+    """
+    op = where.get("op", "=")
+    if op not in ("AND", "OR"):
+        name = where["column"]
+        return compare(column(name), op, where["value"], use_numpy and types[name] == "INT")
+
+    join = operator.and_ if op == "AND" else operator.or_
+    bitmap = None
+    for condition in where["conditions"]:
+        selection = evaluate(condition, column, types, use_numpy)
+        bitmap = selection if bitmap is None else combine(bitmap, selection, join)
+    return bitmap
+
+
+def where_bitmap(chunk, where, table, use_numpy):
+    """Evaluate a WHERE clause over a chunk of live rows; one boolean per row."""
+    columns = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = list(map(operator.itemgetter(table.fields[name]), chunk))
+        return columns[name]
+
+    types = {name: meta["type"] for name, meta in table.columns.items()}
+    bitmap = evaluate(where, column, types, use_numpy)
+    if not isinstance(bitmap, list):
+        bitmap = bitmap.tolist()
+    return bitmap
+
+
+def selections(table, where, use_numpy=None):
+    """
+    Yield (start, chunk, bitmap) for each batch of a table scan, where
+    bitmap marks the rows of the chunk matching the WHERE clause.
+    use_numpy: evaluate INT conditions with NumPy (default: when installed).
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    placeholder = placeholder_row(table)
+
+    for start, chunk in batches(table):
+        if None not in chunk:
+            yield start, chunk, where_bitmap(chunk, where, table, use_numpy)
+            continue
+
+        live = [row is not None for row in chunk]
+        filled = [placeholder if row is None else row for row in chunk]
+        bitmap = where_bitmap(filled, where, table, use_numpy)
+        yield start, chunk, list(map(operator.and_, bitmap, live))
+
+
+def filter_rows(table, where, use_numpy=None):
+    """Lazily yield the live rows matching a WHERE clause, a batch at a time."""
+    return chain.from_iterable(compress(chunk, bitmap)
+                               for _, chunk, bitmap in selections(table, where, use_numpy))
+
+
+def filter_positions(table, where, use_numpy=None):
+    """Positions of the live rows matching a WHERE clause."""
+    positions = []
+    for start, chunk, bitmap in selections(table, where, use_numpy):
+        positions.extend(compress(range(start, start + len(chunk)), bitmap))
+    return positions
@@ -4,74 +4,103 @@ import os
 # Add parent directory to path so we can import mydb
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from flask import Flask, request, render_template, redirect, url_for
-from mydb.parser import parse
+from flask import Flask, Response, request, render_template, redirect, url_for
+from mydb.client import ConnectionPool
 from mydb.executor import Database
-from mydb.storage import load_database, save_database
+from mydb.exceptions import TableExistsError, TableNotFoundError
 
 app = Flask(__name__)
 
-# Load database on startup
-tables = load_database()
-db = Database()
-db.tables = tables
+# Users listed per page
+PAGE_SIZE = 20
 
-def get_users():
-    """Helper function to get users as structured data."""
-    if "users" not in db.tables:
-        return []
-    
-    table = db.tables["users"]
-    headers = list(table.columns.keys())
-    users = []
-    
-    for row in table.rows:
-        user_dict = {}
-        for col in headers:
-            user_dict[col] = row[col]
-        users.append(user_dict)
+# Load database on startup. Database.open() coordinates with other
+# processes using the same files, so several workers can serve requests.
+# With MYDB_SERVER=host:port set, requests go to a running database server
+# (python -m mydb.server) through a connection pool instead.
+if os.environ.get("MYDB_SERVER"):
+    host, _, port = os.environ["MYDB_SERVER"].rpartition(":")
+    db = ConnectionPool(host or "127.0.0.1", int(port))
+else:
+    db = Database.open()
+
+# Statements used by the routes, parsed once; values are bound as parameters.
+# Repeated page views are answered from the database's result cache until
+# the users table changes.
+create_users = db.prepare("CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE);")
+# MAX(id) is read from the end of this ordered index; the PRIMARY KEY's
+# hash index cannot answer it without a full table scan
+create_users_id_index = db.prepare("CREATE INDEX users_id ON users (id);")
+# Only the listed columns are read, and the scan stops after the page
+select_users_page = db.prepare("SELECT id, email FROM users LIMIT ? OFFSET ?;")
+count_users = db.prepare("SELECT COUNT(*) FROM users;")
+max_user_id = db.prepare("SELECT MAX(id) FROM users;")
+insert_user = db.prepare("INSERT INTO users VALUES (?, ?);")
+delete_user_by_id = db.prepare("DELETE FROM users WHERE id = ?;")
+
+# A users table created before the index was added gets it once here
+try:
+    create_users_id_index.execute()
+except (TableNotFoundError, ValueError):
+    pass  # no users table yet, or the index already exists
+
+def get_users(page):
+    """Helper function to get one page of users as structured data, plus the user count."""
+    try:
+        with count_users.query() as cursor:
+            (total,) = cursor.fetchone()
+        cursor = select_users_page.query(PAGE_SIZE, (page - 1) * PAGE_SIZE)
+    except TableNotFoundError:
+        return [], 0
     
-    return users
+    headers = cursor.column_names
+    return [dict(zip(headers, row)) for row in cursor], total
 
 @app.route("/")
 def index():
-    users = get_users()
-    return render_template("users.html", users=users)
+    page = max(request.args.get("page", 1, type=int), 1)
+    users, total = get_users(page)
+    pages = max(-(-total // PAGE_SIZE), 1)
+    return render_template("users.html", users=users, page=page, pages=pages)
 
 @app.route("/add", methods=["POST"])
 def add_user():
     email = request.form["email"]
     
-    # Ensure users table exists
-    if "users" not in db.tables:
-        # Create users table if it doesn't exist
-        create_sql = "CREATE TABLE users (id INT PRIMARY KEY, email TEXT UNIQUE);"
-        create_ast = parse(create_sql)
-        db.execute(create_ast)
-    
-    # Get the next ID (simple approach for demo)
-    users = get_users()
-    next_id = 1
-    if users:
-        next_id = max(user["id"] for user in users) + 1
-    
-    # Insert using SQL
-    sql = f'INSERT INTO users VALUES ({next_id}, "{email}");'
-    ast = parse(sql)
-    db.execute(ast)
+    # Create the table (if needed) and the user in one transaction:
+    # a single log write, and no half-done change if the insert fails
+    with db.transaction():
+        # Ensure users table exists
+        try:
+            create_users.execute()
+            create_users_id_index.execute()
+        except TableExistsError:
+            pass
+        
+        # Get the next ID (read from the users_id index, without reading every user)
+        with max_user_id.query() as cursor:
+            (last_id,) = cursor.fetchone()
+        next_id = 1 if last_id is None else last_id + 1
+        
+        # Insert using SQL (the email is bound as a parameter, never spliced into the SQL)
+        insert_user.execute(next_id, email)
     
     return redirect(url_for("index"))
 
 @app.route("/delete/<int:user_id>")
 def delete_user(user_id):
-    if "users" not in db.tables:
-        return redirect(url_for("index"))
-    
-    sql = f"DELETE FROM users WHERE id = {user_id};"
-    ast = parse(sql)
-    db.execute(ast)
+    try:
+        delete_user_by_id.execute(user_id)
+    except TableNotFoundError:
+        pass
     
     return redirect(url_for("index"))
 
+@app.route("/metrics")
+def metrics():
+    # Statement latencies, row and index counters and persistence totals,
+    # for a Prometheus scraper (the server's, when MYDB_SERVER is set)
+    return Response(db.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     app.run(debug=True)